@@ -0,0 +1,138 @@
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+from body_aggregates import WindowCounts
+from speech_metrics import WindowMetrics
+
+GATE_CACHE_SIZE = int(os.getenv("GATE_CACHE_SIZE", "1024"))
+GATE_CACHE_TTL = int(os.getenv("GATE_CACHE_TTL", "600"))
+MIN_SPEECH_WORDS = int(os.getenv("GATE_MIN_SPEECH_WORDS", "4"))
+MIN_BODY_SAMPLES = int(os.getenv("GATE_MIN_BODY_SAMPLES", "5"))
+
+# Prompts rotate through five focus areas, so the same window gets different advice each time
+FOCUS_AREAS = 5
+
+# Stands in for every below-threshold window so a quiet stretch gets one template, not one per window
+BELOW_THRESHOLD = "below-threshold"
+
+_WORD_RE = re.compile(r"[\w']+")
+
+
+class TTLCache:
+    """Small LRU cache whose entries also expire after ttl seconds"""
+
+    def __init__(self, max_entries: int = GATE_CACHE_SIZE, ttl: int = GATE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value):
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class AnalysisGate:
+    """Decides whether an analysis window is worth a Gemini call.
+
+    Windows below the threshold get the fixed template (or nothing), a window
+    with the same fingerprint as the session's previous one is skipped since
+    its feedback was already given, and recently seen fingerprints are served
+    from a shared LRU/TTL cache. Fingerprints describe the window's input
+    only; the prompt's focus area is added to the cache key, so a repeat is
+    skipped whichever focus area is next. Only what is left reaches Gemini.
+    """
+
+    def __init__(self, name: str, min_samples: int, template: Optional[str] = None,
+                 max_entries: int = GATE_CACHE_SIZE, ttl: int = GATE_CACHE_TTL):
+        self.name = name
+        self.min_samples = min_samples
+        self.template = template
+        self.cache = TTLCache(max_entries, ttl)
+        self.calls = 0
+        self.cache_hits = 0
+        self.templated = 0
+        self.skipped = 0
+
+    async def run(self, last_fingerprints: Dict[str, str], fingerprint: str, samples: int,
+                  generate: Callable[[], Awaitable[str]], analysis_number: int = 0) -> Optional[str]:
+        """Analysis text for the window, or None if nothing should be sent"""
+        if samples < self.min_samples:
+            fingerprint = BELOW_THRESHOLD
+        previous = last_fingerprints.get(self.name)
+        last_fingerprints[self.name] = fingerprint
+
+        if fingerprint == previous or (fingerprint == BELOW_THRESHOLD and self.template is None):
+            self.skipped += 1
+            return None
+        if fingerprint == BELOW_THRESHOLD:
+            self.templated += 1
+            return self.template
+
+        # The prompt for this window depends on the focus area it rotates to
+        key = (fingerprint, analysis_number % FOCUS_AREAS)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached
+
+        self.calls += 1
+        try:
+            text = await generate()
+        except BaseException:
+            # Let the next window try again instead of skipping it as a duplicate
+            last_fingerprints.pop(self.name, None)
+            raise
+        self.cache.put(key, text)
+        return text
+
+    def stats(self) -> Dict:
+        windows = self.calls + self.cache_hits + self.templated + self.skipped
+        return {
+            "windows": windows,
+            "gemini_calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "templated": self.templated,
+            "skipped": self.skipped,
+            "hit_rate": self.cache_hits / windows if windows else 0.0,
+            "skip_rate": (self.templated + self.skipped) / windows if windows else 0.0,
+            "cache_entries": len(self.cache),
+        }
+
+
+def _digest(*parts) -> str:
+    return hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=12).hexdigest()
+
+
+def speech_fingerprint(transcript: str, window: WindowMetrics, words_per_minute: float) -> str:
+    """Same words (ignoring case and punctuation) and metric buckets give the same fingerprint"""
+    words = " ".join(_WORD_RE.findall(transcript.lower()))
+    return _digest("speech", words, window.fillers, window.repetitions, int(words_per_minute // 20))
+
+
+def body_fingerprint(body_data: WindowCounts) -> str:
+    """Dominant emotion, posture and fatigue ratios in 10% buckets"""
+    summary = body_data.summary()
+    return _digest(
+        "body", summary["dominant_emotion"], round(summary["good_posture_ratio"] * 10),
+        round(summary["tired_ratio"] * 10)
+    )
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisScheduler:
+    """Runs a connection's analyses on background tasks.
+
+    At most one analysis is in flight per stream type ("speech", "body_language").
+    Requests submitted while a stream is busy are held in a single pending slot:
+    newer requests are merged into it (or replace it when no merge function is
+    registered), so the freshest window runs as soon as the current call returns.
+    """
+
+    def __init__(self, client_id: str):
+        self.client_id = client_id
+        self._handlers: Dict[str, Callable[[Any], Awaitable[None]]] = {}
+        self._mergers: Dict[str, Optional[Callable[[Any, Any], Any]]] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._pending: Dict[str, Any] = {}
+        self._closed = False
+        self._stopped = False
+
+    def register(self, stream: str, handler: Callable[[Any], Awaitable[None]],
+                 merge: Optional[Callable[[Any, Any], Any]] = None):
+        """Register the coroutine that analyzes payloads for a stream type"""
+        self._handlers[stream] = handler
+        self._mergers[stream] = merge
+
+    def submit(self, stream: str, payload: Any):
+        """Schedule an analysis without waiting for it"""
+        if self._closed:
+            return
+
+        if stream not in self._running:
+            self._start(stream, payload)
+            return
+
+        # Stream is busy - fold the request into the pending slot
+        if stream in self._pending:
+            merge = self._mergers.get(stream)
+            if merge is not None:
+                payload = merge(self._pending[stream], payload)
+            else:
+                logger.debug("Dropping stale %s analysis request", stream, extra={"client_id": self.client_id})
+        self._pending[stream] = payload
+
+    def _start(self, stream: str, payload: Any):
+        self._running[stream] = asyncio.create_task(self._run(stream, payload))
+
+    async def _run(self, stream: str, payload: Any):
+        try:
+            await self._handlers[stream](payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("%s analysis failed: %s", stream, e, extra={"client_id": self.client_id})
+        finally:
+            self._running.pop(stream, None)
+            if not self._stopped and stream in self._pending:
+                self._start(stream, self._pending.pop(stream))
+
+    async def close(self, drain: float = 0.0):
+        """Stop accepting requests, let queued ones finish for up to drain seconds, then cancel the rest"""
+        self._closed = True
+        deadline = time.monotonic() + drain
+        while self._running and time.monotonic() < deadline:
+            # A finishing analysis starts its stream's pending request, so look again after each one
+            await asyncio.wait(list(self._running.values()), timeout=deadline - time.monotonic(),
+                               return_when=asyncio.FIRST_COMPLETED)
+
+        self._stopped = True
+        self._pending.clear()
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._running.clear()
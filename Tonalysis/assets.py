@@ -0,0 +1,247 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+from telemetry import ASSET_BYTES_SENT, ASSET_RESPONSES
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Assets up to this size are served from memory; larger ones from ASSET_CACHE_DIR
+ASSET_MEMORY_MAX_KB = int(os.getenv("ASSET_MEMORY_MAX_KB", "256"))
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", os.path.join(tempfile.gettempdir(), "tonalysis-assets"))
+# Content-hashed URLs never change, so browsers may keep them for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Plain URLs (the page itself, model manifests) are revalidated with their ETag
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Preferred first; a compressed copy is only kept if it saves at least 10%
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+MIN_COMPRESSION_RATIO = 0.9
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def accepted_encodings(header: str) -> List[str]:
+    """Content codings from an Accept-Encoding header that are not refused with q=0"""
+    accepted = []
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.append(coding.strip().lower())
+    return accepted
+
+
+def byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(start, end) for a single "bytes=" range, or None to send the whole asset.
+
+    Raises ValueError when the range starts past the end. Multiple ranges
+    are answered with the whole asset, which RFC 9110 allows.
+    """
+    match = _RANGE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        return max(0, size - int(last)), size
+    start = int(first)
+    if start >= size:
+        raise ValueError(f"Range starts past {size} bytes")
+    end = min(size, int(last) + 1) if last else size
+    if end <= start:
+        return None
+    return start, end
+
+
+class Asset:
+    """One served file: its bytes (or cached paths) in every encoding worth sending"""
+
+    def __init__(self, url: str, hashed_url: str, media_type: str, digest: str):
+        self.url = url
+        self.hashed_url = hashed_url
+        self.media_type = media_type
+        self.digest = digest
+        self.size = 0
+        # encoding ("identity", "gzip", "br") -> bytes in memory or a file path
+        self.variants: Dict[str, object] = {}
+
+    def etag(self, encoding: str) -> str:
+        return f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}-{encoding}"'
+
+
+class AssetStore:
+    """Client files and face-model shards, hashed and precompressed once at startup.
+
+    Each file is reachable at its plain URL (revalidated via ETag) and at a
+    content-hashed URL that is cached as immutable. Files registered with
+    links=True have quoted references to earlier assets rewritten to the
+    hashed URLs, so the page pulls its scripts, and each model manifest its
+    shards, from URLs that only change when the content does. Compressed
+    copies are negotiated from Accept-Encoding; Range requests get the
+    uncompressed bytes.
+    """
+
+    def __init__(self, memory_max_bytes: int = ASSET_MEMORY_MAX_KB * 1024, cache_dir: str = ASSET_CACHE_DIR):
+        self.memory_max_bytes = memory_max_bytes
+        self.cache_dir = cache_dir
+        self._assets: Dict[str, Asset] = {}
+        self._by_name: Dict[str, Asset] = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def add(self, path: str, url: str, hashed_prefix: Optional[str] = None, links: bool = False) -> Asset:
+        """Register path at url and at a hashed URL under hashed_prefix (url's directory by default)"""
+        with open(path, "rb") as f:
+            data = f.read()
+        if links:
+            data = self._rewrite_links(data, url)
+
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        directory = url.rsplit("/", 1)[0]
+        name = os.path.basename(path)
+        stem, ext = os.path.splitext(name)
+        hashed_url = f"{hashed_prefix or directory}/{stem}.{digest}{ext}"
+        media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if ext == ".json":
+            media_type = "application/json"
+
+        asset = Asset(url, hashed_url, media_type, digest)
+        asset.size = len(data)
+        in_memory = len(data) <= self.memory_max_bytes
+        asset.variants["identity"] = data if in_memory or links else path
+        for encoding in ENCODINGS:
+            compressed = _compress(data, encoding)
+            if len(compressed) <= len(data) * MIN_COMPRESSION_RATIO:
+                asset.variants[encoding] = compressed
+        if not in_memory:
+            for encoding, variant in asset.variants.items():
+                if isinstance(variant, bytes):
+                    asset.variants[encoding] = self._spill(asset, encoding, variant)
+
+        self._assets[url] = asset
+        self._assets[hashed_url] = asset
+        self._by_name[name] = asset
+        logger.debug("Asset %s -> %s (%s)", url, hashed_url, ", ".join(
+            f"{encoding} {len(v) if isinstance(v, bytes) else os.path.getsize(v)}"
+            for encoding, v in asset.variants.items()
+        ))
+        return asset
+
+    def add_directory(self, directory: str, url_prefix: str) -> List[Asset]:
+        """Register every file in directory, manifests (*.json) after the files they list"""
+        names = sorted(os.listdir(directory), key=lambda n: (n.endswith(".json"), n))
+        return [
+            self.add(os.path.join(directory, name), f"{url_prefix}/{name}", links=name.endswith(".json"))
+            for name in names
+            if os.path.isfile(os.path.join(directory, name))
+        ]
+
+    def _rewrite_links(self, data: bytes, url: str) -> bytes:
+        """Point quoted references to registered assets at their hashed URLs"""
+        text = data.decode("utf-8")
+        directory = url.rsplit("/", 1)[0]
+        for name, asset in self._by_name.items():
+            hashed_directory, hashed_name = asset.hashed_url.rsplit("/", 1)
+            target = hashed_name if hashed_directory == directory else asset.hashed_url
+            text = text.replace(f'"{name}"', f'"{target}"')
+        return text.encode("utf-8")
+
+    def _spill(self, asset: Asset, encoding: str, data: bytes) -> str:
+        """Write a variant of a large asset to the cache directory and return its path"""
+        suffix = "" if encoding == "identity" else f".{encoding}"
+        path = os.path.join(self.cache_dir, asset.hashed_url.rsplit("/", 1)[1] + suffix)
+        if not os.path.exists(path):
+            # Workers on one host share the directory, so write under a private name first
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return path
+
+    def response(self, request: Request, url: str) -> Response:
+        """Serve url with content negotiation, conditional requests and Range support"""
+        asset = self._assets.get(url)
+        if asset is None:
+            ASSET_RESPONSES.labels(status="404").inc()
+            return Response(status_code=404)
+
+        range_header = request.headers.get("range")
+        encoding = "identity"
+        if range_header is None:
+            accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+            encoding = next((e for e in ENCODINGS if e in asset.variants and e in accepted), "identity")
+
+        etag = asset.etag(encoding)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if url == asset.hashed_url else REVALIDATE_CACHE_CONTROL,
+            "Vary": "Accept-Encoding",
+            "Accept-Ranges": "bytes",
+        }
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            if "*" in tags or etag in tags:
+                ASSET_RESPONSES.labels(status="304").inc()
+                return Response(status_code=304, headers=headers)
+
+        variant = asset.variants[encoding]
+        if not isinstance(variant, bytes):
+            # FileResponse handles Range and If-Range against the ETag set here
+            ASSET_RESPONSES.labels(status="206" if range_header else "200").inc()
+            ASSET_BYTES_SENT.labels(encoding=encoding).inc(os.path.getsize(variant))
+            return FileResponse(variant, media_type=asset.media_type, headers=headers)
+
+        if range_header is not None and request.headers.get("if-range", etag) == etag:
+            try:
+                span = byte_range(range_header, len(variant))
+            except ValueError:
+                ASSET_RESPONSES.labels(status="416").inc()
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{len(variant)}"})
+            if span is not None:
+                start, end = span
+                headers["Content-Range"] = f"bytes {start}-{end - 1}/{len(variant)}"
+                ASSET_RESPONSES.labels(status="206").inc()
+                ASSET_BYTES_SENT.labels(encoding=encoding).inc(end - start)
+                return Response(variant[start:end], status_code=206, media_type=asset.media_type, headers=headers)
+
+        ASSET_RESPONSES.labels(status="200").inc()
+        ASSET_BYTES_SENT.labels(encoding=encoding).inc(len(variant))
+        return Response(variant, media_type=asset.media_type, headers=headers)
+
+
+def load_client_assets(store: AssetStore):
+    """Register the face models, the client scripts and the page that links them"""
+    store.add_directory("models", "/models")
+    for name in ("ws_protocol.js", "video_upload.js", "body_language.js"):
+        store.add(name, f"/{name}", hashed_prefix="/assets")
+    store.add("speech_recognition_client.html", "/", hashed_prefix="/assets", links=True)
+    logger.info("Client assets ready (%s)", ", ".join(ENCODINGS))
@@ -0,0 +1,143 @@
+"""Measure event-loop lag from per-message logging at N simulated clients.
+
+Each client produces the WebSocket traffic the browser sends (interim
+transcripts every 100ms, a heartbeat every second, a body language frame
+every 2s, a final transcript every 3s) and logs it the way main.py does.
+A probe task sleeps 5ms at a time and records how late it wakes up. Modes:
+
+    off       - no logging at all
+    print     - the old synchronous print(..., flush=True) per message
+    pipeline  - log_pipeline at INFO (per-message events filtered by level)
+    sampled   - log_pipeline at DEBUG with per-client sampling
+
+Output goes through a pipe to a separate process, like stdout feeding a log
+collector. Run from the Tonalysis directory:
+
+    python benchmarks/bench_logging.py --clients 200 --seconds 5 --json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_pipeline import client_logger, setup_logging, shutdown_logging  # noqa: E402
+
+MODES = ("off", "print", "pipeline", "sampled")
+PROBE_INTERVAL = 0.005
+TICK = 0.1
+
+logger = logging.getLogger("tonalysis.bench")
+
+
+class PipeSink:
+    """Text stream into `cat > /dev/null` that counts what was written"""
+
+    def __init__(self):
+        self.process = subprocess.Popen(["cat"], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+        self.bytes = 0
+
+    def write(self, text: str) -> int:
+        data = text.encode()
+        self.bytes += len(data)
+        self.process.stdin.write(data)
+        return len(text)
+
+    def flush(self):
+        self.process.stdin.flush()
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+async def client(client_id: str, mode: str, out, stop_at: float):
+    log = client_logger(logger, client_id)
+    tick = 0
+    while time.perf_counter() < stop_at:
+        tick += 1
+        text = f"so today I want to talk about the project {tick}"
+        message = json.dumps({"type": "streaming_transcription", "text": text, "is_final": tick % 30 == 0})
+        data = json.loads(message)
+
+        if mode == "print":
+            print(f"\r[Client #{client_id}] Speaking: {data['text']}", end="", flush=True, file=out)
+            if tick % 10 == 0:
+                print(f"[Client #{client_id}] Heartbeat received", flush=True, file=out)
+            if tick % 20 == 0:
+                print(f"[Client #{client_id}] Body language: happy, good, alert", flush=True, file=out)
+            if data["is_final"]:
+                print(f"\n[Client #{client_id}] Final: {data['text']}", flush=True, file=out)
+        elif mode != "off":
+            log.debug("Speaking: %s", data["text"], extra={"event": "interim"})
+            if tick % 10 == 0:
+                log.debug("Heartbeat received", extra={"event": "heartbeat"})
+            if tick % 20 == 0:
+                log.debug("Body language: %s, %s, %s", "happy", "good", "alert",
+                          extra={"event": "body_language_frame"})
+            if data["is_final"]:
+                log.info("Final: %s", data["text"])
+
+        await asyncio.sleep(TICK)
+
+
+async def probe(stop_at: float) -> list:
+    lags = []
+    while time.perf_counter() < stop_at:
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - started - PROBE_INTERVAL)
+    return lags
+
+
+async def run(mode: str, clients: int, seconds: float, out) -> dict:
+    stop_at = time.perf_counter() + seconds
+    tasks = [asyncio.create_task(client(f"c{i}", mode, out, stop_at)) for i in range(clients)]
+    lags = await probe(stop_at)
+    await asyncio.gather(*tasks)
+    lags.sort()
+    return {
+        "mode": mode,
+        "clients": clients,
+        "lag_p50_ms": lags[len(lags) // 2] * 1000,
+        "lag_p99_ms": lags[int(len(lags) * 0.99)] * 1000,
+        "lag_max_ms": lags[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200, help="simulated WebSocket clients")
+    parser.add_argument("--seconds", type=float, default=5, help="duration of each mode")
+    parser.add_argument("--modes", default=",".join(MODES), help="comma-separated modes to run")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = []
+    for mode in args.modes.split(","):
+        out = PipeSink()
+        if mode in ("pipeline", "sampled"):
+            setup_logging("DEBUG" if mode == "sampled" else "INFO", stream=out)
+        try:
+            results.append(asyncio.run(run(mode, args.clients, args.seconds, out)))
+        finally:
+            shutdown_logging()
+            out.close()
+        results[-1]["log_bytes"] = out.bytes
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'mode':<10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'log bytes':>14}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['lag_p50_ms']:>10.2f}{r['lag_p99_ms']:>10.2f}{r['lag_max_ms']:>10.2f}{r['log_bytes']:>14,}")
+
+
+if __name__ == "__main__":
+    main()
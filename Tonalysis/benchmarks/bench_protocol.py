@@ -0,0 +1,110 @@
+"""Compare the cost of receiving body language frames over protocol v1 and v2.
+
+v1 sends each frame as its own JSON text message; v2 packs a batch of
+frames into one binary message. Both paths are decoded and folded into a
+BodyLanguageAggregator the way the WebSocket endpoint does. Run from the
+Tonalysis directory:
+
+    python benchmarks/bench_protocol.py --frames 100000 --batch 5 --json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from body_aggregates import BodyLanguageAggregator  # noqa: E402
+from protocol import anchor_timestamps, decode_body_frames, encode_body_frames  # noqa: E402
+from session_buffers import (  # noqa: E402
+    EMOTIONS, POSTURES, FATIGUE_LEVELS, encode_emotion, encode_fatigue, encode_posture
+)
+
+
+def v1_messages(count: int) -> list:
+    rng = random.Random(42)
+    return [json.dumps({
+        "type": "body_language",
+        "emotion": rng.choice(EMOTIONS),
+        "posture": {"label": rng.choice(POSTURES), "confidence": 0.8},
+        "fatigue": {"label": rng.choice(FATIGUE_LEVELS), "confidence": 0.7},
+        "confidence": {"emotion": 0.9, "posture": 0.8, "fatigue": 0.7},
+        "timestamp": "2025-01-01T12:00:00.000Z",
+    }) for _ in range(count)]
+
+
+def v2_messages(count: int, batch: int) -> list:
+    rng = random.Random(42)
+    frames = [
+        (1_700_000_000.0 + 2 * i, rng.randrange(len(EMOTIONS)), rng.randrange(len(POSTURES)),
+         rng.randrange(len(FATIGUE_LEVELS)))
+        for i in range(count)
+    ]
+    return [encode_body_frames(frames[i:i + batch]) for i in range(0, count, batch)]
+
+
+def receive_v1(messages: list):
+    aggregator = BodyLanguageAggregator()
+    for message in messages:
+        data = json.loads(message)
+        aggregator.add(
+            time.time(),
+            encode_emotion(data.get("emotion", "neutral")),
+            encode_posture(data.get("posture", {}).get("label")),
+            encode_fatigue(data.get("fatigue", {}).get("label")),
+        )
+
+
+def receive_v2(messages: list):
+    aggregator = BodyLanguageAggregator()
+    for message in messages:
+        for frame in anchor_timestamps(list(decode_body_frames(message))):
+            aggregator.add(*frame)
+
+
+def measure(name: str, receive, messages: list, frames: int) -> dict:
+    tracemalloc.start()
+    receive(messages)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Timed separately - tracemalloc slows allocation-heavy code
+    started = time.perf_counter()
+    receive(messages)
+    elapsed = time.perf_counter() - started
+    return {
+        "protocol": name,
+        "frames": frames,
+        "messages": len(messages),
+        "bytes_per_frame": sum(len(m) for m in messages) / frames,
+        "us_per_frame": elapsed / frames * 1e6,
+        "peak_alloc_bytes": peak,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=100000, help="body language frames to receive")
+    parser.add_argument("--batch", type=int, default=5, help="frames per v2 message")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = [
+        measure("v1_json", receive_v1, v1_messages(args.frames), args.frames),
+        measure("v2_binary", receive_v2, v2_messages(args.frames, args.batch), args.frames),
+    ]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'protocol':<12}{'messages':>10}{'bytes/frame':>14}{'us/frame':>10}{'peak alloc':>14}")
+    for r in results:
+        print(f"{r['protocol']:<12}{r['messages']:>10,}{r['bytes_per_frame']:>14.1f}"
+              f"{r['us_per_frame']:>10.2f}{r['peak_alloc_bytes']:>14,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Measure per-session memory over a simulated hour-long practice session.
+
+Replays the traffic one client produces (a body language frame every 2s, a
+final transcript every 3s, speech analysis every 10s and body language
+analysis every 30s) against a SessionState and reports the bytes it retains
+at intervals. Run from the Tonalysis directory:
+
+    python benchmarks/bench_session_memory.py --minutes 60 --json
+"""
+import argparse
+from array import array
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_buffers import (  # noqa: E402
+    EMOTIONS, POSTURES, FATIGUE_LEVELS, encode_emotion, encode_posture, encode_fatigue
+)
+from session_store import SessionState  # noqa: E402
+
+WORDS = "so today I want to talk about um the project and like how we basically shipped it".split()
+FEEDBACK = "Nice steady pace. Try replacing 'um' with a short pause and emphasize your key point. " * 3
+
+
+def simulate(minutes: int, report_every: int) -> list:
+    rng = random.Random(42)
+    # Preallocated so recording a reading does not itself show up as growth
+    readings = array("q", [0] * (minutes // report_every))
+
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    session = SessionState("bench")
+    for second in range(1, minutes * 60 + 1):
+        now = 1_700_000_000.0 + second
+        if second % 2 == 0:
+            session.body_aggregates.add(
+                now,
+                encode_emotion(rng.choice(EMOTIONS)),
+                encode_posture(rng.choice(POSTURES)),
+                encode_fatigue(rng.choice(FATIGUE_LEVELS)),
+            )
+        if second % 3 == 0:
+            text = " ".join(rng.choice(WORDS) for _ in range(8))
+            session.transcript_buffer.append(session.speech_metrics.add_final(text, now))
+        if second % 10 == 0:
+            session.transcript_buffer.text()
+            session.transcript_buffer.clear()
+            session.speech_metrics.take_window()
+            session.analysis_history.append(f"{FEEDBACK}{second:06d}")
+            session.speech_metrics.analyses_count += 1
+        if second % 30 == 0:
+            session.body_aggregates.take_current().summary()
+            session.body_language_history.append(f"{FEEDBACK}{second:06d}")
+            session.body_analyses_count += 1
+
+        if second % (report_every * 60) == 0:
+            gc.collect()
+            readings[second // (report_every * 60) - 1] = tracemalloc.get_traced_memory()[0] - baseline
+
+    tracemalloc.stop()
+    return [
+        {"minute": (i + 1) * report_every, "session_bytes": reading}
+        for i, reading in enumerate(readings)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=int, default=60, help="simulated session length")
+    parser.add_argument("--report-every", type=int, default=5, help="minutes between samples")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    samples = simulate(args.minutes, args.report_every)
+    if args.json:
+        print(json.dumps(samples, indent=2))
+        return
+
+    print(f"{'minute':>8}{'session bytes':>16}")
+    for s in samples:
+        print(f"{s['minute']:>8}{s['session_bytes']:>16,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Measure offline replay throughput (sessions/s) on synthetic session logs.
+
+Writes sessions shaped like live traffic (a final transcript every ~3s, a
+body language frame every ~2s, windows every 10s and 30s) with SessionLog,
+then replays them with session_replay for each worker count. Run from the
+Tonalysis directory:
+
+    python benchmarks/bench_session_replay.py --sessions 2000 --minutes 5 --workers 1 2 4 --json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_log import SessionLog, segment_paths  # noqa: E402
+from session_replay import LLM_MODES, replay  # noqa: E402
+
+WORDS = ("so today I want to talk about the project and how we shipped it on time "
+         "with a small team um uh like you know basically actually literally").split()
+
+
+def write_sessions(directory: str, sessions: int, minutes: float, segment_mb: int) -> int:
+    """Record synthetic sessions and return the bytes written"""
+    rng = random.Random(42)
+    log = SessionLog(directory, max_bytes=segment_mb * 1024 * 1024)
+    start = 1_700_000_000.0
+    for n in range(sessions):
+        recorder = log.start(f"bench-{n}", start)
+        utterance = ""
+        for second in range(int(minutes * 60)):
+            now = start + second
+            if second % 3 == 0:
+                # The browser resends the whole utterance with each final result
+                utterance = " ".join(rng.choice(WORDS) for _ in range(8)) if rng.random() < 0.3 else \
+                    f"{utterance} {' '.join(rng.choice(WORDS) for _ in range(6))}".strip()
+                recorder.transcript(utterance, now)
+            if second % 2 == 0:
+                recorder.body_frame(now, rng.randrange(7), rng.randrange(5), rng.randrange(5))
+            if second % 10 == 9:
+                recorder.window("speech", now)
+            if second % 30 == 29:
+                recorder.window("body_language", now)
+        recorder.close(start + minutes * 60)
+    log.close()
+    return sum(os.path.getsize(p) for p in segment_paths(directory))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=2000, help="sessions to record")
+    parser.add_argument("--minutes", type=float, default=5, help="length of each session")
+    parser.add_argument("--segment-mb", type=int, default=16, help="segment rotation size")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count()], help="pool sizes to try")
+    parser.add_argument("--llm", choices=LLM_MODES, default="stub", help="how windows are scored")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        size = write_sessions(directory, args.sessions, args.minutes, args.segment_mb)
+        write_seconds = time.perf_counter() - started
+        results = [replay(directory, args.llm, workers) for workers in args.workers]
+
+    if args.json:
+        print(json.dumps({"log_bytes": size, "write_seconds": write_seconds, "replays": results}, indent=2))
+        return
+
+    print(f"{args.sessions:,} sessions, {size / 1e6:.1f} MB of log written in {write_seconds:.2f}s")
+    print(f"{'workers':>8}{'sessions/s':>12}{'records/s':>12}{'windows':>10}{'seconds':>10}")
+    for r in results:
+        print(f"{r['workers']:>8}{r['sessions_per_second']:>12,.1f}{r['records_per_second']:>12,.0f}"
+              f"{r['windows']:>10,}{r['seconds']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Compare per-message cost of the old transcript scan with SpeechMetrics.
+
+The old path re-split the whole 10 second window and scanned a filler list
+per word (missing "you know" and "um," entirely). SpeechMetrics counts each
+final transcript once, as it arrives, with a single precompiled regex. Run
+from the Tonalysis directory:
+
+    python benchmarks/bench_speech_metrics.py --messages 50000 --json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from speech_metrics import SpeechMetrics  # noqa: E402
+
+WORDS = ("so today I want to talk about the project and how we shipped it on time "
+         "with a small team um uh like you know basically actually literally").split()
+FILLER_WORDS = ["um", "uh", "like", "you know", "basically", "actually", "literally"]
+# A final transcript roughly every 3s, analysis every 10s
+MESSAGES_PER_WINDOW = 3
+
+
+def build_corpus(messages: int, words_per_message: int) -> list:
+    rng = random.Random(42)
+    corpus = []
+    for _ in range(messages):
+        words = [rng.choice(WORDS) for _ in range(words_per_message)]
+        if rng.random() < 0.2:
+            words[rng.randrange(len(words))] += ","
+        corpus.append(" ".join(words))
+    return corpus
+
+
+def run_legacy(corpus: list) -> dict:
+    window = []
+    fillers = 0
+    start = time.perf_counter()
+    for i, text in enumerate(corpus, 1):
+        window.append(text)
+        if i % MESSAGES_PER_WINDOW == 0:
+            transcript = " ".join(window)
+            words = transcript.split()
+            len(words)
+            len(set(words))
+            fillers += sum(1 for word in words if word.lower() in FILLER_WORDS)
+            window.clear()
+    elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "fillers": fillers}
+
+
+def run_speech_metrics(corpus: list) -> dict:
+    metrics = SpeechMetrics()
+    fillers = 0
+    start = time.perf_counter()
+    for i, text in enumerate(corpus, 1):
+        metrics.add_final(text, 1_700_000_000.0 + 3 * i)
+        if i % MESSAGES_PER_WINDOW == 0:
+            window = metrics.take_window()
+            fillers += window.fillers
+    elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "fillers": fillers}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=50000, help="final transcripts to replay")
+    parser.add_argument("--words", type=int, default=12, help="words per final transcript")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.messages, args.words)
+    results = []
+    for name, run in (("legacy_split_scan", run_legacy), ("speech_metrics", run_speech_metrics)):
+        r = run(corpus)
+        results.append({
+            "path": name,
+            "messages": args.messages,
+            "us_per_message": r["seconds"] / args.messages * 1e6,
+            "messages_per_second": args.messages / r["seconds"],
+            "fillers_found": r["fillers"],
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'path':<20}{'us/msg':>10}{'msgs/s':>12}{'fillers':>10}")
+    for r in results:
+        print(f"{r['path']:<20}{r['us_per_message']:>10.1f}{r['messages_per_second']:>12,.0f}{r['fillers_found']:>10,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Benchmark the video preparation paths used by /api/analyze-video.
+
+Generates synthetic recordings with ffmpeg's test sources and times each path
+(passthrough, remux, encode), reporting wall seconds and CPU-seconds per
+minute of video. Run from the Tonalysis directory:
+
+    python benchmarks/bench_transcode.py --seconds 60 --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from video_pipeline import build_ffmpeg_args, probe_video, run_ffmpeg  # noqa: E402
+
+# Sources shaped like what browsers' MediaRecorder produces
+SOURCES = {
+    "webm_vp9_opus": ["-c:v", "libvpx-vp9", "-deadline", "realtime", "-cpu-used", "8", "-c:a", "libopus"],
+    "mkv_h264_opus": ["-c:v", "libx264", "-preset", "ultrafast", "-c:a", "libopus"],
+}
+
+
+def make_source(name: str, seconds: int, workdir: str) -> str:
+    suffix = ".webm" if name.startswith("webm") else ".mkv"
+    path = os.path.join(workdir, name + suffix)
+    subprocess.run([
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=30:duration={seconds}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+        *SOURCES[name], "-y", path
+    ], check=True)
+    return path
+
+
+def child_cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+async def time_path(mode: str, src_path: str, info: dict, workdir: str) -> dict:
+    dst_path = os.path.join(workdir, f"out_{mode}.mp4")
+    cpu_before = child_cpu_seconds()
+    started = time.perf_counter()
+    if mode != "passthrough":
+        await run_ffmpeg(build_ffmpeg_args(mode, src_path, dst_path, info))
+    return {"wall_s": time.perf_counter() - started, "cpu_s": child_cpu_seconds() - cpu_before}
+
+
+async def run(seconds: int) -> list:
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for source in SOURCES:
+            src_path = make_source(source, seconds, workdir)
+            info = await probe_video(src_path)
+            modes = ["passthrough", "encode"]
+            if info["video_codec"] == "h264":
+                modes.insert(1, "remux")
+            for mode in modes:
+                timing = await time_path(mode, src_path, info, workdir)
+                minutes = seconds / 60
+                results.append({
+                    "source": source,
+                    "mode": mode,
+                    "video_seconds": seconds,
+                    "transcode_seconds": round(timing["wall_s"], 3),
+                    "transcode_s_per_video_min": round(timing["wall_s"] / minutes, 3),
+                    "cpu_s_per_video_min": round(timing["cpu_s"] / minutes, 3),
+                })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=int, default=30, help="length of each synthetic clip")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.seconds))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'source':<16}{'mode':<13}{'seconds':>10}{'s/video-min':>14}{'cpu-s/video-min':>18}")
+    for r in results:
+        print(f"{r['source']:<16}{r['mode']:<13}{r['transcode_seconds']:>10.2f}"
+              f"{r['transcode_s_per_video_min']:>14.2f}{r['cpu_s_per_video_min']:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Local stand-ins for Gemini and TwelveLabs, and a server that uses them.
+
+The fakes answer with canned text after a configurable latency and fail a
+configurable fraction of calls, so the app can be load tested without API
+keys or network access. Run the app against them from the Tonalysis
+directory:
+
+    python benchmarks/fake_backends.py --port 8001 --gemini-latency 1.5 --gemini-error-rate 0.05
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.genai import errors  # noqa: E402
+
+FEEDBACK = (
+    "Your pace was steady and easy to follow - try pausing briefly after key points.",
+    "Nice variety in your word choice; watch the repeated 'so' at the start of sentences.",
+    "Good energy here. Lift your chin slightly and keep your shoulders relaxed.",
+    "You sound more confident than earlier - keep emphasising the main idea of each sentence.",
+)
+
+ANALYSIS = (
+    "**Speech Analysis**: Clear articulation with a comfortable pace. ",
+    "A few filler words appear in the first minute. ",
+    "**Body Language Analysis**: Upright posture and steady eye contact. ",
+    "**Recommendations**: 1. Pause before transitions. 2. Vary your pitch. 3. Slow down near the end.",
+)
+
+
+def _delay(latency: float) -> float:
+    """A latency around the configured mean, spread like a real API's"""
+    return latency * random.uniform(0.5, 1.5) if latency > 0 else 0.0
+
+
+class FakeGeminiClient:
+    """Answers aio.models.generate_content like google-genai, with latency and 503s"""
+
+    def __init__(self, latency: float = 1.0, error_rate: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self.generate_content))
+
+    async def generate_content(self, model: str, contents):
+        self.calls += 1
+        await asyncio.sleep(_delay(self.latency))
+        if random.random() < self.error_rate:
+            raise errors.ServerError(503, {"error": {"code": 503, "message": "Fake overload", "status": "UNAVAILABLE"}})
+        return SimpleNamespace(text=random.choice(FEEDBACK))
+
+
+class FakeTask:
+    def __init__(self, client: "FakeTwelveLabsClient", task_id: str):
+        self.client = client
+        self.id = task_id
+        self.video_id = f"video-{task_id}"
+        self.status = "pending"
+
+    def wait_for_done(self, sleep_interval: float = 1.0, callback=None):
+        steps = 3
+        for status in ("indexing",) * steps:
+            time.sleep(_delay(self.client.latency) / steps)
+            self.status = status
+            if callback is not None:
+                callback(self)
+        self.status = "failed" if random.random() < self.client.error_rate else "ready"
+        return self
+
+
+class FakeTwelveLabsClient:
+    """The parts of the TwelveLabs SDK the app uses: index, task, analyze_stream and gist.
+
+    Each phase takes about `latency` seconds; `error_rate` of the indexing tasks fail.
+    Like the SDK, it is blocking and is called from worker threads.
+    """
+
+    def __init__(self, latency: float = 2.0, error_rate: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self._tasks = 0
+        self.index = SimpleNamespace(
+            list=lambda: [SimpleNamespace(id="fake-index", name="speech-therapy-sessions")],
+            create=lambda name, models: SimpleNamespace(id="fake-index", name=name),
+        )
+        self.task = SimpleNamespace(create=self._create_task)
+
+    def _create_task(self, index_id: str, file: str) -> FakeTask:
+        # The SDK reads the whole file to upload it
+        with open(file, "rb") as f:
+            while f.read(1 << 20):
+                pass
+        time.sleep(_delay(self.latency))
+        self._tasks += 1
+        return FakeTask(self, f"task-{self._tasks}")
+
+    def analyze_stream(self, video_id: str, prompt: str):
+        for text in ANALYSIS:
+            time.sleep(_delay(self.latency) / len(ANALYSIS))
+            yield text
+
+    def gist(self, video_id: str, types):
+        time.sleep(_delay(self.latency))
+        return SimpleNamespace(title="Practice Session", topics=["public speaking"], hashtags=["practice"])
+
+
+def install(app_module, gemini: FakeGeminiClient, twelvelabs: FakeTwelveLabsClient):
+    """Point an imported main module at the fakes"""
+    app_module.dispatcher.client_factory = lambda: gemini
+    app_module.index_resolver.get_client = lambda: twelvelabs
+    app_module.get_twelvelabs_client = lambda: twelvelabs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--gemini-latency", type=float, default=1.0, help="mean seconds per Gemini call")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0, help="fraction of Gemini calls that 503")
+    parser.add_argument("--twelvelabs-latency", type=float, default=2.0, help="mean seconds per TwelveLabs phase")
+    parser.add_argument("--twelvelabs-error-rate", type=float, default=0.0, help="fraction of indexing tasks that fail")
+    parser.add_argument("--log-level", default="WARNING", help="LOG_LEVEL for the app")
+    args = parser.parse_args()
+
+    # Keep the fake index id out of the real index cache, and never pick up real keys
+    os.environ["TWELVELABS_INDEX_CACHE"] = os.path.join(tempfile.gettempdir(), "tonalysis_fake_index.json")
+    os.environ["LOG_LEVEL"] = args.log_level.upper()
+    os.environ.setdefault("GEMINI_API_KEY", "fake")
+    os.environ.setdefault("TWELVELABS_API_KEY", "fake")
+
+    import uvicorn
+    import main as app_module
+
+    install(
+        app_module,
+        FakeGeminiClient(args.gemini_latency, args.gemini_error_rate),
+        FakeTwelveLabsClient(args.twelvelabs_latency, args.twelvelabs_error_rate),
+    )
+    uvicorn.run(app_module.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
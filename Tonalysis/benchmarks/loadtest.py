@@ -0,0 +1,457 @@
+"""Load test the server with simulated practice sessions and video uploads.
+
+Each simulated client replays the traffic the browser sends over
+/ws/text/{client_id}: an interim transcript every 250ms, a final one every
+3s, a body language frame every 2s and a heartbeat every 30s (protocol v1
+JSON, or v2 batches and binary frames) and counts the feedback it gets back.
+Feedback latency - from an analysis window closing to its feedback being
+sent - comes from the server's /metrics, since only the server knows when
+its windows close. After the WebSocket phase, concurrent uploads go to
+/api/analyze-video and are polled until done.
+
+Unless --url is given, the app is started with benchmarks/fake_backends.py
+so Gemini and TwelveLabs are local stand-ins with the configured latency
+and error rate; RSS and CPU are then read from /proc for that process.
+Event loop lag also comes from /metrics. Run from the Tonalysis
+directory:
+
+    python benchmarks/loadtest.py --sessions 50 --duration 60 --videos 4 --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from protocol import encode_body_frames, encode_transcription  # noqa: E402
+from session_buffers import EMOTIONS, POSTURES, FATIGUE_LEVELS  # noqa: E402
+from telemetry import LAG_BUCKETS, REQUEST_BUCKETS, bucket_quantile  # noqa: E402
+
+TICK = 0.25
+FINAL_EVERY = 12  # ticks, 3s
+BODY_EVERY = 8  # ticks, 2s
+BODY_FLUSH_EVERY = 40  # ticks, 10s (v2 batches)
+HEARTBEAT_EVERY = 120  # ticks, 30s
+
+FEEDBACK_TYPES = {"analysis": "speech", "body_language_feedback": "body_language"}
+
+WORDS = (
+    "so today I want to talk about how our team shipped the new onboarding flow and um what we "
+    "learned along the way basically the first version was too long so we cut it down like by half "
+    "and the results were honestly better than we expected you know people finished it faster and "
+    "asked fewer questions which means support had more time for the harder problems"
+).split()
+
+_SAMPLE = re.compile(r'^([a-z_]+)(?:\{(.*)\})? (\S+)$')
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def latency_ms(values: List[float]) -> Dict:
+    p50, p99 = percentile(values, 0.5), percentile(values, 0.99)
+    return {
+        "count": len(values),
+        "p50": round(p50 * 1000, 1) if p50 is not None else None,
+        "p99": round(p99 * 1000, 1) if p99 is not None else None,
+    }
+
+
+class ServerProcess:
+    """CPU and RSS of the server process, read from /proc"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.ticks_per_second = os.sysconf("SC_CLK_TCK")
+
+    def rss(self) -> int:
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    def cpu_seconds(self) -> float:
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        # utime and stime are fields 14 and 15 of the whole line
+        return (int(fields[11]) + int(fields[12])) / self.ticks_per_second
+
+
+def start_server(args) -> (subprocess.Popen, str):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    command = [
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_backends.py"),
+        "--port", str(port),
+        "--gemini-latency", str(args.gemini_latency),
+        "--gemini-error-rate", str(args.gemini_error_rate),
+        "--twelvelabs-latency", str(args.twelvelabs_latency),
+        "--twelvelabs-error-rate", str(args.twelvelabs_error_rate),
+        "--log-level", args.log_level,
+    ]
+    process = subprocess.Popen(command, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            httpx.get(f"{base_url}/api", timeout=1)
+            return process, base_url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not start within 30s")
+
+
+async def scrape(client: httpx.AsyncClient, base_url: str) -> Dict[str, float]:
+    """Samples from /metrics keyed by name and label string"""
+    response = await client.get(f"{base_url}/metrics")
+    samples = {}
+    for line in response.text.splitlines():
+        match = _SAMPLE.match(line)
+        if match:
+            name, labels, value = match.groups()
+            samples[f"{name}{{{labels}}}" if labels else name] = float(value)
+    return samples
+
+
+def histogram_delta(before: Dict[str, float], after: Dict[str, float], name: str, bounds, labels: str = "") -> Dict:
+    """count, p50 and p99 (ms) of a histogram's observations between two scrapes"""
+    def sample(suffix: str, extra: str = "") -> float:
+        label_string = ",".join(part for part in (labels, extra) if part)
+        key = f"{name}{suffix}{{{label_string}}}" if label_string else f"{name}{suffix}"
+        return after.get(key, 0) - before.get(key, 0)
+
+    cumulative = [sample("_bucket", f'le="{float(bound)!r}"') for bound in bounds]
+    total = sample("_count")
+    counts = [cumulative[0]] + [b - a for a, b in zip(cumulative, cumulative[1:])] + [total - cumulative[-1]]
+    result = {"count": int(total)}
+    for key, q in (("p50", 0.5), ("p99", 0.99)):
+        value = bucket_quantile(bounds, counts, q)
+        result[key] = round(value * 1000, 2) if value is not None else None
+    return result
+
+
+def metrics_delta(before: Dict[str, float], after: Dict[str, float]) -> Dict:
+    """Feedback latency, event loop lag and WebSocket message count between two scrapes"""
+    messages = sum(
+        value - before.get(key, 0) for key, value in after.items() if key.startswith("tonalysis_ws_messages_total")
+    )
+    return {
+        "feedback_latency_ms": {
+            stream: histogram_delta(before, after, "tonalysis_feedback_seconds", REQUEST_BUCKETS, f'stream="{stream}"')
+            for stream in FEEDBACK_TYPES.values()
+        },
+        "event_loop_lag_ms": histogram_delta(before, after, "tonalysis_event_loop_lag_seconds", LAG_BUCKETS),
+        "ws_messages": int(messages),
+        "interval_stretch": after.get("tonalysis_analysis_interval_stretch"),
+    }
+
+
+class SessionStats:
+    def __init__(self):
+        self.connected = 0
+        self.failed = 0
+        self.sent = 0
+        self.bytes_sent = 0
+        self.feedback = {kind: 0 for kind in FEEDBACK_TYPES.values()}
+
+
+def body_frame(rng: random.Random) -> Dict:
+    return {
+        "type": "body_language",
+        "emotion": rng.choice(EMOTIONS),
+        "posture": {"label": rng.choice(POSTURES[1:]), "confidence": 0.8},
+        "fatigue": {"label": rng.choice(FATIGUE_LEVELS[1:]), "confidence": 0.7},
+        "confidence": {"emotion": 0.9, "posture": 0.8, "fatigue": 0.7},
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+async def run_session(ws_url: str, protocol: int, stop_at: float, drain: float,
+                      stats: SessionStats, rng: random.Random):
+    try:
+        ws = await websockets.connect(ws_url, max_size=None, ping_interval=None)
+    except (OSError, websockets.WebSocketException):
+        stats.failed += 1
+        return
+    stats.connected += 1
+
+    negotiated = asyncio.Event()
+
+    async def send(message):
+        data = message if isinstance(message, bytes) else json.dumps(message)
+        await ws.send(data)
+        stats.sent += 1
+        stats.bytes_sent += len(data)
+
+    async def receive():
+        async for raw in ws:
+            if isinstance(raw, bytes):
+                continue
+            data = json.loads(raw)
+            if data.get("type") == "hello":
+                negotiated.set()
+                continue
+            kind = FEEDBACK_TYPES.get(data.get("type"))
+            if kind is not None:
+                stats.feedback[kind] += 1
+
+    receiver = asyncio.create_task(receive())
+    try:
+        binary = False
+        if protocol >= 2:
+            await send({"type": "hello", "protocol": 2, "encodings": ["binary"]})
+            try:
+                await asyncio.wait_for(negotiated.wait(), 5)
+                binary = True
+            except asyncio.TimeoutError:
+                pass
+
+        utterance = []
+        frames = []
+        offset = rng.randrange(len(WORDS))
+        started = time.perf_counter()
+        tick = 0
+        while time.perf_counter() < stop_at:
+            tick += 1
+            utterance.extend(WORDS[(offset + tick * 2 + i) % len(WORDS)] for i in range(rng.randint(1, 2)))
+            is_final = tick % FINAL_EVERY == 0
+            text = " ".join(utterance)
+
+            if binary:
+                # Interim results are throttled to one per 500ms, like ws_protocol.js
+                if is_final or tick % 2 == 0:
+                    await send(encode_transcription(text, is_final, time.time()))
+            else:
+                await send({"type": "streaming_transcription", "text": text, "is_final": is_final,
+                            "timestamp": datetime.now(timezone.utc).isoformat()})
+            if is_final:
+                utterance = []
+
+            if tick % BODY_EVERY == 0:
+                frame = body_frame(rng)
+                if binary:
+                    frames.append((time.time(), EMOTIONS.index(frame["emotion"]),
+                                   POSTURES.index(frame["posture"]["label"]),
+                                   FATIGUE_LEVELS.index(frame["fatigue"]["label"])))
+                else:
+                    await send(frame)
+            if binary and frames and tick % BODY_FLUSH_EVERY == 0:
+                await send(encode_body_frames(frames))
+                frames = []
+
+            if tick % HEARTBEAT_EVERY == 0:
+                await send({"type": "heartbeat", "timestamp": datetime.now(timezone.utc).isoformat()})
+
+            # Keep to the schedule without bursting after a slow send
+            await asyncio.sleep(max(0.0, started + tick * TICK - time.perf_counter()))
+
+        # Give analyses already in flight a chance to arrive
+        await asyncio.sleep(max(0.0, stop_at + drain - time.perf_counter()))
+    except websockets.ConnectionClosed:
+        pass
+    finally:
+        receiver.cancel()
+        await ws.close()
+
+
+async def websocket_phase(args, base_url: str, server: Optional[ServerProcess], http: httpx.AsyncClient) -> Dict:
+    stats = SessionStats()
+    ws_base = base_url.replace("http", "ws", 1)
+    rss_before = server.rss() if server else None
+    cpu_before = server.cpu_seconds() if server else None
+    metrics_before = await scrape(http, base_url)
+
+    started = time.perf_counter()
+    stop_at = started + args.ramp + args.duration
+    tasks = []
+    for i in range(args.sessions):
+        tasks.append(asyncio.create_task(run_session(
+            f"{ws_base}/ws/text/load-{i}", args.protocol, stop_at, args.drain, stats, random.Random(i)
+        )))
+        await asyncio.sleep(args.ramp / max(1, args.sessions))
+
+    # RSS with every session open, just before they stop sending
+    await asyncio.sleep(max(0.0, stop_at - 1 - time.perf_counter()))
+    rss_loaded = server.rss() if server else None
+    metrics_after = await scrape(http, base_url)
+    cpu_after = server.cpu_seconds() if server else None
+    elapsed = time.perf_counter() - started
+
+    await asyncio.gather(*tasks)
+
+    result = {
+        "sessions": args.sessions,
+        "connected": stats.connected,
+        "failed": stats.failed,
+        "protocol": args.protocol,
+        "seconds": round(elapsed, 1),
+        "messages_sent": stats.sent,
+        "bytes_sent": stats.bytes_sent,
+        "throughput_msgs_per_s": round(stats.sent / elapsed, 1),
+        "feedback_received": stats.feedback,
+        **metrics_delta(metrics_before, metrics_after),
+    }
+    if server:
+        result["rss_baseline_bytes"] = rss_before
+        result["rss_loaded_bytes"] = rss_loaded
+        result["rss_per_session_bytes"] = (rss_loaded - rss_before) // max(1, stats.connected)
+        result["cpu_seconds"] = round(cpu_after - cpu_before, 2)
+    return result
+
+
+async def upload_video(http: httpx.AsyncClient, base_url: str, index: int, payload: bytes,
+                       seconds: int) -> Dict:
+    started = time.perf_counter()
+    response = await http.post(
+        f"{base_url}/api/analyze-video",
+        files={"video": ("session.webm", payload, "video/webm")},
+        data={"client_id": f"load-video-{index}", "duration": str(seconds)},
+    )
+    uploaded = time.perf_counter()
+    if response.status_code != 202:
+        return {"status": f"http {response.status_code}", "upload_seconds": uploaded - started}
+
+    status_url = f"{base_url}{response.json()['status_url']}"
+    while True:
+        job = (await http.get(status_url)).json()
+        if job["status"] in ("complete", "failed"):
+            break
+        await asyncio.sleep(0.25)
+    return {
+        "status": job["status"],
+        "upload_seconds": uploaded - started,
+        "job_seconds": time.perf_counter() - started,
+    }
+
+
+async def video_phase(args, base_url: str, server: Optional[ServerProcess], http: httpx.AsyncClient) -> Dict:
+    payload = os.urandom(int(args.video_mb * 1024 * 1024))
+    cpu_before = server.cpu_seconds() if server else None
+    metrics_before = await scrape(http, base_url)
+
+    started = time.perf_counter()
+    jobs = await asyncio.gather(*(
+        upload_video(http, base_url, i, payload, args.video_seconds) for i in range(args.videos)
+    ))
+    elapsed = time.perf_counter() - started
+
+    metrics_after = await scrape(http, base_url)
+    video_minutes = args.videos * args.video_seconds / 60
+    uploaded_mb = args.videos * args.video_mb
+    upload_seconds = [job["upload_seconds"] for job in jobs]
+    result = {
+        "videos": args.videos,
+        "complete": sum(job["status"] == "complete" for job in jobs),
+        "failed": sum(job["status"] != "complete" for job in jobs),
+        "seconds": round(elapsed, 1),
+        "video_minutes": round(video_minutes, 2),
+        "upload_mb_per_s": round(uploaded_mb / max(upload_seconds), 1),
+        "upload_latency_ms": latency_ms(upload_seconds),
+        "job_latency_ms": latency_ms([job["job_seconds"] for job in jobs if "job_seconds" in job]),
+        "event_loop_lag_ms": metrics_delta(metrics_before, metrics_after)["event_loop_lag_ms"],
+    }
+    if server:
+        cpu = server.cpu_seconds() - cpu_before
+        result["cpu_seconds"] = round(cpu, 2)
+        result["cpu_seconds_per_video_minute"] = round(cpu / video_minutes, 3)
+    return result
+
+
+async def run(args, base_url: str, server: Optional[ServerProcess]) -> Dict:
+    async with httpx.AsyncClient(timeout=None) as http:
+        result = {"base_url": base_url}
+        if args.sessions:
+            result["websocket"] = await websocket_phase(args, base_url, server, http)
+        if args.videos:
+            result["video"] = await video_phase(args, base_url, server, http)
+        result["dispatch"] = (await http.get(f"{base_url}/api/dispatch-stats")).json()
+        result["analysis_gate"] = (await http.get(f"{base_url}/api/analysis-gate-stats")).json()
+        return result
+
+
+def print_report(result: Dict):
+    ws = result.get("websocket")
+    if ws:
+        print(f"WebSocket: {ws['connected']}/{ws['sessions']} sessions (v{ws['protocol']}), "
+              f"{ws['throughput_msgs_per_s']} msgs/s sent, {ws['ws_messages']} handled")
+        for kind, latency in ws["feedback_latency_ms"].items():
+            print(f"  {kind:<14} feedback {ws['feedback_received'][kind]:>6}  "
+                  f"p50 {latency['p50']} ms  p99 {latency['p99']} ms")
+        print(f"  event loop lag p50 {ws['event_loop_lag_ms']['p50']} ms  p99 {ws['event_loop_lag_ms']['p99']} ms")
+        print(f"  analysis interval stretch {ws['interval_stretch']}")
+        if "rss_per_session_bytes" in ws:
+            print(f"  RSS {ws['rss_baseline_bytes'] / 2**20:.1f} -> {ws['rss_loaded_bytes'] / 2**20:.1f} MiB, "
+                  f"{ws['rss_per_session_bytes'] / 1024:.1f} KiB/session, CPU {ws['cpu_seconds']}s")
+    video = result.get("video")
+    if video:
+        print(f"Video: {video['complete']}/{video['videos']} complete in {video['seconds']}s, "
+              f"upload {video['upload_mb_per_s']} MB/s, job p50 {video['job_latency_ms']['p50']} ms "
+              f"p99 {video['job_latency_ms']['p99']} ms")
+        print(f"  event loop lag p50 {video['event_loop_lag_ms']['p50']} ms  p99 {video['event_loop_lag_ms']['p99']} ms")
+        if "cpu_seconds_per_video_minute" in video:
+            print(f"  CPU {video['cpu_seconds']}s, {video['cpu_seconds_per_video_minute']}s per video minute")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="server to test, e.g. http://127.0.0.1:8000 (default: start one with fakes)")
+    parser.add_argument("--sessions", type=int, default=50, help="simulated WebSocket clients")
+    parser.add_argument("--duration", type=float, default=60, help="seconds every session keeps streaming")
+    parser.add_argument("--ramp", type=float, default=5, help="seconds over which sessions connect")
+    parser.add_argument("--drain", type=float, default=5, help="seconds to wait for feedback after streaming stops")
+    parser.add_argument("--protocol", type=int, choices=(1, 2), default=2, help="WebSocket protocol version")
+    parser.add_argument("--videos", type=int, default=4, help="concurrent video uploads")
+    parser.add_argument("--video-seconds", type=int, default=60, help="duration reported for each video")
+    parser.add_argument("--video-mb", type=float, default=8, help="size of each uploaded video")
+    parser.add_argument("--gemini-latency", type=float, default=1.0, help="fake Gemini mean latency (s)")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0, help="fake Gemini 503 rate")
+    parser.add_argument("--twelvelabs-latency", type=float, default=2.0, help="fake TwelveLabs seconds per phase")
+    parser.add_argument("--twelvelabs-error-rate", type=float, default=0.0, help="fake TwelveLabs task failure rate")
+    parser.add_argument("--log-level", default="WARNING", help="LOG_LEVEL for the started server")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    process = None
+    if args.url:
+        base_url, server = args.url.rstrip("/"), None
+    else:
+        process, base_url = start_server(args)
+        server = ServerProcess(process.pid)
+
+    try:
+        result = asyncio.run(run(args, base_url, server))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    result["config"] = {key: value for key, value in vars(args).items() if key != "json"}
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+from typing import Dict, List, Optional, Tuple
+
+from session_buffers import (
+    BODY_BUFFER_CAPACITY, BodyLanguageBuffer, EMOTIONS, encode_fatigue, encode_posture
+)
+
+# Sliding window behind the session trend in the body language prompt (seconds)
+TREND_WINDOW = 300
+# Sliding windows kept up to date on every frame (seconds)
+SLIDING_WINDOWS: Tuple[int, ...] = (TREND_WINDOW,)
+
+GOOD_POSTURE = encode_posture("good")
+TIRED = encode_fatigue("tired")
+
+
+class WindowCounts:
+    """Running counters for a set of body language frames"""
+
+    __slots__ = ("emotions", "good_posture", "tired", "total")
+
+    def __init__(self):
+        self.emotions: List[int] = [0] * len(EMOTIONS)
+        self.good_posture = 0
+        self.tired = 0
+        self.total = 0
+
+    def add(self, emotion: int, posture: int, fatigue: int, weight: int = 1):
+        """Count a frame (weight=-1 removes it again)"""
+        self.emotions[emotion] += weight
+        self.good_posture += weight * (posture == GOOD_POSTURE)
+        self.tired += weight * (fatigue == TIRED)
+        self.total += weight
+
+    def merge(self, other: "WindowCounts") -> "WindowCounts":
+        for code, count in enumerate(other.emotions):
+            self.emotions[code] += count
+        self.good_posture += other.good_posture
+        self.tired += other.tired
+        self.total += other.total
+        return self
+
+    def dominant_emotion(self) -> str:
+        counts = self.emotions
+        return EMOTIONS[max(range(len(counts)), key=counts.__getitem__)]
+
+    def summary(self) -> Dict:
+        """Dominant emotion and posture/fatigue ratios in O(number of emotions)"""
+        return {
+            "dominant_emotion": self.dominant_emotion(),
+            "good_posture_ratio": self.good_posture / self.total if self.total else 0,
+            "tired_ratio": self.tired / self.total if self.total else 0,
+            "samples": self.total,
+        }
+
+    def to_list(self) -> List[int]:
+        return self.emotions + [self.good_posture, self.tired, self.total]
+
+    @classmethod
+    def from_list(cls, values: List[int]) -> "WindowCounts":
+        counts = cls()
+        if len(values) == len(EMOTIONS) + 3:
+            counts.emotions = list(values[:len(EMOTIONS)])
+            counts.good_posture, counts.tired, counts.total = values[len(EMOTIONS):]
+        return counts
+
+
+class BodyLanguageAggregator:
+    """Incremental body language statistics for one session.
+
+    Each frame updates the counters of every sliding window plus the
+    "current" window that accumulates until the next analysis takes it, so
+    building a prompt never rescans raw frames. Frames live once in a
+    BodyLanguageBuffer; each sliding window only remembers the sequence
+    number of its oldest frame and subtracts frames as they age out.
+    """
+
+    __slots__ = ("frames", "windows", "current", "_tails")
+
+    def __init__(self, windows: Tuple[int, ...] = SLIDING_WINDOWS, capacity: int = BODY_BUFFER_CAPACITY):
+        self.frames = BodyLanguageBuffer(capacity)
+        self.windows: Dict[int, WindowCounts] = {seconds: WindowCounts() for seconds in windows}
+        self.current = WindowCounts()
+        self._tails: Dict[int, int] = {seconds: 0 for seconds in windows}
+
+    def add(self, timestamp: float, emotion: int, posture: int, fatigue: int):
+        """Record one frame of encoded labels"""
+        if self.frames.full:
+            # The oldest frame is about to be overwritten - drop it from any window still counting it
+            oldest = self.frames.oldest_seq
+            for seconds, tail in self._tails.items():
+                if tail == oldest:
+                    self.windows[seconds].add(*self.frames.frame(oldest)[1:], weight=-1)
+                    self._tails[seconds] = oldest + 1
+
+        self.frames.append(timestamp, emotion, posture, fatigue)
+        for counts in self.windows.values():
+            counts.add(emotion, posture, fatigue)
+        self.current.add(emotion, posture, fatigue)
+        self._expire(timestamp)
+
+    def _expire(self, now: float):
+        end = self.frames.next_seq
+        for seconds, counts in self.windows.items():
+            tail = self._tails[seconds]
+            cutoff = now - seconds
+            while tail < end and self.frames.timestamp(tail) < cutoff:
+                counts.add(*self.frames.frame(tail)[1:], weight=-1)
+                tail += 1
+            self._tails[seconds] = tail
+
+    def window(self, seconds: int, now: Optional[float] = None) -> WindowCounts:
+        """Counters for one of the sliding windows, aged to `now` if given"""
+        if now is not None:
+            self._expire(now)
+        return self.windows[seconds]
+
+    def take_current(self) -> WindowCounts:
+        """Hand over the frames gathered since the last analysis and start a new window"""
+        counts, self.current = self.current, WindowCounts()
+        return counts
+
+    def to_dict(self) -> Dict:
+        return {"frames": self.frames.to_dict(), "current": self.current.to_list()}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BodyLanguageAggregator":
+        frames = data.get("frames", {})
+        aggregator = cls(capacity=frames.get("capacity", BODY_BUFFER_CAPACITY))
+        for frame in BodyLanguageBuffer.frames_from_dict(frames):
+            aggregator.add(*frame)
+        aggregator.current = WindowCounts.from_list(data.get("current", []))
+        return aggregator
@@ -84,7 +84,7 @@
             const postureData = analyzePosture(landmarks);
             const fatigueData = analyzeFatigue(landmarks);
             
-            websocket.send(JSON.stringify({
+            const message = {
                 type: 'body_language',
                 emotion: stableEmotion.emotion,
                 posture: postureData,
@@ -95,7 +95,14 @@
                     fatigue: fatigueData.confidence
                 },
                 timestamp: new Date().toISOString()
-            }));
+            };
+            
+            // Batched into binary frames when the server speaks protocol v2
+            if (window.wsProtocol) {
+                window.wsProtocol.send(websocket, message);
+            } else {
+                websocket.send(JSON.stringify(message));
+            }
             lastPostTime = timestamp;
             console.log('Body language data sent to server');
         }
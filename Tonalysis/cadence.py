@@ -0,0 +1,117 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SPEECH_INTERVAL = float(os.getenv("SPEECH_ANALYSIS_INTERVAL", "10"))
+BODY_LANGUAGE_INTERVAL = float(os.getenv("BODY_LANGUAGE_ANALYSIS_INTERVAL", "30"))
+# Each interval is randomized by up to this fraction so sessions drift out of lockstep
+CADENCE_JITTER = float(os.getenv("ANALYSIS_JITTER", "0.1"))
+# Intervals stretch when Gemini feedback takes longer than this (queue wait + call)...
+CADENCE_TARGET_LATENCY = float(os.getenv("ANALYSIS_TARGET_LATENCY", "3"))
+# ...up to this multiple of the base interval
+CADENCE_MAX_STRETCH = float(os.getenv("ANALYSIS_MAX_STRETCH", "4"))
+# How long analyses of a disconnected session's last windows may still run
+FLUSH_TIMEOUT = float(os.getenv("ANALYSIS_FLUSH_TIMEOUT", "20"))
+
+
+def dispatch_stretch(stats: Dict, target_latency: float = CADENCE_TARGET_LATENCY,
+                     max_stretch: float = CADENCE_MAX_STRETCH) -> float:
+    """How much to lengthen analysis intervals, from GeminiDispatcher.stats().
+
+    Grows with the recent feedback latency over the target, and with the
+    number of calls queued per concurrency slot.
+    """
+    latency = (stats["avg_wait_ms"] + stats["avg_latency_ms"]) / 1000 / target_latency
+    queued = 1 + stats["queue_depth"] / max(1, stats["max_concurrency"])
+    return min(max_stretch, max(1.0, latency, queued))
+
+
+class CadenceTimer:
+    """One session's recurring analysis window"""
+
+    __slots__ = ("name", "interval", "callback", "deadline", "cancelled")
+
+    def __init__(self, name: str, interval: float, callback: Callable[[], None]):
+        self.name = name
+        self.interval = interval
+        self.callback = callback
+        self.deadline = 0.0
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class AnalysisCadence:
+    """Fires the analysis windows of every session from one wall-clock timer task.
+
+    Windows close on their deadline whether or not the client is sending, so
+    a session that goes quiet still gets its last window analyzed. Every
+    interval is jittered, which spreads sessions that connected together,
+    and multiplied by stretch(), so under load each session is analyzed
+    less often instead of the Gemini queue growing without bound.
+    """
+
+    def __init__(self, stretch: Callable[[], float] = lambda: 1.0, jitter: float = CADENCE_JITTER):
+        self.stretch = stretch
+        self.jitter = jitter
+        self._heap: List[Tuple[float, int, CadenceTimer]] = []
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, name: str, interval: float, callback: Callable[[], None]) -> CadenceTimer:
+        """Call callback every interval seconds (jittered, stretched under load) until cancelled"""
+        timer = CadenceTimer(name, interval, callback)
+        self._schedule(timer, time.monotonic(), self.current_stretch())
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        else:
+            self._wakeup.set()
+        return timer
+
+    def current_stretch(self) -> float:
+        """stretch(), or 1 if it fails - a broken load signal must not stop analyses"""
+        try:
+            return self.stretch()
+        except Exception:
+            return 1.0
+
+    def _schedule(self, timer: CadenceTimer, now: float, stretch: float):
+        spread = random.uniform(1 - self.jitter, 1 + self.jitter)
+        timer.deadline = now + timer.interval * stretch * spread
+        heapq.heappush(self._heap, (timer.deadline, next(self._sequence), timer))
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            if self._heap and self._heap[0][0] <= now:
+                stretch = self.current_stretch()
+                while self._heap and self._heap[0][0] <= now:
+                    _, _, timer = heapq.heappop(self._heap)
+                    if timer.cancelled:
+                        continue
+                    try:
+                        timer.callback()
+                    except Exception as e:
+                        logger.warning("%s window failed: %s", timer.name, e)
+                    self._schedule(timer, now, stretch)
+
+            # Drop cancelled timers at the front so they don't decide the next wake-up
+            while self._heap and self._heap[0][2].cancelled:
+                heapq.heappop(self._heap)
+            timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
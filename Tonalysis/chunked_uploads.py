@@ -0,0 +1,281 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from typing import AsyncIterator, Dict, Optional
+
+from telemetry import UPLOAD_BYTES
+from video_pipeline import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_SIZE, StreamingTranscoder, UploadTooLarge
+
+try:
+    import fcntl
+except ImportError:  # Windows - single worker only, the in-process lock is enough
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Uploads live here so a chunk that reaches any worker on the host can be appended
+UPLOAD_DIR = os.getenv("VIDEO_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "tonalysis-uploads"))
+# Uploads that receive no chunk for this long are deleted
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL_SECONDS", "3600"))
+# Live transcodes of uploads that receive no chunk on this worker for this long are stopped;
+# the upload stays and is converted from the whole file if it is completed
+LIVE_TRANSCODE_IDLE_SECONDS = float(os.getenv("LIVE_TRANSCODE_IDLE_SECONDS", "60"))
+# How often each worker looks for idle uploads and for its uploads completed or discarded elsewhere
+UPLOAD_PRUNE_INTERVAL = float(os.getenv("UPLOAD_PRUNE_INTERVAL_SECONDS", "30"))
+
+
+class UploadOffsetMismatch(Exception):
+    """Raised when a chunk does not start where the upload currently ends"""
+
+    def __init__(self, offset: int):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class UploadClosed(Exception):
+    """Raised for a chunk sent after the upload was completed"""
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while data := f.read(UPLOAD_CHUNK_SIZE):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+class ChunkedUpload:
+    """A recording uploaded in pieces while it is still being made.
+
+    Chunks are appended to a file in the shared upload directory under an
+    exclusive lock, so they may reach any worker. The worker that started
+    the upload hashes the chunks and feeds them to its live transcoder as
+    long as it saw every byte; once a chunk lands elsewhere the transcode
+    is dropped and the file is hashed on completion instead. Each chunk
+    names the offset it starts at, so a client that lost a response can ask
+    for the current offset and resend from there. The upload is open while
+    its metadata file exists.
+    """
+
+    def __init__(self, upload_id: str, client_id: str, directory: str,
+                 transcoder: Optional[StreamingTranscoder] = None, started_here: bool = False):
+        self.upload_id = upload_id
+        self.client_id = client_id
+        self.path = os.path.join(directory, f"{upload_id}.webm")
+        self.meta_path = os.path.join(directory, f"{upload_id}.json")
+        self.transcoder = transcoder
+        self.size = 0
+        self.updated_at = time.time()
+        # Bytes hashed and transcoded in order; never matches on a worker that did not start the upload
+        self._seen = 0 if started_here else -1
+        self._digest = hashlib.sha256()
+        self._lock = asyncio.Lock()
+
+    @contextlib.asynccontextmanager
+    async def _locked(self):
+        """The data file opened for appending, locked against every worker; UploadClosed once completed"""
+        async with self._lock:
+            try:
+                f = open(self.path, "r+b")
+            except FileNotFoundError:
+                raise UploadClosed("Upload already completed") from None
+            try:
+                if fcntl is not None:
+                    await asyncio.to_thread(fcntl.flock, f, fcntl.LOCK_EX)
+                if not os.path.exists(self.meta_path):
+                    raise UploadClosed("Upload already completed")
+                self.size = f.seek(0, os.SEEK_END)
+                yield f
+            finally:
+                f.close()
+
+    async def append(self, offset: int, chunks: AsyncIterator[bytes], max_bytes: int = MAX_UPLOAD_BYTES) -> int:
+        """Append a chunk that starts at offset and return the new size"""
+        async with self._locked() as f:
+            if offset != self.size:
+                raise UploadOffsetMismatch(self.size)
+            in_order = self._seen == self.size
+            if not in_order:
+                await self.drop_transcoder("continued on another worker")
+            # The request body arrives in pieces; a dropped connection keeps what was written
+            async for data in chunks:
+                if self.size + len(data) > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes // (1024 * 1024)} MB limit")
+                await asyncio.to_thread(self._write, f, data, in_order)
+                self.size += len(data)
+                UPLOAD_BYTES.inc(len(data))
+                if in_order and self.transcoder is not None:
+                    await self.transcoder.feed(data)
+            self.updated_at = time.time()
+            return self.size
+
+    def _write(self, f, data: bytes, in_order: bool):
+        if in_order:
+            self._digest.update(data)
+            self._seen += len(data)
+        f.write(data)
+
+    async def close(self) -> str:
+        """Refuse further chunks on every worker and return the upload's SHA-256"""
+        async with self._locked():
+            os.unlink(self.meta_path)
+        if self._seen == self.size:
+            return self._digest.hexdigest()
+        await self.drop_transcoder("continued on another worker")
+        return await asyncio.to_thread(_hash_file, self.path)
+
+    async def discard(self):
+        """Refuse further chunks on every worker and delete what was received"""
+        async with self._locked():
+            os.unlink(self.meta_path)
+        if self.transcoder is not None:
+            await self.transcoder.abort()
+            self.transcoder = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    async def drop_transcoder(self, reason: str):
+        if self.transcoder is not None:
+            logger.info("Upload %s %s, dropping its live transcode", self.upload_id, reason,
+                        extra={"client_id": self.client_id})
+            await self.transcoder.abort()
+            self.transcoder = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "upload_id": self.upload_id,
+            "offset": self.size,
+            "live_transcode": self.transcoder is not None and not self.transcoder.failed,
+        }
+
+
+class UploadStore:
+    """Chunked uploads in UPLOAD_DIR, dropped once completed or idle past the TTL.
+
+    Uploads started on this worker are kept in memory with their live
+    transcoders; those started on another worker are opened from their
+    metadata file when one of their requests lands here.
+    """
+
+    def __init__(self, directory: str = UPLOAD_DIR, ttl: int = UPLOAD_SESSION_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        self._uploads: Dict[str, ChunkedUpload] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    async def create(self, client_id: str, mime_type: str = "") -> ChunkedUpload:
+        upload_id = uuid.uuid4().hex
+        transcoder = await StreamingTranscoder.start(os.path.join(self.directory, f"{upload_id}.mp4"), mime_type)
+        upload = ChunkedUpload(upload_id, client_id, self.directory, transcoder, started_here=True)
+        await asyncio.to_thread(self._write_meta, upload, mime_type)
+        self._uploads[upload_id] = upload
+        return upload
+
+    def _write_meta(self, upload: ChunkedUpload, mime_type: str):
+        open(upload.path, "wb").close()
+        with open(upload.meta_path, "w") as f:
+            json.dump({"client_id": upload.client_id, "mime_type": mime_type, "created_at": time.time()}, f)
+
+    async def get(self, upload_id: str) -> Optional[ChunkedUpload]:
+        """An open upload, whichever worker started it"""
+        upload = self._uploads.get(upload_id)
+        if upload is not None:
+            # Chunks may have been appended, or the upload completed, by another worker
+            size = await asyncio.to_thread(self._open_size, upload)
+            if size is None:
+                return None
+            if not upload._lock.locked():
+                upload.size = size
+            return upload
+        # Upload ids are uuid4 hex; anything else never reaches the filesystem
+        if len(upload_id) != 32 or not all(c in "0123456789abcdef" for c in upload_id):
+            return None
+        return await asyncio.to_thread(self._read, upload_id)
+
+    def _read(self, upload_id: str) -> Optional[ChunkedUpload]:
+        try:
+            with open(os.path.join(self.directory, f"{upload_id}.json")) as f:
+                meta = json.load(f)
+            upload = ChunkedUpload(upload_id, meta["client_id"], self.directory)
+            upload.size = os.path.getsize(upload.path)
+            return upload
+        except (OSError, ValueError, KeyError):
+            return None
+
+    @staticmethod
+    def _open_size(upload: ChunkedUpload) -> Optional[int]:
+        """Bytes received so far, or None once the upload was completed"""
+        if not os.path.exists(upload.meta_path):
+            return None
+        try:
+            return os.path.getsize(upload.path)
+        except OSError:
+            return None
+
+    def take(self, upload_id: str) -> Optional[ChunkedUpload]:
+        """Forget a completed upload; its files now belong to the caller"""
+        return self._uploads.pop(upload_id, None)
+
+    async def discard(self, upload_id: str) -> bool:
+        """Delete an open upload, whichever worker started it; False if it was unknown or already completed"""
+        upload = await self.get(upload_id)
+        if upload is None:
+            return False
+        self._uploads.pop(upload_id, None)
+        try:
+            await upload.discard()
+        except UploadClosed:
+            return False
+        return True
+
+    async def prune_periodically(self, interval: float = UPLOAD_PRUNE_INTERVAL):
+        """Run _prune every interval for as long as the server runs"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._prune()
+            except Exception:
+                logger.exception("Pruning chunked uploads failed")
+
+    async def _prune(self):
+        """Delete uploads that stopped receiving chunks, and stop transcodes of ones idle or completed elsewhere"""
+        now = time.time()
+        cutoff = now - self.ttl
+        for upload in list(self._uploads.values()):
+            if not os.path.exists(upload.meta_path):
+                del self._uploads[upload.upload_id]
+                await upload.drop_transcoder("was closed on another worker")
+            elif upload.updated_at < now - LIVE_TRANSCODE_IDLE_SECONDS and not upload._lock.locked():
+                await upload.drop_transcoder("is idle")
+        for upload_id in await asyncio.to_thread(self._idle, cutoff):
+            upload = self._uploads.pop(upload_id, None) or ChunkedUpload(upload_id, "", self.directory)
+            logger.info("Dropping abandoned upload %s", upload_id, extra={"client_id": upload.client_id})
+            if upload.transcoder is not None:
+                await upload.transcoder.abort()
+            for path in (upload.meta_path, upload.path):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    def _idle(self, cutoff: float):
+        """Ids of uploads, from any worker, whose data file has not changed since cutoff"""
+        idle = []
+        for name in os.listdir(self.directory):
+            upload_id, ext = os.path.splitext(name)
+            if ext != ".json":
+                continue
+            try:
+                if os.path.getmtime(os.path.join(self.directory, f"{upload_id}.webm")) < cutoff:
+                    idle.append(upload_id)
+            except OSError:
+                idle.append(upload_id)
+        return idle
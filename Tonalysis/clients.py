@@ -0,0 +1,20 @@
+from functools import lru_cache
+import os
+
+from google import genai
+from twelvelabs import TwelveLabs
+
+
+# Clients are built on first use so importing the app never touches the network
+# or fails on a missing API key before a request actually needs it.
+
+@lru_cache(maxsize=None)
+def get_gemini_client() -> genai.Client:
+    """Shared Gemini client"""
+    return genai.Client()
+
+
+@lru_cache(maxsize=None)
+def get_twelvelabs_client() -> TwelveLabs:
+    """Shared TwelveLabs client"""
+    return TwelveLabs(api_key=os.getenv('TWELVELABS_API_KEY'))
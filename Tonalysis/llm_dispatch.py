@@ -0,0 +1,148 @@
+import asyncio
+import random
+import time
+from typing import Any, Callable, Dict
+
+from google.genai import errors
+
+from telemetry import GEMINI_CALL_SECONDS, GEMINI_CALLS, GEMINI_QUEUE_WAIT_SECONDS
+
+
+class DispatchOverloaded(Exception):
+    """Raised when the dispatch queue is full and a call is shed"""
+
+
+class DispatchTimeout(Exception):
+    """Raised when a call misses its deadline (queue wait included)"""
+
+
+class GeminiDispatcher:
+    """Async-native gateway for every Gemini call made by the server.
+
+    Calls go through the async client (client.aio) so no thread is parked per
+    request. A global semaphore caps concurrent requests to Gemini; callers
+    beyond that wait in a bounded queue and are shed once it is full. Each call
+    has a deadline covering queue wait, retries and the request itself, and
+    429/5xx responses are retried with full-jitter exponential backoff.
+    """
+
+    RETRYABLE_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(self, client_factory: Callable[[], Any], max_concurrency: int = 8, max_queue: int = 64,
+                 deadline: float = 20.0, max_retries: int = 2, backoff_base: float = 0.5):
+        self.client_factory = client_factory
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+        self._in_flight = 0
+
+        # Counters exposed through stats()
+        self._calls = 0
+        self._shed = 0
+        self._timeouts = 0
+        self._retries = 0
+        self._errors = 0
+        self._wait_ewma = 0.0
+        self._wait_max = 0.0
+        self._latency_ewma = 0.0
+
+    async def generate(self, prompt: str, model: str = "gemini-2.5-flash") -> str:
+        """Generate content for a prompt and return the response text"""
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            self._shed += 1
+            GEMINI_CALLS.labels(outcome="shed").inc()
+            raise DispatchOverloaded(f"Gemini queue full ({self._waiting} waiting)")
+
+        self._calls += 1
+        deadline_at = time.monotonic() + self.deadline
+        queued_at = time.monotonic()
+
+        if not self._semaphore.locked():
+            # A slot is free - acquire() returns without suspending
+            await self._semaphore.acquire()
+        else:
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.deadline)
+            except asyncio.TimeoutError:
+                self._timeouts += 1
+                GEMINI_CALLS.labels(outcome="timeout").inc()
+                raise DispatchTimeout(f"Waited {self.deadline:.0f}s for a free Gemini slot")
+            finally:
+                self._waiting -= 1
+
+        self._record_wait(time.monotonic() - queued_at)
+        self._in_flight += 1
+        try:
+            return await self._call_with_retries(prompt, model, deadline_at)
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    async def _call_with_retries(self, prompt: str, model: str, deadline_at: float) -> str:
+        attempt = 0
+        while True:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                self._timeouts += 1
+                GEMINI_CALLS.labels(outcome="timeout").inc()
+                raise DispatchTimeout("Gemini call deadline exceeded")
+
+            started_at = time.monotonic()
+            try:
+                response = await asyncio.wait_for(
+                    self.client_factory().aio.models.generate_content(model=model, contents=prompt),
+                    timeout=remaining
+                )
+                latency = time.monotonic() - started_at
+                self._latency_ewma = self._ewma(self._latency_ewma, latency)
+                GEMINI_CALL_SECONDS.observe(latency)
+                GEMINI_CALLS.labels(outcome="ok").inc()
+                return response.text
+            except asyncio.TimeoutError:
+                self._timeouts += 1
+                GEMINI_CALLS.labels(outcome="timeout").inc()
+                raise DispatchTimeout("Gemini call deadline exceeded")
+            except errors.APIError as e:
+                if e.code not in self.RETRYABLE_CODES or attempt >= self.max_retries:
+                    self._errors += 1
+                    GEMINI_CALLS.labels(outcome="error").inc()
+                    raise
+
+            # Full jitter backoff, never sleeping past the deadline
+            delay = random.uniform(0, self.backoff_base * (2 ** attempt))
+            delay = min(delay, max(0.0, deadline_at - time.monotonic()))
+            attempt += 1
+            self._retries += 1
+            await asyncio.sleep(delay)
+
+    def _record_wait(self, wait: float):
+        self._wait_ewma = self._ewma(self._wait_ewma, wait)
+        self._wait_max = max(self._wait_max, wait)
+        GEMINI_QUEUE_WAIT_SECONDS.observe(wait)
+
+    @staticmethod
+    def _ewma(current: float, sample: float, alpha: float = 0.2) -> float:
+        return sample if current == 0.0 else current + alpha * (sample - current)
+
+    def stats(self) -> Dict:
+        """Snapshot of queue depth, wait times and failure counters"""
+        return {
+            "queue_depth": self._waiting,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "calls": self._calls,
+            "shed": self._shed,
+            "timeouts": self._timeouts,
+            "retries": self._retries,
+            "errors": self._errors,
+            "avg_wait_ms": round(self._wait_ewma * 1000, 1),
+            "max_wait_ms": round(self._wait_max * 1000, 1),
+            "avg_latency_ms": round(self._latency_ewma * 1000, 1),
+        }
@@ -0,0 +1,155 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from typing import Dict, Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" for humans, "json" for a log collector
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# Chatty per-client events are let through at most once per interval each
+LOG_SAMPLE_INTERVAL = float(os.getenv("LOG_SAMPLE_INTERVAL", "5"))
+SAMPLED_EVENTS = frozenset(("interim", "heartbeat", "body_language_frame"))
+
+# Fields passed through `extra` that the formatter knows how to show
+_FIELDS = ("client_id", "event", "suppressed")
+
+
+class ClientSampler:
+    """Lets one record per event through each interval for one client and drops the rest.
+
+    Only events named in SAMPLED_EVENTS are sampled. The check runs before a
+    LogRecord is even built, so a dropped event costs a dict lookup. The next
+    record let through carries the number dropped since as `suppressed`.
+    """
+
+    __slots__ = ("interval", "events", "_last")
+
+    def __init__(self, interval: float = LOG_SAMPLE_INTERVAL, events=SAMPLED_EVENTS):
+        self.interval = interval
+        self.events = events
+        self._last: Dict[str, list] = {}
+
+    def allow(self, event: str) -> Optional[int]:
+        """None to drop the event, otherwise how many were dropped before it"""
+        if event not in self.events:
+            return 0
+        now = time.monotonic()
+        entry = self._last.get(event)
+        if entry is None:
+            self._last[event] = [now, 0]
+            return 0
+        if now - entry[0] < self.interval:
+            entry[1] += 1
+            return None
+        suppressed = entry[1]
+        entry[0], entry[1] = now, 0
+        return suppressed
+
+
+class StructuredFormatter(logging.Formatter):
+    """One line per record: key=value text, or a JSON object"""
+
+    def __init__(self, json_output: bool = False):
+        super().__init__()
+        self.json_output = json_output
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {name: getattr(record, name) for name in _FIELDS if getattr(record, name, None) is not None}
+        message = record.getMessage()
+        if record.exc_info:
+            message = f"{message}\n{self.formatException(record.exc_info)}"
+
+        if self.json_output:
+            return json.dumps({
+                "ts": round(record.created, 3),
+                "level": record.levelname,
+                "logger": record.name,
+                "message": message,
+                **fields,
+            })
+
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.created))
+        extras = "".join(f" {name}={value}" for name, value in fields.items())
+        return f"{timestamp}.{int(record.msecs):03d} {record.levelname:<7} {record.name}{extras} | {message}"
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message now so later changes to its arguments can't alter it
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class ClientLogger(logging.LoggerAdapter):
+    """Logger for one client connection: tags records with the client id and samples chatty events"""
+
+    def __init__(self, logger: logging.Logger, client_id: str):
+        super().__init__(logger, {"client_id": client_id})
+        self.sampler = ClientSampler()
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = {**self.extra, **kwargs.get("extra", {})}
+        return msg, kwargs
+
+    def log(self, level, msg, *args, **kwargs):
+        if not self.isEnabledFor(level):
+            return
+        event = kwargs.get("extra", {}).get("event")
+        if event is not None:
+            suppressed = self.sampler.allow(event)
+            if suppressed is None:
+                return
+            if suppressed:
+                kwargs["extra"] = {**kwargs["extra"], "suppressed": suppressed}
+        super().log(level, msg, *args, **kwargs)
+
+
+def client_logger(logger: logging.Logger, client_id: str) -> ClientLogger:
+    return ClientLogger(logger, client_id)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(level: str = LOG_LEVEL, json_output: Optional[bool] = None,
+                  stream=None) -> logging.handlers.QueueListener:
+    """Route the root logger through a queue so the event loop never writes to stdout itself"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    if json_output is None:
+        json_output = LOG_FORMAT == "json"
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(StructuredFormatter(json_output))
+
+    handler = _DeferredQueueHandler(queue.SimpleQueue())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(handler)
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    root = logging.getLogger()
+    for handler in [h for h in root.handlers if isinstance(h, _DeferredQueueHandler)]:
+        root.removeHandler(handler)
+    _listener = None
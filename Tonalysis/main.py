@@ -1,25 +1,78 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, Form
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
-from typing import List, Dict
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from pydantic import TypeAdapter, ValidationError
+from starlette.datastructures import FormData, UploadFile
+from starlette.formparsers import MultiPartException
+from starlette.websockets import WebSocketState
+from typing import Dict, List, Optional, Tuple
+from contextlib import asynccontextmanager
 import json
+import logging
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from google import genai
 import time
 from dotenv import load_dotenv
 import os
-import tempfile
-import subprocess
-from twelvelabs import TwelveLabs
 from twelvelabs.models.task import Task
+from analysis_scheduler import AnalysisScheduler
+from assets import AssetStore, load_client_assets
+from cadence import (
+    AnalysisCadence, SPEECH_INTERVAL, BODY_LANGUAGE_INTERVAL, FLUSH_TIMEOUT, dispatch_stretch
+)
+from clients import get_gemini_client, get_twelvelabs_client
+from llm_dispatch import GeminiDispatcher, DispatchOverloaded, DispatchTimeout
+from video_pipeline import (
+    read_upload_form, prepare_video, UploadTooLarge, StreamingTranscoder, TranscodeError
+)
+from chunked_uploads import UploadStore, UploadOffsetMismatch, UploadClosed
+from video_jobs import JobStore, VideoJob
+from video_cache import VideoCache
+from twelvelabs_index import IndexResolver
+from session_store import SessionState, create_session_store
+from session_buffers import encode_emotion, encode_posture, encode_fatigue
+from body_aggregates import TREND_WINDOW, WindowCounts
+from speech_metrics import WindowMetrics, parse_timestamp
+from analysis_gate import (
+    AnalysisGate, MIN_SPEECH_WORDS, MIN_BODY_SAMPLES, speech_fingerprint, body_fingerprint
+)
+from log_pipeline import setup_logging, client_logger
+from prompts import SPEECH_TEMPLATE, speech_prompt, body_language_prompt
+from session_log import SessionLog, SESSION_LOG_DIR
+from telemetry import (
+    REGISTRY, PROMETHEUS_CONTENT_TYPE, ACTIVE_SESSIONS, GEMINI_QUEUE_DEPTH,
+    TWELVELABS_PHASE_SECONDS, VIDEO_JOBS_WAITING, EXECUTOR_QUEUE_DEPTH, FEEDBACK_SECONDS, ANALYSIS_STRETCH,
+    acquire_counted, monitor_event_loop_lag, submit_counted
+)
+from protocol import (
+    MessageRouter, BINARY_BODY_FRAMES, BINARY_TRANSCRIPTION, hello_reply,
+    BodyFrame, decode_body_frames, decode_transcription, anchor_timestamps
+)
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI()
+# Log records are written by a background thread; LOG_LEVEL=DEBUG shows per-message detail
+setup_logging()
+logger = logging.getLogger("tonalysis")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sample event loop lag into /metrics for as long as the server runs
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    # Delete abandoned chunked uploads and stop their live transcodes
+    upload_pruner = asyncio.create_task(upload_store.prune_periodically())
+    yield
+    lag_monitor.cancel()
+    upload_pruner.cancel()
+    if session_log is not None:
+        session_log.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,344 +82,458 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files for models and assets
-app.mount("/models", StaticFiles(directory="models"), name="models")
+# The page, its scripts and the face models are hashed and precompressed once at
+# startup; the page links content-hashed script URLs that browsers cache for good
+assets = AssetStore()
+load_client_assets(assets)
+
+@app.get("/models/{name}")
+async def serve_model(name: str, request: Request):
+    return assets.response(request, f"/models/{name}")
+
+@app.get("/assets/{name}")
+async def serve_asset(name: str, request: Request):
+    return assets.response(request, f"/assets/{name}")
 
 # Serve JavaScript files directly from root
 @app.get("/body_language.js")
-async def serve_body_language_js():
-    return FileResponse("body_language.js", media_type="application/javascript")
+async def serve_body_language_js(request: Request):
+    return assets.response(request, "/body_language.js")
+
+@app.get("/ws_protocol.js")
+async def serve_ws_protocol_js(request: Request):
+    return assets.response(request, "/ws_protocol.js")
+
+@app.get("/video_upload.js")
+async def serve_video_upload_js(request: Request):
+    return assets.response(request, "/video_upload.js")
+
+# Gemini and TwelveLabs clients are created on first use (see clients.py), and the
+# TwelveLabs index is resolved lazily so startup never waits on the network
+index_resolver = IndexResolver(get_twelvelabs_client)
+
+# Every Gemini call goes through one bounded, async dispatcher
+dispatcher = GeminiDispatcher(
+    get_gemini_client,
+    max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+    max_queue=int(os.getenv("GEMINI_MAX_QUEUE", "64")),
+    deadline=float(os.getenv("GEMINI_DEADLINE_SECONDS", "20")),
+    max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+)
 
-# Initialize Gemini client
-client = genai.Client()
+# Windows that are too short or unchanged are answered without calling Gemini
+speech_gate = AnalysisGate("speech", min_samples=MIN_SPEECH_WORDS, template=SPEECH_TEMPLATE)
+body_language_gate = AnalysisGate("body_language", min_samples=MIN_BODY_SAMPLES)
 
-# Initialize TwelveLabs client
-tl_client = TwelveLabs(api_key=os.getenv('TWELVELABS_API_KEY'))
+# One timer task closes every session's analysis windows; intervals stretch
+# while Gemini is slow or backed up
+cadence = AnalysisCadence(stretch=lambda: dispatch_stretch(dispatcher.stats()))
 
-# Get or create index for video analysis
-def get_or_create_index():
-    """Get existing index or create a new one"""
-    try:
-        # Try to list existing indexes
-        indexes = tl_client.index.list()
-        
-        # Look for an existing index with our name
-        for index in indexes:
-            if index.name == "speech-therapy-sessions":
-                print(f"Using existing index: {index.id}")
-                return index.id
-        
-        # If not found, create a new index
-        print("Creating new index for speech therapy sessions...")
-        new_index = tl_client.index.create(
-            name="speech-therapy-sessions",
-            models=[{"name": "pegasus1.2", "options": ["visual", "audio"]}]
-        )
-        print(f"Created new index: {new_index.id}")
-        return new_index.id
-        
-    except Exception as e:
-        print(f"Error managing index: {e}")
-        # Fallback to a hardcoded index if needed
-        return None
+# Worker pool for the blocking TwelveLabs SDK, one thread per concurrent video job
+MAX_VIDEO_JOBS = int(os.getenv("MAX_VIDEO_JOBS", "4"))
+video_executor = ThreadPoolExecutor(max_workers=MAX_VIDEO_JOBS)
+# Separate pool so each job's gist call runs alongside its analysis stream
+gist_executor = ThreadPoolExecutor(max_workers=MAX_VIDEO_JOBS)
+video_job_slots = asyncio.Semaphore(MAX_VIDEO_JOBS)
+# Queue depth of each pool, counted by submit_counted(); created here so both are exported from the start
+video_executor_queued = EXECUTOR_QUEUE_DEPTH.labels(executor="video")
+gist_executor_queued = EXECUTOR_QUEUE_DEPTH.labels(executor="gist")
+
+# Open WebSocket per client, used to push video job progress
+active_connections: Dict[str, WebSocket] = {}
+
+
+async def push_job_update(job: VideoJob):
+    """Send a video job status change to the client if it is connected"""
+    websocket = active_connections.get(job.client_id)
+    if websocket is not None:
+        await websocket.send_json({"type": "video_analysis_status", **job.to_dict()})
 
-INDEX_ID = get_or_create_index()
 
-# Thread pool for async operations
-executor = ThreadPoolExecutor(max_workers=4)
+async def push_job_chunk(job: VideoJob, text: str):
+    """Forward a streamed piece of the video analysis to the client if it is connected"""
+    websocket = active_connections.get(job.client_id)
+    if websocket is not None:
+        await websocket.send_json({"type": "video_analysis_chunk", "job_id": job.job_id, "text": text})
 
-# Store transcript buffers and analysis data for each client
-transcript_buffers: Dict[str, List[str]] = {}
-last_analysis_time: Dict[str, float] = {}
-analysis_history: Dict[str, List[str]] = {}
-speech_metrics: Dict[str, Dict] = {}
 
-# Store body language data for each client
-body_language_buffers: Dict[str, List[Dict]] = {}
-last_body_analysis_time: Dict[str, float] = {}
-body_language_history: Dict[str, List[str]] = {}
+job_store = JobStore(notify=push_job_update, notify_chunk=push_job_chunk)
+
+# Gauges read at scrape time, so nothing is updated on the hot path; executor queue
+# depth and video jobs waiting are counted where work is submitted and slots are acquired
+ACTIVE_SESSIONS.set_function(lambda: len(active_connections))
+GEMINI_QUEUE_DEPTH.set_function(lambda: dispatcher.stats()["queue_depth"])
+ANALYSIS_STRETCH.set_function(cadence.current_stretch)
+
+# Keep references so running video jobs are not garbage collected
+background_jobs = set()
+
+# Uploads are keyed by content hash: a resubmitted recording joins the job still
+# running for it, or is answered from the cache of finished analyses
+video_cache = VideoCache()
+video_jobs_by_digest: Dict[str, VideoJob] = {}
+
+# Recordings uploaded in chunks while the session is still running
+upload_store = UploadStore()
+
+# Per-client session state lives behind a pluggable store (SESSION_STORE), so a
+# reconnect to any worker resumes the same buffers, history and metrics
+session_store = create_session_store()
+
+# With SESSION_LOG_DIR set, what each session sends is appended to a binary log
+# that session_replay.py can re-score offline
+session_log = SessionLog(SESSION_LOG_DIR) if SESSION_LOG_DIR else None
 
 
 @app.get("/")
-async def serve_client():
-    return FileResponse("speech_recognition_client.html")
+async def serve_client(request: Request):
+    return assets.response(request, "/")
 
 @app.get("/api")
 async def root():
     return {"message": "Speech Therapy WebSocket Server"}
 
+@app.get("/api/dispatch-stats")
+async def dispatch_stats():
+    """Gemini dispatch queue depth and wait times"""
+    return dispatcher.stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    return Response(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/api/latency")
+async def latency():
+    """p50/p99 per stage, estimated from the /metrics histograms"""
+    return REGISTRY.latency_summary()
+
+@app.get("/api/analysis-gate-stats")
+async def analysis_gate_stats():
+    """How many analysis windows were answered from cache, templated or skipped"""
+    return {"speech": speech_gate.stats(), "body_language": body_language_gate.stats()}
+
 
-async def analyze_with_gemini(transcript: str, client_id: str) -> str:
-    """Analyze transcript with Gemini as a speech therapist"""
+async def analyze_with_gemini(transcript: str, window: WindowMetrics, session: SessionState) -> Optional[str]:
+    """Analyze transcript with Gemini as a speech therapist (None if the window was skipped or shed)"""
     try:
-        # Get previous analyses for this client
-        previous_analyses = analysis_history.get(client_id, [])
-        previous_feedback = "\n".join(previous_analyses[-3:]) if previous_analyses else "No previous feedback"
-        
-        # Calculate basic metrics
-        words = transcript.split()
-        word_count = len(words)
-        unique_words = len(set(words))
-        
-        # Common filler words
-        filler_words = ["um", "uh", "like", "you know", "basically", "actually", "literally"]
-        filler_count = sum(1 for word in words if word.lower() in filler_words)
-        
-        prompt = f"""You are an experienced speech therapist providing personalized feedback. 
-
-Current transcript (last 10 seconds, {word_count} words):
-"{transcript}"
-
-Speech metrics:
-- Total words: {word_count}
-- Unique words: {unique_words}
-- Filler words detected: {filler_count}
-
-Previous feedback given:
-{previous_feedback}
-
-IMPORTANT INSTRUCTIONS:
-1. Provide DIFFERENT feedback than before - focus on new aspects each time
-2. Be specific - mention exact words or phrases from the transcript
-3. Notice and praise improvements if any
-4. Vary your suggestions - don't repeat the same advice
-5. Consider these rotating focus areas:
-   - First analysis: Overall clarity and pace
-   - Second analysis: Vocabulary variety and word choice
-   - Third analysis: Sentence structure and flow
-   - Fourth analysis: Confidence and emphasis
-   - Fifth analysis: Natural pauses and breathing
-   
-Keep response to 2-3 sentences. Be encouraging but specific. If you notice the speaker said very little, encourage them to speak more."""
-
-        response = await asyncio.get_event_loop().run_in_executor(
-            executor,
-            lambda: client.models.generate_content(
-                model="gemini-2.5-flash", 
-                contents=prompt
-            )
+        # Window metrics were counted as each final transcript arrived
+        metrics = session.speech_metrics
+        word_count = window.words
+        prompt = speech_prompt(transcript, window, metrics, session.analysis_history)
+        
+        fingerprint = speech_fingerprint(transcript, window, metrics.words_per_minute)
+        return await speech_gate.run(
+            session.last_fingerprints, fingerprint, word_count, lambda: dispatcher.generate(prompt),
+            metrics.analyses_count
         )
-        return response.text
+    except (DispatchOverloaded, DispatchTimeout) as e:
+        # Shed under load - skip the window rather than send (and remember) an error as feedback
+        logger.info("Speech analysis skipped: %s", e, extra={"client_id": session.client_id})
+        return None
     except Exception as e:
-        print(f"Gemini API error: {e}")
+        logger.warning("Gemini API error: %s", e, extra={"client_id": session.client_id})
         return f"Analysis temporarily unavailable: {str(e)}"
 
 
-async def analyze_body_language_with_gemini(body_data: List[Dict], client_id: str) -> str:
-    """Analyze body language patterns with Gemini as a body language expert"""
+async def analyze_body_language_with_gemini(body_data: WindowCounts, session: SessionState) -> Optional[str]:
+    """Analyze body language patterns with Gemini as a body language expert (None if skipped or shed)"""
     try:
-        # Get previous body language analyses for this client
-        previous_analyses = body_language_history.get(client_id, [])
-        previous_feedback = "\n".join(previous_analyses[-2:]) if previous_analyses else "No previous feedback"
-        
-        # Calculate patterns from recent body language data
-        emotions = [item.get('emotion', 'neutral') for item in body_data]
-        postures = [item.get('posture', {}).get('label', 'unknown') for item in body_data]
-        fatigue_levels = [item.get('fatigue', {}).get('label', 'unknown') for item in body_data]
-        
-        # Find most common patterns
-        most_common_emotion = max(set(emotions), key=emotions.count)
-        good_posture_ratio = sum(1 for p in postures if p == 'good') / len(postures) if postures else 0
-        tired_ratio = sum(1 for f in fatigue_levels if f == 'tired') / len(fatigue_levels) if fatigue_levels else 0
-        
-        prompt = f"""You are an expert body language coach providing personalized feedback for someone during a speech therapy session.
-
-Recent body language data (last 30 seconds):
-- Dominant emotion: {most_common_emotion}
-- Good posture ratio: {good_posture_ratio:.1%}
-- Fatigue signs: {tired_ratio:.1%}
-- Total data points: {len(body_data)}
-
-Previous feedback given:
-{previous_feedback}
-
-IMPORTANT INSTRUCTIONS:
-1. Provide DIFFERENT feedback than before - focus on new aspects each time
-2. Be encouraging and constructive
-3. Give specific, actionable advice for body language during speech
-4. Consider these rotating focus areas:
-   - First analysis: Overall posture and presence
-   - Second analysis: Facial expressions and emotional engagement
-   - Third analysis: Energy levels and alertness
-   - Fourth analysis: Professional presentation
-   - Fifth analysis: Confidence and body language harmony
-
-Keep response to 2-3 sentences. Be supportive but specific. If the data shows good patterns, acknowledge and encourage them."""
-
-        response = await asyncio.get_event_loop().run_in_executor(
-            executor,
-            lambda: client.models.generate_content(
-                model="gemini-2.5-flash", 
-                contents=prompt
-            )
+        # Patterns come straight from the running counters - no rescan of raw frames
+        summary = body_data.summary()
+        trend = session.body_aggregates.window(TREND_WINDOW, time.time()).summary()
+        prompt = body_language_prompt(summary, trend, session.body_language_history)
+        
+        fingerprint = body_fingerprint(body_data)
+        return await body_language_gate.run(
+            session.last_fingerprints, fingerprint, summary["samples"], lambda: dispatcher.generate(prompt),
+            session.body_analyses_count
         )
-        return response.text
+    except (DispatchOverloaded, DispatchTimeout) as e:
+        # Shed under load - skip the window rather than send (and remember) an error as feedback
+        logger.info("Body language analysis skipped: %s", e, extra={"client_id": session.client_id})
+        return None
     except Exception as e:
-        print(f"Body language analysis error: {e}")
+        logger.warning("Body language analysis error: %s", e, extra={"client_id": session.client_id})
         return f"Body language analysis temporarily unavailable: {str(e)}"
 
 
+async def run_speech_analysis(websocket: WebSocket, session: SessionState, transcript: str,
+                              window: WindowMetrics, closed_at: float):
+    """Analyze a transcript window and send the feedback to the client"""
+    log = client_logger(logger, session.client_id)
+    log.info("Analyzing transcript...")
+    
+    # Analyze with Gemini
+    analysis = await analyze_with_gemini(transcript, window, session)
+    if analysis is None:
+        log.info("Transcript unchanged or Gemini busy, skipping")
+        return
+    
+    # Store analysis in history
+    session.analysis_history.append(analysis)
+    
+    # Update metrics
+    session.speech_metrics.analyses_count += 1
+    await session_store.save(session)
+    
+    # Send analysis to frontend
+    analysis_message = {
+        "type": "analysis",
+        "text": analysis,
+        "transcript_analyzed": transcript,
+        "timestamp": datetime.now().isoformat(),
+        "analysis_number": session.speech_metrics.analyses_count
+    }
+    
+    # The last window of a closed session is only kept for a reconnect
+    if websocket.client_state != WebSocketState.CONNECTED:
+        return
+    
+    log.debug("Sending analysis message: %s", analysis_message)
+    await websocket.send_json(analysis_message)
+    FEEDBACK_SECONDS.labels(stream="speech").observe(time.time() - closed_at)
+    log.info("Analysis #%d sent successfully!", session.speech_metrics.analyses_count)
+
+
+async def run_body_language_analysis(websocket: WebSocket, session: SessionState, body_data: WindowCounts,
+                                     closed_at: float):
+    """Analyze a window of body language samples and send the feedback to the client"""
+    log = client_logger(logger, session.client_id)
+    log.info("Analyzing body language patterns...")
+    
+    # Analyze with Gemini
+    analysis = await analyze_body_language_with_gemini(body_data, session)
+    if analysis is None:
+        log.info("Body language unchanged, too few samples or Gemini busy, skipping")
+        return
+    
+    # Store analysis in history
+    session.body_language_history.append(analysis)
+    
+    # Count analyses
+    session.body_analyses_count += 1
+    analysis_count = session.body_analyses_count
+    await session_store.save(session)
+    
+    # The last window of a closed session is only kept for a reconnect
+    if websocket.client_state != WebSocketState.CONNECTED:
+        return
+    
+    # Send analysis to frontend
+    await websocket.send_json({
+        "type": "body_language_feedback",
+        "text": analysis,
+        "analysis_number": analysis_count,
+        "timestamp": datetime.now().isoformat()
+    })
+    FEEDBACK_SECONDS.labels(stream="body_language").observe(time.time() - closed_at)
+    
+    log.info("Body language analysis #%d sent: %s...", analysis_count, analysis[:100])
+
+
 @app.websocket("/ws/text/{client_id}")
 async def text_websocket_endpoint(websocket: WebSocket, client_id: str):
     await websocket.accept()
-    print(f"Text streaming client #{client_id} connected")
-    
-    # Initialize buffers for this client
-    transcript_buffers[client_id] = []
-    last_analysis_time[client_id] = time.time()
-    analysis_history[client_id] = []
-    speech_metrics[client_id] = {
-        "total_words": 0,
-        "total_fillers": 0,
-        "analyses_count": 0
-    }
+    log = client_logger(logger, client_id)
+    log.info("Text streaming client connected")
+    
+    # Resume the client's session if it reconnected, otherwise start a new one
+    session = await session_store.load(client_id)
+    if session is None:
+        session = SessionState(client_id)
+    else:
+        log.info("Resuming session (%d analyses so far)", len(session.analysis_history))
+    # This connection now owns the session; an older one still draining cannot save over it
+    session.generation += 1
+    await session_store.save(session)
+    
+    # Record what the client sends for offline re-analysis, if SESSION_LOG_DIR is set
+    recorder = session_log.start(client_id) if session_log is not None else None
+    
+    # Gemini calls run in the background so the receive loop never waits on them.
+    # Windows that become due while an analysis is in flight are merged into one.
+    scheduler = AnalysisScheduler(client_id)
+    # Payloads carry the time their window closed; merged windows keep the older one
+    scheduler.register(
+        "speech",
+        lambda payload: run_speech_analysis(websocket, session, *payload),
+        merge=lambda pending, new: (f"{pending[0]} {new[0]}", pending[1].merge(new[1]), pending[2])
+    )
+    scheduler.register(
+        "body_language",
+        lambda payload: run_body_language_analysis(websocket, session, *payload),
+        merge=lambda pending, new: (pending[0].merge(new[0]), pending[1])
+    )
+    
+    def submit_speech_window():
+        """Close the speech window and queue its analysis"""
+        current_time = time.time()
+        if recorder is not None:
+            recorder.window("speech", current_time)
+        
+        # Get the transcript and metrics since the last window
+        recent_transcript = session.transcript_buffer.text()
+        window = session.speech_metrics.take_window()
+        
+        if recent_transcript.strip():
+            scheduler.submit("speech", (recent_transcript, window, current_time))
+        
+        # Reset for next analysis
+        session.transcript_buffer.clear()
+    
+    def submit_body_language_window():
+        """Close the body language window and queue its analysis"""
+        current_time = time.time()
+        if recorder is not None:
+            recorder.window("body_language", current_time)
+        
+        # Take the counts gathered since the last analysis (resets the window)
+        recent_body_data = session.body_aggregates.take_current()
+        
+        if recent_body_data.total:  # The gate skips windows with too few data points
+            scheduler.submit("body_language", (recent_body_data, current_time))
+    
+    # Windows close on the server's clock (every 10s and 30s, longer under load),
+    # not when the next message happens to arrive
+    speech_timer = cadence.add("speech", SPEECH_INTERVAL, submit_speech_window)
+    body_language_timer = cadence.add("body_language", BODY_LANGUAGE_INTERVAL, submit_body_language_window)
+    
+    def handle_transcription(text: str, is_final: bool, timestamp: Optional[float]):
+        """Buffer a transcription result for the current speech window"""
+        if is_final:
+            log.info("Final: %s", text)
+            if recorder is not None:
+                recorder.transcript(text, timestamp)
+            # Count and store only the newly spoken part - the browser
+            # resends the whole utterance with every final result
+            new_text = session.speech_metrics.add_final(text, timestamp)
+            if new_text:
+                session.transcript_buffer.append(new_text)
+        else:
+            # Interim results arrive many times a second - sampled per client
+            log.debug("Speaking: %s", text, extra={"event": "interim"})
+    
+    async def on_hello(data: dict):
+        # A v2 client waits for this reply before sending batches or binary frames
+        reply = hello_reply(data)
+        log.info("Negotiated protocol v%d (binary: %s)", reply["protocol"], reply.get("binary", False))
+        await websocket.send_json(reply)
+    
+    async def on_heartbeat(data: dict):
+        # Handle heartbeat - just acknowledge to keep connection alive
+        log.debug("Heartbeat received", extra={"event": "heartbeat"})
+    
+    async def on_body_language(data: dict):
+        emotion = data.get("emotion", "neutral")
+        posture = data.get("posture", {})
+        fatigue = data.get("fatigue", {})
+        
+        # Fold the frame into the session's running aggregates
+        frame = (
+            time.time(),
+            encode_emotion(emotion),
+            encode_posture(posture.get("label")),
+            encode_fatigue(fatigue.get("label"))
+        )
+        session.body_aggregates.add(*frame)
+        if recorder is not None:
+            recorder.body_frame(*frame)
+        
+        log.debug("Body language: %s, %s, %s", emotion, posture.get("label", "unknown"),
+                  fatigue.get("label", "unknown"), extra={"event": "body_language_frame"})
+    
+    async def on_body_language_frames(frames: List[BodyFrame]):
+        # Already-encoded frames, several per message (protocol v2)
+        frames = anchor_timestamps(frames)
+        for frame in frames:
+            session.body_aggregates.add(*frame)
+            if recorder is not None:
+                recorder.body_frame(*frame)
+        
+        log.debug("Body language batch: %d frames", len(frames), extra={"event": "body_language_frame"})
     
-    # Initialize body language buffers
-    body_language_buffers[client_id] = []
-    last_body_analysis_time[client_id] = time.time()
-    body_language_history[client_id] = []
+    async def on_transcription(data: dict):
+        handle_transcription(data.get("text", ""), data.get("is_final", False), parse_timestamp(data.get("timestamp")))
+    
+    async def on_binary_transcription(data: Tuple[str, bool, float]):
+        handle_transcription(*data)
+    
+    async def on_unknown(data):
+        log.debug("Ignoring unknown message type: %s", data.get("type") if isinstance(data, dict) else data)
+    
+    router = MessageRouter()
+    router.on("hello", on_hello)
+    router.on("heartbeat", on_heartbeat)
+    router.on("body_language", on_body_language)
+    router.on("streaming_transcription", on_transcription)
+    router.on_binary(BINARY_BODY_FRAMES, "body_language_frames", on_body_language_frames,
+                     decode=lambda data: list(decode_body_frames(data)))
+    router.on_binary(BINARY_TRANSCRIPTION, "streaming_transcription", on_binary_transcription,
+                     decode=decode_transcription)
+    router.fallback(on_unknown)
     
     try:
+        # Registered inside the try so the finally always unregisters it
+        active_connections[client_id] = websocket
+        
+        # Re-deliver video jobs started before a reconnect
+        for job in job_store.for_client(client_id):
+            await push_job_update(job)
+        
         while True:
-            message = await websocket.receive_text()
-            data = json.loads(message)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
             
-            if data.get("type") == "heartbeat":
-                # Handle heartbeat - just acknowledge to keep connection alive
-                print(f"[Client #{client_id}] Heartbeat received")
-                continue
-            elif data.get("type") == "body_language":
-                # Handle body language data
-                emotion = data.get("emotion", "neutral")
-                posture = data.get("posture", {})
-                fatigue = data.get("fatigue", {})
-                
-                # Store body language data
-                body_language_buffers[client_id].append({
-                    "emotion": emotion,
-                    "posture": posture,
-                    "fatigue": fatigue,
-                    "timestamp": data.get("timestamp", datetime.now().isoformat())
-                })
-                
-                print(f"[Client #{client_id}] Body language: {emotion}, {posture.get('label', 'unknown')}, {fatigue.get('label', 'unknown')}")
-                
-                # Check if it's time for body language analysis (every 30 seconds)
-                current_time = time.time()
-                if current_time - last_body_analysis_time[client_id] >= 30:
-                    recent_body_data = body_language_buffers[client_id]
-                    
-                    if len(recent_body_data) >= 5:  # Need at least 5 data points
-                        print(f"[Client #{client_id}] Analyzing body language patterns...")
-                        
-                        # Analyze with Gemini
-                        analysis = await analyze_body_language_with_gemini(recent_body_data, client_id)
-                        
-                        # Store analysis in history
-                        body_language_history[client_id].append(analysis)
-                        
-                        # Count analyses
-                        analysis_count = len(body_language_history[client_id])
-                        
-                        # Send analysis to frontend
-                        await websocket.send_json({
-                            "type": "body_language_feedback",
-                            "text": analysis,
-                            "analysis_number": analysis_count,
-                            "timestamp": datetime.now().isoformat()
-                        })
-                        
-                        print(f"[Client #{client_id}] Body language analysis #{analysis_count} sent: {analysis[:100]}...")
-                    
-                    # Reset for next analysis
-                    body_language_buffers[client_id] = []
-                    last_body_analysis_time[client_id] = current_time
-                
-            elif data.get("type") == "streaming_transcription":
-                text = data.get("text", "")
-                is_final = data.get("is_final", False)
-                
-                # Print the streaming text with clear formatting
-                if is_final:
-                    print(f"\n[Client #{client_id}] Final: {text}")
-                    # Store final transcript
-                    transcript_buffers[client_id].append(text)
-                else:
-                    # Use carriage return to update the same line for interim results
-                    print(f"\r[Client #{client_id}] Speaking: {text}", end="", flush=True)
-                
-                # Check if it's time for analysis (every 10 seconds)
-                current_time = time.time()
-                if current_time - last_analysis_time[client_id] >= 10:
-                    # Get the last 10 seconds of transcript
-                    recent_transcript = " ".join(transcript_buffers[client_id])
-                    
-                    if recent_transcript.strip():
-                        print(f"\n[Client #{client_id}] Analyzing transcript...")
-                        
-                        # Analyze with Gemini
-                        analysis = await analyze_with_gemini(recent_transcript, client_id)
-                        
-                        # Store analysis in history
-                        analysis_history[client_id].append(analysis)
-                        
-                        # Update metrics
-                        speech_metrics[client_id]["analyses_count"] += 1
-                        
-                        # Send analysis to frontend
-                        analysis_message = {
-                            "type": "analysis",
-                            "text": analysis,
-                            "transcript_analyzed": recent_transcript,
-                            "timestamp": datetime.now().isoformat(),
-                            "analysis_number": speech_metrics[client_id]["analyses_count"]
-                        }
-                        
-                        print(f"[Client #{client_id}] Sending analysis message: {analysis_message}")
-                        await websocket.send_json(analysis_message)
-                        print(f"[Client #{client_id}] Analysis #{speech_metrics[client_id]['analyses_count']} sent successfully!")
-                    
-                    # Reset for next analysis
-                    transcript_buffers[client_id] = []
-                    last_analysis_time[client_id] = current_time
-                else:
-                    # Debug: show time remaining until next analysis
-                    time_remaining = 10 - (current_time - last_analysis_time[client_id])
-                    if time_remaining > 0 and time_remaining < 1:
-                        print(f"[Client #{client_id}] Next analysis in {time_remaining:.1f}s")
+            try:
+                await router.dispatch(message)
+            except ValueError as e:  # Bad JSON or a malformed binary frame (ProtocolError)
+                log.warning("Dropping malformed message: %s", e)
                 
     except WebSocketDisconnect:
-        print(f"\nText streaming client #{client_id} disconnected")
-        # Clean up speech buffers
-        if client_id in transcript_buffers:
-            del transcript_buffers[client_id]
-        if client_id in last_analysis_time:
-            del last_analysis_time[client_id]
-        if client_id in analysis_history:
-            del analysis_history[client_id]
-        if client_id in speech_metrics:
-            del speech_metrics[client_id]
-        
-        # Clean up body language buffers
-        if client_id in body_language_buffers:
-            del body_language_buffers[client_id]
-        if client_id in last_body_analysis_time:
-            del last_body_analysis_time[client_id]
-        if client_id in body_language_history:
-            del body_language_history[client_id]
+        log.info("Text streaming client disconnected")
     except Exception as e:
-        print(f"\nError in text websocket: {e}")
+        log.exception("Error in text websocket: %s", e)
         await websocket.close()
-
-
-@app.post("/api/analyze-video")
-async def analyze_video(
-    video: UploadFile = File(...),
-    client_id: str = Form(...),
-    duration: int = Form(...)
-):
-    """Analyze video with TwelveLabs for comprehensive therapy insights"""
-    print(f"[Client #{client_id}] Received video for analysis, duration: {duration}s")
+    finally:
+        if active_connections.get(client_id) is websocket:
+            del active_connections[client_id]
+        
+        # Flush the partial windows; their analyses get FLUSH_TIMEOUT to land in the
+        # session history, then the session is kept for a reconnect (unless one
+        # already took it over) and the store evicts it after SESSION_TTL_SECONDS
+        speech_timer.cancel()
+        body_language_timer.cancel()
+        submit_speech_window()
+        submit_body_language_window()
+        if recorder is not None:
+            recorder.close()
+        await scheduler.close(drain=FLUSH_TIMEOUT)
+        if not await session_store.save(session):
+            log.info("Session was resumed by a newer connection, not saving this one")
+
+
+@app.post("/api/analyze-video", status_code=202)
+async def analyze_video(request: Request):
+    """Queue a video for TwelveLabs analysis and return its job id"""
+    # Parsed from the request stream instead of File()/Form() parameters, so an
+    # oversized upload is refused as it arrives rather than after it was received
+    try:
+        form = await read_upload_form(request)
+    except UploadTooLarge as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    except MultiPartException as e:
+        return JSONResponse(status_code=400, content={"error": e.message})
+    
+    try:
+        video, client_id, duration = validate_video_form(form)
+    except RequestValidationError:
+        await form.close()
+        raise
+    
+    log = client_logger(logger, client_id)
+    log.info("Received video for analysis, duration: %ss", duration)
     
     try:
         # Check minimum duration
@@ -376,41 +543,311 @@ async def analyze_video(
                 content={"error": "Video too short. Minimum 4 seconds required."}
             )
         
-        # Save uploaded video temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as tmp_webm:
-            content = await video.read()
-            tmp_webm.write(content)
-            tmp_webm_path = tmp_webm.name
-            print(f"Saved WebM to: {tmp_webm_path}, size: {len(content)} bytes")
+        # The upload was written to disk and hashed while the form was parsed
+        tmp_webm_path, size, digest = video.file.keep()
+        log.info("Saved WebM to: %s, size: %d bytes, sha256: %s", tmp_webm_path, size, digest)
         
-        # Convert WebM to MP4 using FFmpeg
-        tmp_mp4_path = tmp_webm_path.replace('.webm', '.mp4')
-        print(f"Converting WebM to MP4: {tmp_mp4_path}")
+        return await start_video_job(client_id, tmp_webm_path, digest)
         
+    except Exception as e:
+        log.exception("Error analyzing video: %s", e)
+        return JSONResponse(
+            status_code=500,
+            content={"error": str(e)}
+        )
+    finally:
+        await form.close()
+
+
+def validate_video_form(form: FormData) -> Tuple[UploadFile, str, int]:
+    """The video, client_id and duration fields, or the 422 File()/Form() parameters would give"""
+    errors = []
+    video = form.get("video")
+    if video is None:
+        errors.append(_missing_field("video"))
+    elif not isinstance(video, UploadFile):
+        errors.append({
+            "type": "value_error", "loc": ("body", "video"), "input": video, "ctx": {"error": {}},
+            "msg": f"Value error, Expected UploadFile, received: {type(video)}"
+        })
+    values = []
+    for name, field_type in (("client_id", str), ("duration", int)):
+        if name not in form:
+            errors.append(_missing_field(name))
+            continue
+        value = form[name]
         try:
-            result = subprocess.run([
-                'ffmpeg', '-i', tmp_webm_path,
-                '-c:v', 'libx264',
-                '-c:a', 'aac',
-                '-movflags', '+faststart',
-                '-y',  # Overwrite output file
-                tmp_mp4_path
-            ], capture_output=True, text=True)
-            
-            if result.returncode != 0:
-                print(f"FFmpeg error: {result.stderr}")
-                raise Exception(f"FFmpeg conversion failed: {result.stderr}")
+            values.append(TypeAdapter(field_type).validate_python(value))
+        except ValidationError as e:
+            # A file sent in a text field isn't echoed back
+            echoed = value if isinstance(value, str) else None
+            errors.extend({**error, "loc": ("body", name), "input": echoed} for error in e.errors(include_url=False))
+    if errors:
+        raise RequestValidationError(errors)
+    return video, values[0], values[1]
+
+
+def _missing_field(name: str) -> Dict:
+    return {"type": "missing", "loc": ("body", name), "msg": "Field required", "input": None}
+
+
+async def start_video_job(client_id: str, tmp_webm_path: str, digest: str,
+                          transcoder: Optional[StreamingTranscoder] = None) -> JSONResponse:
+    """Start (or join, or answer from cache) the analysis job for a saved upload"""
+    log = client_logger(logger, client_id)
+    
+    # A retry of an upload that is still being analyzed joins the running job
+    job = video_jobs_by_digest.get(digest)
+    if job is not None and not job.done:
+        await discard_upload(tmp_webm_path, transcoder)
+        log.info("Duplicate upload, joining video job %s", job.job_id)
+        return JSONResponse(status_code=202, content={
+            "job_id": job.job_id,
+            "status": job.status,
+            "status_url": f"/api/analyze-video/{job.job_id}"
+        })
+    
+    job = job_store.create(client_id)
+    cached = await video_cache.get(digest)
+    if cached is not None and cached.get("analysis") is not None:
+        # Same recording analyzed before - no TwelveLabs work at all
+        await discard_upload(tmp_webm_path, transcoder)
+        await job_store.update(job, "complete", "Analysis complete (cached)", result=cached["analysis"])
+        log.info("Video job %s answered from cache", job.job_id)
+    else:
+        # Hand the rest of the work to a background job
+        video_jobs_by_digest[digest] = job
+        task = asyncio.create_task(process_video_job(job, tmp_webm_path, digest, cached, transcoder))
+        background_jobs.add(task)
+        task.add_done_callback(background_jobs.discard)
+        log.info("Video job %s queued", job.job_id)
+    
+    return JSONResponse(status_code=202, content={
+        "job_id": job.job_id,
+        "status": job.status,
+        "status_url": f"/api/analyze-video/{job.job_id}"
+    })
+
+
+async def discard_upload(tmp_webm_path: str, transcoder: Optional[StreamingTranscoder] = None):
+    """Delete an upload that needs no processing, stopping its live transcode"""
+    if transcoder is not None:
+        await transcoder.abort()
+    os.unlink(tmp_webm_path)
+
+
+@app.post("/api/video-uploads", status_code=201)
+async def create_video_upload(client_id: str = Form(...), mime_type: str = Form("")):
+    """Start a chunked upload; chunks can be sent while the session is still recording"""
+    upload = await upload_store.create(client_id, mime_type)
+    client_logger(logger, client_id).info(
+        "Chunked upload %s started (%s, live transcode: %s)", upload.upload_id, mime_type or "unknown type",
+        upload.transcoder is not None
+    )
+    return JSONResponse(status_code=201, content={
+        **upload.to_dict(),
+        "upload_url": f"/api/video-uploads/{upload.upload_id}"
+    })
+
+
+@app.get("/api/video-uploads/{upload_id}")
+async def get_video_upload(upload_id: str):
+    """Current offset of a chunked upload, to resume after a failed chunk"""
+    upload = await upload_store.get(upload_id)
+    if upload is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown upload id"})
+    return upload.to_dict()
+
+
+@app.put("/api/video-uploads/{upload_id}")
+async def append_video_upload(upload_id: str, offset: int, request: Request):
+    """Append the request body to an upload; offset must equal the bytes received so far"""
+    upload = await upload_store.get(upload_id)
+    if upload is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown upload id"})
+    
+    try:
+        size = await upload.append(offset, request.stream())
+    except UploadOffsetMismatch as e:
+        return JSONResponse(status_code=409, content={"error": str(e), "offset": e.offset})
+    except UploadClosed as e:
+        return JSONResponse(status_code=409, content={"error": str(e), "offset": upload.size})
+    except UploadTooLarge as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    return {"upload_id": upload_id, "offset": size}
+
+
+@app.delete("/api/video-uploads/{upload_id}", status_code=204)
+async def delete_video_upload(upload_id: str):
+    """Discard a chunked upload the client will not complete, stopping its live transcode"""
+    if not await upload_store.discard(upload_id):
+        return JSONResponse(status_code=404, content={"error": "Unknown upload id"})
+    logger.info("Chunked upload %s discarded", upload_id)
+    return Response(status_code=204)
+
+
+@app.post("/api/video-uploads/{upload_id}/complete", status_code=202)
+async def complete_video_upload(upload_id: str, duration: int = Form(...)):
+    """Finish a chunked upload and queue it for TwelveLabs analysis like /api/analyze-video"""
+    upload = await upload_store.get(upload_id)
+    if upload is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown upload id"})
+    
+    # Check minimum duration; a short recording is never analyzed, so drop it now
+    if duration < 4:
+        await upload_store.discard(upload_id)
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Video too short. Minimum 4 seconds required."}
+        )
+    
+    upload_store.take(upload_id)
+    try:
+        digest = await upload.close()
+    except UploadClosed as e:
+        # Completed by a concurrent request, possibly on another worker
+        await upload.drop_transcoder("was already completed")
+        return JSONResponse(status_code=409, content={"error": str(e)})
+    log = client_logger(logger, upload.client_id)
+    log.info("Chunked upload %s complete: %d bytes, duration: %ss", upload_id, upload.size, duration)
+    
+    try:
+        return await start_video_job(upload.client_id, upload.path, digest, upload.transcoder)
+    except Exception as e:
+        log.exception("Error analyzing video: %s", e)
+        return JSONResponse(
+            status_code=500,
+            content={"error": str(e)}
+        )
+
+
+@app.get("/api/analyze-video/{job_id}")
+async def get_video_job(job_id: str):
+    """Poll the status and result of a video analysis job"""
+    job = await job_store.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown job id"})
+    return job.to_dict()
+
+
+@app.get("/api/analyze-video/{job_id}/stream")
+async def stream_video_job(job_id: str):
+    """Server-sent events for a video job: analysis text as it is generated, then the result"""
+    job = await job_store.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown job id"})
+    
+    async def events():
+        # Live for jobs running on this worker, followed through RESULTS_DIR for the rest
+        async for kind, payload in job_store.events(job):
+            if kind == "chunk":
+                yield f"event: chunk\ndata: {json.dumps({'text': payload})}\n\n"
+            else:
+                yield f"event: status\ndata: {json.dumps(payload)}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+async def process_video_job(job: VideoJob, tmp_webm_path: str, digest: str, cached: Optional[dict] = None,
+                            transcoder: Optional[StreamingTranscoder] = None):
+    """Prepare the video and run the TwelveLabs analysis for a job"""
+    tmp_mp4_path = tmp_webm_path.replace('.webm', '.mp4')
+    loop = asyncio.get_running_loop()
+    log = client_logger(logger, job.client_id)
+    
+    # Both callbacks are invoked from the worker thread
+    def on_progress(status: str, message: str):
+        asyncio.run_coroutine_threadsafe(job_store.update(job, status, message), loop)
+    
+    def on_chunk(text: str):
+        asyncio.run_coroutine_threadsafe(job_store.append_chunk(job, text), loop)
+    
+    async def analyze(video_path: str, index_id: str, video_id: Optional[str] = None) -> dict:
+        # Analyze with TwelveLabs on the worker pool
+        return await asyncio.wrap_future(submit_counted(
+            video_executor,
+            video_executor_queued,
+            analyze_video_with_twelvelabs,
+            video_path,
+            job.client_id,
+            index_id,
+            on_progress,
+            on_chunk,
+            video_id
+        ))
+    
+    try:
+        async with acquire_counted(video_job_slots, VIDEO_JOBS_WAITING):
+            # Resolve the TwelveLabs index (cached after the first job)
+            try:
+                index_id = await index_resolver.get()
+            except Exception as e:
+                raise Exception(f"No valid TwelveLabs index available ({e}). Please check your API key and try again.")
             
-            print(f"Successfully converted to MP4")
+            # An upload this index already holds only needs the analysis generated
+            video_id = cached["video_id"] if cached is not None and cached.get("index_id") == index_id else None
+            analysis_result = None
+            if video_id is not None:
+                log.info("Reusing indexed video %s", video_id)
+                if transcoder is not None:
+                    await transcoder.abort()
+                    transcoder = None
+                analysis_result = await analyze(tmp_webm_path, index_id, video_id)
+                if analysis_result.get("status") == "failed":
+                    # The video may be gone from TwelveLabs - forget it and index the upload again
+                    log.warning("Indexed video %s failed, uploading again: %s", video_id, analysis_result.get("error"))
+                    await video_cache.delete(digest)
+                    job.chunks = []
+                    analysis_result = None
             
-            # Use MP4 file for TwelveLabs
-            video_path = tmp_mp4_path
-        except Exception as e:
-            print(f"FFmpeg conversion failed, using original WebM: {e}")
-            video_path = tmp_webm_path
+            if analysis_result is None:
+                await job_store.update(job, "preparing", "Preparing video")
+                
+                # A chunked upload was converted while it arrived - only the tail is left
+                video_path = None
+                if transcoder is not None:
+                    try:
+                        video_path, mode = await transcoder.finish()
+                        log.info("Live transcode finished (%s): %s", mode, video_path)
+                    except TranscodeError as e:
+                        log.warning("Live transcode failed, converting the whole upload: %s", e)
+                
+                # Pass through, remux or re-encode to MP4 - whichever is cheapest
+                if video_path is None:
+                    try:
+                        video_path, mode = await prepare_video(tmp_webm_path, tmp_mp4_path)
+                        log.info("Prepared video for TwelveLabs (%s): %s", mode, video_path)
+                    except Exception as e:
+                        log.warning("FFmpeg conversion failed, using original WebM: %s", e)
+                        video_path = tmp_webm_path
+                
+                analysis_result = await analyze(video_path, index_id)
+        
+        # Remember the indexed video, and the analysis once it succeeded
+        if analysis_result.get("video_id"):
+            complete = analysis_result.get("status") != "failed"
+            try:
+                await video_cache.put(digest, index_id, analysis_result["video_id"],
+                                      analysis_result if complete else None)
+            except OSError as e:
+                log.warning("Could not cache video analysis: %s", e)
+        
+        if analysis_result.get("status") == "failed":
+            await job_store.update(job, "failed", analysis_result.get("note", ""), result=analysis_result)
+        else:
+            await job_store.update(job, "complete", "Analysis complete", result=analysis_result)
         
-        # Analyze with TwelveLabs
-        analysis_result = await analyze_video_with_twelvelabs(video_path, client_id)
+    except Exception as e:
+        log.exception("Error analyzing video: %s", e)
+        await job_store.update(job, "failed", str(e), result={"error": str(e), "status": "failed"})
+    finally:
+        if video_jobs_by_digest.get(digest) is job:
+            del video_jobs_by_digest[digest]
+        
+        # Stop a live transcode the job never got to use
+        if transcoder is not None and transcoder.process.returncode is None:
+            await transcoder.abort()
         
         # Clean up temporary files
         try:
@@ -419,53 +856,58 @@ async def analyze_video(
                 os.unlink(tmp_mp4_path)
         except:
             pass
-        
-        return JSONResponse(content=analysis_result)
-        
-    except Exception as e:
-        print(f"Error analyzing video: {e}")
-        import traceback
-        traceback.print_exc()
-        return JSONResponse(
-            status_code=500,
-            content={"error": str(e)}
-        )
 
 
-async def analyze_video_with_twelvelabs(video_path: str, client_id: str) -> dict:
-    """Use TwelveLabs to analyze the practice session video"""
+def analyze_video_with_twelvelabs(video_path: str, client_id: str, index_id: str,
+                                  on_progress=None, on_chunk=None, video_id: Optional[str] = None) -> dict:
+    """Use TwelveLabs to analyze the practice session video.
+    
+    Blocks on the TwelveLabs SDK, so it runs on video_executor; on_progress(status, message)
+    is called as the job moves through upload, indexing and generation, and on_chunk(text)
+    for each piece of the analysis as TwelveLabs streams it. Given the video_id of an
+    already indexed upload, the upload and indexing are skipped.
+    """
+    def report(status: str, message: str):
+        if on_progress is not None:
+            on_progress(status, message)
+    
+    log = client_logger(logger, client_id)
+    
     try:
-        print(f"[Client #{client_id}] Starting TwelveLabs analysis...")
-        
-        # Check if we have a valid index
-        if not INDEX_ID:
-            raise Exception("No valid TwelveLabs index available. Please check your API key and try again.")
-        
-        # Upload video to TwelveLabs
-        print(f"Uploading video to TwelveLabs index: {INDEX_ID}")
-        
-        # Create a task for video upload
-        task = tl_client.task.create(
-            index_id=INDEX_ID,
-            file=video_path
-        )
-        
-        print(f"Task created: {task.id}")
-        
-        # Wait for the task to complete
-        def on_task_update(task: Task):
-            print(f"Task status: {task.status}")
-        
-        task.wait_for_done(callback=on_task_update)
-        
-        if task.status != "ready":
-            raise Exception(f"Task failed with status: {task.status}")
+        log.info("Starting TwelveLabs analysis...")
+        tl_client = get_twelvelabs_client()
         
-        video_id = task.video_id
-        print(f"Video uploaded successfully: {video_id}")
+        if video_id is None:
+            # Upload video to TwelveLabs
+            log.info("Uploading video to TwelveLabs index: %s", index_id)
+            
+            # Create a task for video upload
+            report("uploading", "Uploading video to TwelveLabs")
+            with TWELVELABS_PHASE_SECONDS.labels(phase="upload").time():
+                task = tl_client.task.create(
+                    index_id=index_id,
+                    file=video_path
+                )
+            
+            log.info("Task created: %s", task.id)
+            
+            # Wait for the task to complete
+            def on_task_update(task: Task):
+                log.debug("Task status: %s", task.status)
+                report("indexing", f"Indexing video ({task.status})")
+            
+            with TWELVELABS_PHASE_SECONDS.labels(phase="index").time():
+                task.wait_for_done(callback=on_task_update)
+            
+            if task.status != "ready":
+                raise Exception(f"Task failed with status: {task.status}")
+            
+            video_id = task.video_id
+            log.info("Video uploaded successfully: %s", video_id)
         
         # Perform comprehensive analysis using open-ended generate
-        print("Generating comprehensive therapy analysis...")
+        log.info("Generating comprehensive therapy analysis...")
+        report("analyzing", "Generating therapy analysis")
         
         prompt = """You are an expert speech and body language therapist analyzing a practice session video. 
         Please provide a comprehensive analysis covering:
@@ -498,24 +940,34 @@ async def analyze_video_with_twelvelabs(video_path: str, client_id: str) -> dict
         Please be encouraging but specific, providing timestamps when noting particular moments.
         Format your response in clear sections with practical advice."""
         
+        # Get the video gist for additional context while the analysis streams
+        def fetch_gist():
+            with TWELVELABS_PHASE_SECONDS.labels(phase="gist").time():
+                return tl_client.gist(
+                    video_id=video_id,
+                    types=["title", "topic", "hashtag"]
+                )
+        
+        gist_future = submit_counted(gist_executor, gist_executor_queued, fetch_gist)
+        
         # Use analyze endpoint for open-ended analysis
         text_stream = tl_client.analyze_stream(
             video_id=video_id,
             prompt=prompt
         )
         
-        # Collect the streamed text
-        detailed_analysis = ""
-        for text in text_stream:
-            detailed_analysis += text
+        # Forward the streamed text as it arrives and join it once at the end
+        chunks = []
+        with TWELVELABS_PHASE_SECONDS.labels(phase="generate").time():
+            for text in text_stream:
+                chunks.append(text)
+                if on_chunk is not None:
+                    on_chunk(text)
+        detailed_analysis = "".join(chunks)
         
-        print(f"Generated detailed analysis: {len(detailed_analysis)} characters")
+        log.info("Generated detailed analysis: %d characters", len(detailed_analysis))
         
-        # Also get video gist for additional context
-        gist_result = tl_client.gist(
-            video_id=video_id,
-            types=["title", "topic", "hashtag"]
-        )
+        gist_result = gist_future.result()
         
         # Format the analysis result
         analysis = {
@@ -527,19 +979,19 @@ async def analyze_video_with_twelvelabs(video_path: str, client_id: str) -> dict
             "status": "complete"
         }
         
-        print(f"[Client #{client_id}] TwelveLabs analysis complete")
+        log.info("TwelveLabs analysis complete")
         return analysis
         
     except Exception as e:
-        print(f"TwelveLabs analysis error: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("TwelveLabs analysis error: %s", e)
         
         # Return a graceful error response
         return {
             "error": str(e),
             "status": "failed",
-            "note": "Video analysis encountered an error. Please try again."
+            "note": "Video analysis encountered an error. Please try again.",
+            # Set once indexing succeeded, so a retry can skip straight to generation
+            "video_id": video_id
         }
 
 
@@ -0,0 +1,86 @@
+from typing import Dict, Iterable
+
+from speech_metrics import SpeechMetrics, WindowMetrics
+
+# Prompt builders shared by the live analyses (main.py) and offline replays (session_replay.py)
+
+# Sent instead of a Gemini call when a speech window has too few words
+SPEECH_TEMPLATE = ("I only caught a few words there - keep talking so I can give you feedback on your pace, "
+                   "clarity and word choice.")
+
+
+def speech_prompt(transcript: str, window: WindowMetrics, metrics: SpeechMetrics, history: Iterable[str]) -> str:
+    """Speech therapist prompt for one transcript window"""
+    previous_analyses = list(history)
+    previous_feedback = "\n".join(previous_analyses[-3:]) if previous_analyses else "No previous feedback"
+    word_count = window.words
+    fillers = f" ({window.filler_breakdown()})" if window.fillers else ""
+
+    return f"""You are an experienced speech therapist providing personalized feedback. 
+
+Current transcript (last 10 seconds, {word_count} words):
+"{transcript}"
+
+Speech metrics:
+- Total words: {word_count}
+- Unique words: {window.unique_words}
+- Filler words detected: {window.fillers}{fillers}
+- Repeated words: {window.repetitions}
+- Session speaking rate: {metrics.words_per_minute:.0f} words per minute
+- Session lexical diversity: {metrics.lexical_diversity:.0%}
+
+Previous feedback given:
+{previous_feedback}
+
+IMPORTANT INSTRUCTIONS:
+1. Provide DIFFERENT feedback than before - focus on new aspects each time
+2. Be specific - mention exact words or phrases from the transcript
+3. Notice and praise improvements if any
+4. Vary your suggestions - don't repeat the same advice
+5. Consider these rotating focus areas:
+   - First analysis: Overall clarity and pace
+   - Second analysis: Vocabulary variety and word choice
+   - Third analysis: Sentence structure and flow
+   - Fourth analysis: Confidence and emphasis
+   - Fifth analysis: Natural pauses and breathing
+   
+Keep response to 2-3 sentences. Be encouraging but specific. If you notice the speaker said very little, encourage them to speak more."""
+
+
+def body_language_prompt(summary: Dict, trend: Dict, history: Iterable[str]) -> str:
+    """Body language coach prompt for one window's WindowCounts.summary() and the session trend's"""
+    previous_analyses = list(history)
+    previous_feedback = "\n".join(previous_analyses[-2:]) if previous_analyses else "No previous feedback"
+    most_common_emotion = summary["dominant_emotion"]
+    good_posture_ratio = summary["good_posture_ratio"]
+    tired_ratio = summary["tired_ratio"]
+
+    return f"""You are an expert body language coach providing personalized feedback for someone during a speech therapy session.
+
+Recent body language data (last 30 seconds):
+- Dominant emotion: {most_common_emotion}
+- Good posture ratio: {good_posture_ratio:.1%}
+- Fatigue signs: {tired_ratio:.1%}
+- Total data points: {summary["samples"]}
+
+Trend over the last 5 minutes:
+- Dominant emotion: {trend["dominant_emotion"]}
+- Good posture ratio: {trend["good_posture_ratio"]:.1%}
+- Fatigue signs: {trend["tired_ratio"]:.1%}
+
+Previous feedback given:
+{previous_feedback}
+
+IMPORTANT INSTRUCTIONS:
+1. Provide DIFFERENT feedback than before - focus on new aspects each time
+2. Be encouraging and constructive
+3. Give specific, actionable advice for body language during speech
+4. Notice how the recent data differs from the trend and praise improvements if any
+5. Consider these rotating focus areas:
+   - First analysis: Overall posture and presence
+   - Second analysis: Facial expressions and emotional engagement
+   - Third analysis: Energy levels and alertness
+   - Fourth analysis: Professional presentation
+   - Fifth analysis: Confidence and body language harmony
+
+Keep response to 2-3 sentences. Be supportive but specific. If the data shows good patterns, acknowledge and encourage them."""
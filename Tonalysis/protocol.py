@@ -0,0 +1,159 @@
+import json
+import struct
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from session_buffers import EMOTIONS, POSTURES, FATIGUE_LEVELS
+from telemetry import WS_MESSAGES, WS_PARSE_SECONDS
+
+# v1: one JSON text frame per message. v2 adds "batch" messages and binary
+# frames; a client opts in with {"type": "hello", "protocol": 2} and only
+# switches once the server has answered, so v1 clients keep working unchanged.
+PROTOCOL_VERSION = 2
+
+# Binary frames start with a one-byte kind
+BINARY_BODY_FRAMES = 1
+BINARY_TRANSCRIPTION = 2
+
+# kind, frame count, then per frame: client epoch seconds + emotion/posture/fatigue codes
+_BODY_HEADER = struct.Struct("<BH")
+_BODY_FRAME = struct.Struct("<dBBB")
+# kind, is_final, client epoch seconds, then UTF-8 text to the end of the frame
+_TRANSCRIPTION_HEADER = struct.Struct("<BBd")
+
+MAX_BATCH_MESSAGES = 256
+
+BodyFrame = Tuple[float, int, int, int]
+
+
+class ProtocolError(ValueError):
+    """Raised for a frame that can't be decoded"""
+
+
+def hello_reply(request: Dict) -> Dict:
+    """Answer a client's hello with the version both sides speak and the label code tables"""
+    version = min(int(request.get("protocol", 1)), PROTOCOL_VERSION)
+    reply = {"type": "hello", "protocol": version}
+    if version >= 2:
+        reply["binary"] = "binary" in request.get("encodings", ())
+        reply["codes"] = {"emotion": EMOTIONS, "posture": POSTURES, "fatigue": FATIGUE_LEVELS}
+    return reply
+
+
+def encode_body_frames(frames: List[BodyFrame]) -> bytes:
+    parts = [_BODY_HEADER.pack(BINARY_BODY_FRAMES, len(frames))]
+    parts.extend(_BODY_FRAME.pack(*frame) for frame in frames)
+    return b"".join(parts)
+
+
+def decode_body_frames(data: bytes) -> Iterator[BodyFrame]:
+    """Frames from a binary body language batch; unknown codes fall back to 0"""
+    if len(data) < _BODY_HEADER.size:
+        raise ProtocolError("Truncated body language batch")
+    _, count = _BODY_HEADER.unpack_from(data)
+    payload = memoryview(data)[_BODY_HEADER.size:]
+    if len(payload) != count * _BODY_FRAME.size:
+        raise ProtocolError(f"Body language batch of {count} frames has {len(payload)} payload bytes")
+    for timestamp, emotion, posture, fatigue in _BODY_FRAME.iter_unpack(payload):
+        yield (
+            timestamp,
+            emotion if emotion < len(EMOTIONS) else 0,
+            posture if posture < len(POSTURES) else 0,
+            fatigue if fatigue < len(FATIGUE_LEVELS) else 0,
+        )
+
+
+def encode_transcription(text: str, is_final: bool, timestamp: float) -> bytes:
+    return _TRANSCRIPTION_HEADER.pack(BINARY_TRANSCRIPTION, is_final, timestamp) + text.encode()
+
+
+def decode_transcription(data: bytes) -> Tuple[str, bool, float]:
+    """(text, is_final, timestamp) from a binary transcription frame"""
+    if len(data) < _TRANSCRIPTION_HEADER.size:
+        raise ProtocolError("Truncated transcription frame")
+    _, is_final, timestamp = _TRANSCRIPTION_HEADER.unpack_from(data)
+    return bytes(data[_TRANSCRIPTION_HEADER.size:]).decode(errors="replace"), bool(is_final), timestamp
+
+
+def anchor_timestamps(frames: List[BodyFrame], now: Optional[float] = None) -> List[BodyFrame]:
+    """Move client timestamps onto the server clock, keeping their spacing.
+
+    The newest frame of a batch is taken to have been captured just now, so
+    client clock skew never leaks into the server's time windows.
+    """
+    if not frames:
+        return frames
+    offset = (now if now is not None else time.time()) - max(frame[0] for frame in frames)
+    return [(timestamp + offset, emotion, posture, fatigue) for timestamp, emotion, posture, fatigue in frames]
+
+
+Handler = Callable[[Any], Awaitable[None]]
+
+
+class MessageRouter:
+    """Table-driven dispatch for a connection's WebSocket frames.
+
+    JSON messages are routed on their "type", binary frames on their first
+    byte. A "batch" message carries a list of JSON messages that are routed
+    one by one, so a client can send many samples in a single frame.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, Handler] = {}
+        self._binary_handlers: Dict[int, Tuple[str, Handler, Optional[Callable[[bytes], Any]]]] = {}
+        self._fallback: Optional[Handler] = None
+
+    def on(self, message_type: str, handler: Handler):
+        self._handlers[message_type] = handler
+
+    def on_binary(self, kind: int, name: str, handler: Handler, decode: Optional[Callable[[bytes], Any]] = None):
+        """Handler for binary frames whose first byte is kind; decode (timed like JSON parsing) makes its argument"""
+        self._binary_handlers[kind] = (name, handler, decode)
+
+    def fallback(self, handler: Handler):
+        """Handler for JSON messages of an unknown type"""
+        self._fallback = handler
+
+    async def dispatch(self, message: Dict):
+        """Route one ASGI websocket.receive message (text or bytes)"""
+        text = message.get("text")
+        if text is not None:
+            with WS_PARSE_SECONDS.time():
+                data = json.loads(text)
+            await self.dispatch_json(data)
+            return
+
+        data = message.get("bytes")
+        if not data:
+            return
+        entry = self._binary_handlers.get(data[0])
+        if entry is None:
+            WS_MESSAGES.labels(type="other").inc()
+            raise ProtocolError(f"Unknown binary frame kind {data[0]}")
+        name, handler, decode = entry
+        WS_MESSAGES.labels(type=name).inc()
+        if decode is not None:
+            with WS_PARSE_SECONDS.time():
+                data = decode(data)
+        await handler(data)
+
+    async def dispatch_json(self, data: Dict):
+        if isinstance(data, dict) and data.get("type") == "batch":
+            WS_MESSAGES.labels(type="batch").inc()
+            messages = data.get("messages", [])
+            if not isinstance(messages, list):
+                raise ProtocolError("Batch messages must be a list")
+            for item in messages[:MAX_BATCH_MESSAGES]:
+                await self._route(item)
+        else:
+            await self._route(data)
+
+    async def _route(self, data: Dict):
+        # Batches don't nest - a "batch" inside one is treated as an unknown type
+        message_type = data.get("type") if isinstance(data, dict) else None
+        handler = self._handlers.get(message_type)
+        WS_MESSAGES.labels(type=message_type if handler is not None else "other").inc()
+        if handler is not None:
+            await handler(data)
+        elif self._fallback is not None:
+            await self._fallback(data)
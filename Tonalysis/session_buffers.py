@@ -0,0 +1,159 @@
+from array import array
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Small integer codes for the labels body_language.js reports; index 0 is the fallback
+EMOTIONS = ("neutral", "happy", "sad", "surprised", "angry", "fearful", "disgusted")
+POSTURES = ("unknown", "excellent", "good", "fair", "poor")
+FATIGUE_LEVELS = ("unknown", "alert", "moderate", "tired", "very tired")
+
+_EMOTION_CODES = {label: code for code, label in enumerate(EMOTIONS)}
+_POSTURE_CODES = {label: code for code, label in enumerate(POSTURES)}
+_FATIGUE_CODES = {label: code for code, label in enumerate(FATIGUE_LEVELS)}
+
+# Frames arrive every ~2s, so this covers the longest (5 minute) aggregate window
+BODY_BUFFER_CAPACITY = 256
+# Only the last 2-3 analyses go into prompts
+HISTORY_LIMIT = 5
+MAX_TRANSCRIPT_CHARS = 8000
+
+
+def encode_emotion(label: Optional[str]) -> int:
+    return _EMOTION_CODES.get(label, 0)
+
+
+def encode_posture(label: Optional[str]) -> int:
+    return _POSTURE_CODES.get(label, 0)
+
+
+def encode_fatigue(label: Optional[str]) -> int:
+    return _FATIGUE_CODES.get(label, 0)
+
+
+class BodyLanguageBuffer:
+    """Fixed-capacity ring of body language frames stored as parallel arrays.
+
+    A frame costs 11 bytes (float timestamp + three one-byte codes) instead of
+    a dict with nested posture/fatigue dicts and an ISO timestamp string. Once
+    full, the oldest frames are overwritten. Frames are addressed by an
+    absolute sequence number so readers can keep positions across appends.
+    """
+
+    __slots__ = ("capacity", "_timestamps", "_emotions", "_postures", "_fatigue", "_next", "_size")
+
+    def __init__(self, capacity: int = BODY_BUFFER_CAPACITY):
+        self.capacity = capacity
+        self._timestamps = array("d", bytes(8 * capacity))
+        self._emotions = bytearray(capacity)
+        self._postures = bytearray(capacity)
+        self._fatigue = bytearray(capacity)
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def full(self) -> bool:
+        return self._size == self.capacity
+
+    @property
+    def oldest_seq(self) -> int:
+        return self._next - self._size
+
+    @property
+    def next_seq(self) -> int:
+        return self._next
+
+    def append(self, timestamp: float, emotion: int, posture: int, fatigue: int) -> int:
+        """Add a frame of already-encoded labels and return its sequence number"""
+        seq = self._next
+        slot = seq % self.capacity
+        self._timestamps[slot] = timestamp
+        self._emotions[slot] = emotion
+        self._postures[slot] = posture
+        self._fatigue[slot] = fatigue
+        self._next += 1
+        if self._size < self.capacity:
+            self._size += 1
+        return seq
+
+    def frame(self, seq: int) -> Tuple[float, int, int, int]:
+        """(timestamp, emotion, posture, fatigue) for a sequence number still held"""
+        slot = seq % self.capacity
+        return self._timestamps[slot], self._emotions[slot], self._postures[slot], self._fatigue[slot]
+
+    def timestamp(self, seq: int) -> float:
+        return self._timestamps[seq % self.capacity]
+
+    def clear(self):
+        self._size = 0
+
+    def __iter__(self) -> Iterator[Tuple[float, int, int, int]]:
+        """Frames oldest first"""
+        for seq in range(self.oldest_seq, self._next):
+            yield self.frame(seq)
+
+    def to_dict(self) -> Dict:
+        frames = list(self)
+        return {
+            "capacity": self.capacity,
+            "timestamps": [f[0] for f in frames],
+            "codes": bytes(code for f in frames for code in f[1:]).hex(),
+        }
+
+    @staticmethod
+    def frames_from_dict(data: Dict) -> Iterator[Tuple[float, int, int, int]]:
+        codes = bytes.fromhex(data.get("codes", ""))
+        for i, timestamp in enumerate(data.get("timestamps", [])):
+            yield timestamp, codes[3 * i], codes[3 * i + 1], codes[3 * i + 2]
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BodyLanguageBuffer":
+        buffer = cls(data.get("capacity", BODY_BUFFER_CAPACITY))
+        for frame in cls.frames_from_dict(data):
+            buffer.append(*frame)
+        return buffer
+
+
+class TranscriptBuffer:
+    """Final transcripts for the current window, capped at max_chars (oldest dropped)"""
+
+    __slots__ = ("max_chars", "_parts", "_chars")
+
+    def __init__(self, max_chars: int = MAX_TRANSCRIPT_CHARS):
+        self.max_chars = max_chars
+        self._parts: deque = deque()
+        self._chars = 0
+
+    def __len__(self) -> int:
+        return len(self._parts)
+
+    def append(self, text: str):
+        text = text[-self.max_chars:]
+        self._parts.append(text)
+        self._chars += len(text)
+        while self._chars > self.max_chars:
+            self._chars -= len(self._parts.popleft())
+
+    def clear(self):
+        self._parts.clear()
+        self._chars = 0
+
+    def text(self) -> str:
+        return " ".join(self._parts)
+
+    def to_list(self) -> List[str]:
+        return list(self._parts)
+
+    @classmethod
+    def from_list(cls, parts: List[str]) -> "TranscriptBuffer":
+        buffer = cls()
+        for part in parts:
+            buffer.append(part)
+        return buffer
+
+
+def bounded_history(items=()) -> deque:
+    """History of analyses, keeping only what prompts can still use"""
+    return deque(items, maxlen=HISTORY_LIMIT)
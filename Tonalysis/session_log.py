@@ -0,0 +1,194 @@
+import glob
+import logging
+import mmap
+import os
+import struct
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Recording is off unless a directory is set
+SESSION_LOG_DIR = os.getenv("SESSION_LOG_DIR", "")
+# A segment is closed and a new one started once it reaches this size
+SESSION_LOG_SEGMENT_MB = int(os.getenv("SESSION_LOG_SEGMENT_MB", "64"))
+
+MAGIC = b"TNLYLOG1"
+# Payload length, record kind, session number (per writer), timestamp
+_HEADER = struct.Struct("<IBId")
+
+# Record kinds
+START = 1           # payload: client id (UTF-8)
+TRANSCRIPT = 2      # payload: final transcript text as the browser sent it (UTF-8)
+BODY_FRAME = 3      # payload: emotion, posture, fatigue codes (one byte each)
+WINDOW = 4          # payload: index into WINDOW_STREAMS - an analysis window closed
+END = 5             # no payload
+
+WINDOW_STREAMS = ("speech", "body_language")
+
+# Segments are renamed from .part to .tlog once closed
+SEGMENT_SUFFIX = ".tlog"
+OPEN_SUFFIX = ".tlog.part"
+
+Record = Tuple[int, float, bytes]
+
+
+class SessionLog:
+    """Append-only binary log of what each WebSocket session sent.
+
+    Every record is a 17-byte header (payload length, kind, session number,
+    timestamp) followed by its payload, so a body language frame takes 20
+    bytes. Records go through a buffered file and never wait on a flush.
+    Segments rotate at max_bytes; sessions still open are re-announced at
+    the top of the new segment so every segment can be read on its own.
+    A crash leaves a .part segment whose torn last record is ignored.
+    """
+
+    def __init__(self, directory: str = SESSION_LOG_DIR, max_bytes: int = SESSION_LOG_SEGMENT_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._file = None
+        self._path: Optional[str] = None
+        self._size = 0
+        self._next_number = 1
+        self._segments = 0
+        self._open: Dict[int, str] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self, client_id: str, timestamp: Optional[float] = None) -> "SessionRecorder":
+        """Begin recording one connection of client_id"""
+        number = self._next_number
+        self._next_number += 1
+        self._open[number] = client_id
+        self.append(START, number, timestamp, client_id.encode("utf-8"))
+        return SessionRecorder(self, number)
+
+    def append(self, kind: int, number: int, timestamp: Optional[float], payload: bytes = b""):
+        if self._file is None or self._size >= self.max_bytes:
+            self._rotate()
+        timestamp = timestamp if timestamp is not None else time.time()
+        self._file.write(_HEADER.pack(len(payload), kind, number, timestamp))
+        self._file.write(payload)
+        self._size += _HEADER.size + len(payload)
+        if kind == END:
+            self._open.pop(number, None)
+
+    def _rotate(self):
+        self._close_segment()
+        # Millisecond timestamp first, so sorting names orders segments in time
+        self._segments += 1
+        name = f"sessions-{int(time.time() * 1000):013d}-{os.getpid()}-{self._segments:04d}"
+        self._path = os.path.join(self.directory, name + OPEN_SUFFIX)
+        self._file = open(self._path, "wb", buffering=256 * 1024)
+        self._file.write(MAGIC)
+        self._size = len(MAGIC)
+        for number, client_id in self._open.items():
+            self.append(START, number, None, client_id.encode("utf-8"))
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        self._file.close()
+        path = self._path[:-len(OPEN_SUFFIX)] + SEGMENT_SUFFIX
+        os.replace(self._path, path)
+        logger.info("Session log segment closed: %s (%d bytes)", path, self._size)
+        self._file = None
+
+    def close(self):
+        self._close_segment()
+
+
+class SessionRecorder:
+    """Records one session's messages into a SessionLog"""
+
+    __slots__ = ("log", "number")
+
+    def __init__(self, log: SessionLog, number: int):
+        self.log = log
+        self.number = number
+
+    def transcript(self, text: str, timestamp: Optional[float] = None):
+        self.log.append(TRANSCRIPT, self.number, timestamp, text.encode("utf-8"))
+
+    def body_frame(self, timestamp: float, emotion: int, posture: int, fatigue: int):
+        self.log.append(BODY_FRAME, self.number, timestamp, bytes((emotion, posture, fatigue)))
+
+    def window(self, stream: str, timestamp: Optional[float] = None):
+        self.log.append(WINDOW, self.number, timestamp, bytes((WINDOW_STREAMS.index(stream),)))
+
+    def close(self, timestamp: Optional[float] = None):
+        self.log.append(END, self.number, timestamp)
+
+
+def segment_paths(directory: str, include_open: bool = False) -> List[str]:
+    """Segments in a directory, oldest first; .part segments only if include_open"""
+    paths = glob.glob(os.path.join(directory, "*" + SEGMENT_SUFFIX))
+    if include_open:
+        paths += glob.glob(os.path.join(directory, "*" + OPEN_SUFFIX))
+    return sorted(paths, key=os.path.basename)
+
+
+def _record_at(buffer, offset: int) -> Optional[Tuple[int, int, float, bytes, int]]:
+    """(kind, number, timestamp, payload, next offset), or None past the last whole record"""
+    if offset + _HEADER.size > len(buffer):
+        return None
+    length, kind, number, timestamp = _HEADER.unpack_from(buffer, offset)
+    end = offset + _HEADER.size + length
+    if end > len(buffer):
+        return None  # Torn record at the end of a crashed segment
+    return kind, number, timestamp, buffer[offset + _HEADER.size:end], end
+
+
+def read_segment(path: str, offsets: Optional[List[int]] = None) -> Iterator[Tuple[int, int, int, float, bytes]]:
+    """(offset, kind, session number, timestamp, payload) for each record, memory-mapped.
+
+    With offsets, only the records starting at those positions are read.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < len(MAGIC):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if buffer[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a session log")
+            if offsets is not None:
+                for offset in offsets:
+                    record = _record_at(buffer, offset)
+                    if record is None:
+                        return
+                    yield (offset, *record[:4])
+                return
+            offset = len(MAGIC)
+            while True:
+                record = _record_at(buffer, offset)
+                if record is None:
+                    return
+                yield (offset, *record[:4])
+                offset = record[4]
+
+
+def index_sessions(paths: List[str]) -> Dict[str, List[Tuple[str, List[int]]]]:
+    """client id -> [(segment path, record offsets)], in log order.
+
+    Reconnects of the same client id resume one session on the server, so
+    they are grouped into one session here too.
+    """
+    sessions: Dict[str, List[Tuple[str, List[int]]]] = {}
+    for path in paths:
+        owners: Dict[int, str] = {}
+        offsets: Dict[str, List[int]] = {}
+        for offset, kind, number, _, payload in read_segment(path):
+            if kind == START:
+                owners[number] = payload.decode("utf-8")
+            client_id = owners.get(number)
+            if client_id is not None:
+                offsets.setdefault(client_id, []).append(offset)
+        for client_id, positions in offsets.items():
+            sessions.setdefault(client_id, []).append((path, positions))
+    return sessions
+
+
+def read_session(parts: List[Tuple[str, List[int]]]) -> Iterator[Record]:
+    """(kind, timestamp, payload) records of one session from index_sessions()"""
+    for path, offsets in parts:
+        for _, kind, _, timestamp, payload in read_segment(path, offsets):
+            yield kind, timestamp, payload
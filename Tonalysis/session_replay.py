@@ -0,0 +1,237 @@
+"""Re-score recorded sessions offline from SESSION_LOG_DIR segments.
+
+Each session's transcripts and body language frames are replayed through
+SpeechMetrics and BodyLanguageAggregator, closing windows where the live
+server closed them, and every window goes through the same analysis gates
+and prompts. Sessions are spread over a process pool. Run from the
+Tonalysis directory:
+
+    python session_replay.py /var/log/tonalysis/sessions --llm stub --out rescored.jsonl
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from analysis_gate import (
+    AnalysisGate, MIN_BODY_SAMPLES, MIN_SPEECH_WORDS, body_fingerprint, speech_fingerprint
+)
+from body_aggregates import TREND_WINDOW
+from prompts import SPEECH_TEMPLATE, body_language_prompt, speech_prompt
+from session_log import (
+    BODY_FRAME, START, TRANSCRIPT, WINDOW, WINDOW_STREAMS, index_sessions, read_session, segment_paths
+)
+from session_store import SessionState
+
+# none: metrics only; stub: gates and prompts with canned feedback; gemini: real calls
+LLM_MODES = ("none", "stub", "gemini")
+
+SessionParts = List[Tuple[str, List[int]]]
+Generate = Callable[[str], Awaitable[str]]
+
+
+async def stub_generate(prompt: str) -> str:
+    """Stands in for Gemini; the same prompt gets the same text, like a cache hit would"""
+    return f"[replay] feedback for a {len(prompt)}-character prompt"
+
+
+class Replayer:
+    """Replays sessions through one worker's gates and (optional) Gemini dispatcher"""
+
+    def __init__(self, llm: str = "stub", max_concurrency: int = 8):
+        self.llm = llm
+        self.generate: Optional[Generate] = None
+        if llm == "stub":
+            self.generate = stub_generate
+        elif llm == "gemini":
+            # Imported here so metrics-only and stubbed replays never load the Gemini SDK
+            from clients import get_gemini_client
+            from llm_dispatch import GeminiDispatcher
+            dispatcher = GeminiDispatcher(get_gemini_client, max_concurrency=max_concurrency, max_queue=1 << 20,
+                                          deadline=120.0)
+            self.generate = dispatcher.generate
+        self.speech_gate = AnalysisGate("speech", min_samples=MIN_SPEECH_WORDS, template=SPEECH_TEMPLATE)
+        self.body_language_gate = AnalysisGate("body_language", min_samples=MIN_BODY_SAMPLES)
+
+    async def replay(self, client_id: str, parts: SessionParts) -> Dict:
+        session = SessionState(client_id)
+        windows = []
+        records = 0
+        first = last = None
+
+        for kind, timestamp, payload in read_session(parts):
+            if kind == START:
+                continue  # Also repeated at the top of each segment a session spans
+            records += 1
+            first = timestamp if first is None else first
+            last = timestamp
+            if kind == TRANSCRIPT:
+                new_text = session.speech_metrics.add_final(payload.decode("utf-8"), timestamp)
+                if new_text:
+                    session.transcript_buffer.append(new_text)
+            elif kind == BODY_FRAME:
+                session.body_aggregates.add(timestamp, *payload)
+            elif kind == WINDOW and WINDOW_STREAMS[payload[0]] == "speech":
+                transcript = session.transcript_buffer.text()
+                window = session.speech_metrics.take_window()
+                session.transcript_buffer.clear()
+                if transcript.strip():
+                    windows.append(await self._speech_window(session, transcript, window, timestamp))
+            elif kind == WINDOW:
+                body_data = session.body_aggregates.take_current()
+                if body_data.total:
+                    windows.append(await self._body_language_window(session, body_data, timestamp))
+
+        metrics = session.speech_metrics
+        return {
+            "client_id": client_id,
+            "records": records,
+            "duration_seconds": last - first if records else 0.0,
+            "speech": {
+                "total_words": metrics.total_words,
+                "total_fillers": metrics.total_fillers,
+                "total_repetitions": metrics.total_repetitions,
+                "filler_counts": dict(metrics.filler_counts),
+                "words_per_minute": metrics.words_per_minute,
+                "lexical_diversity": metrics.lexical_diversity,
+                "analyses": metrics.analyses_count,
+            },
+            "body_language_analyses": session.body_analyses_count,
+            "windows": windows,
+        }
+
+    async def _speech_window(self, session: SessionState, transcript: str, window, closed_at: float) -> Dict:
+        metrics = session.speech_metrics
+        result = {
+            "stream": "speech",
+            "closed_at": closed_at,
+            "words": window.words,
+            "unique_words": window.unique_words,
+            "fillers": window.fillers,
+            "repetitions": window.repetitions,
+            "words_per_minute": metrics.words_per_minute,
+        }
+        if self.generate is None:
+            return result
+
+        prompt = speech_prompt(transcript, window, metrics, session.analysis_history)
+        fingerprint = speech_fingerprint(transcript, window, metrics.words_per_minute)
+        feedback = await self._run_gate(self.speech_gate, session, fingerprint, window.words, prompt,
+                                        metrics.analyses_count)
+        if feedback is not None:
+            session.analysis_history.append(feedback)
+            metrics.analyses_count += 1
+        result["feedback"] = feedback
+        return result
+
+    async def _body_language_window(self, session: SessionState, body_data, closed_at: float) -> Dict:
+        summary = body_data.summary()
+        result = {"stream": "body_language", "closed_at": closed_at, **summary}
+        if self.generate is None:
+            return result
+
+        trend = session.body_aggregates.window(TREND_WINDOW, closed_at).summary()
+        prompt = body_language_prompt(summary, trend, session.body_language_history)
+        fingerprint = body_fingerprint(body_data)
+        feedback = await self._run_gate(self.body_language_gate, session, fingerprint, summary["samples"], prompt,
+                                        session.body_analyses_count)
+        if feedback is not None:
+            session.body_language_history.append(feedback)
+            session.body_analyses_count += 1
+        result["feedback"] = feedback
+        return result
+
+    async def _run_gate(self, gate: AnalysisGate, session: SessionState, fingerprint: str, samples: int,
+                        prompt: str, analysis_number: int) -> Optional[str]:
+        try:
+            return await gate.run(session.last_fingerprints, fingerprint, samples, lambda: self.generate(prompt),
+                                  analysis_number)
+        except Exception as e:
+            return f"Analysis temporarily unavailable: {e}"
+
+    def stats(self) -> Dict:
+        return {"speech": self.speech_gate.stats(), "body_language": self.body_language_gate.stats()}
+
+
+def replay_batch(sessions: List[Tuple[str, SessionParts]], llm: str, max_concurrency: int) -> Dict:
+    """Process pool entry point: replay a batch of sessions, concurrently so Gemini calls overlap"""
+    replayer = Replayer(llm, max_concurrency)
+
+    async def run():
+        return await asyncio.gather(*(replayer.replay(client_id, parts) for client_id, parts in sessions))
+
+    return {"sessions": asyncio.run(run()), "gates": replayer.stats()}
+
+
+def replay(directory: str, llm: str = "stub", workers: Optional[int] = None, batch_size: int = 64,
+           max_concurrency: int = 8, include_open: bool = False, out=None) -> Dict:
+    """Replay every session in directory and return throughput and gate totals"""
+    started = time.perf_counter()
+    sessions = list(index_sessions(segment_paths(directory, include_open)).items())
+    indexed = time.perf_counter() - started
+
+    batches = [sessions[i:i + batch_size] for i in range(0, len(sessions), batch_size)]
+    totals = {"sessions": 0, "records": 0, "windows": 0, "gemini_calls": 0, "cache_hits": 0, "skipped": 0}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(replay_batch, batch, llm, max_concurrency) for batch in batches]
+        for future in futures:
+            result = future.result()
+            for session in result["sessions"]:
+                totals["sessions"] += 1
+                totals["records"] += session["records"]
+                totals["windows"] += len(session["windows"])
+                if out is not None:
+                    out.write(json.dumps(session) + "\n")
+            for gate in result["gates"].values():
+                totals["gemini_calls"] += gate["gemini_calls"]
+                totals["cache_hits"] += gate["cache_hits"]
+                totals["skipped"] += gate["skipped"] + gate["templated"]
+
+    elapsed = time.perf_counter() - started
+    return {
+        **totals,
+        "llm": llm,
+        "workers": workers or os.cpu_count(),
+        "index_seconds": indexed,
+        "seconds": elapsed,
+        "sessions_per_second": totals["sessions"] / elapsed if elapsed else 0.0,
+        "records_per_second": totals["records"] / elapsed if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", help="SESSION_LOG_DIR to read segments from")
+    parser.add_argument("--llm", choices=LLM_MODES, default="stub", help="how windows are scored")
+    parser.add_argument("--workers", type=int, default=None, help="replay processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=64, help="sessions handed to a process at a time")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent Gemini calls per process")
+    parser.add_argument("--include-open", action="store_true", help="also read segments still being written")
+    parser.add_argument("--out", help="write one JSON line of re-scored windows per session here")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    out = open(args.out, "w") if args.out else None
+    try:
+        result = replay(args.directory, args.llm, args.workers, args.batch_size, args.concurrency,
+                        args.include_open, out)
+    finally:
+        if out is not None:
+            out.close()
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print(f"{result['sessions']:,} sessions, {result['records']:,} records, {result['windows']:,} windows "
+          f"in {result['seconds']:.2f}s ({result['workers']} workers, llm={result['llm']})")
+    print(f"{result['sessions_per_second']:,.1f} sessions/s, {result['records_per_second']:,.0f} records/s")
+    print(f"gemini calls: {result['gemini_calls']:,}, cache hits: {result['cache_hits']:,}, "
+          f"skipped/templated: {result['skipped']:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from body_aggregates import BodyLanguageAggregator
+from session_buffers import TranscriptBuffer, bounded_history
+from speech_metrics import SpeechMetrics
+
+# Sessions survive a disconnect for this long so a reconnect (to any worker) resumes them
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "1800"))
+
+
+class SessionState:
+    """Everything the server tracks for one client session.
+
+    Buffers and histories are fixed-size (see session_buffers), so a session
+    uses the same memory after an hour as after a minute. Each connection
+    that opens the session bumps its generation, and stores refuse saves
+    from an older generation, so a connection that is still draining after
+    the client reconnected elsewhere cannot overwrite the newer state.
+    """
+
+    __slots__ = ("client_id", "generation", "transcript_buffer", "analysis_history", "speech_metrics",
+                 "body_aggregates", "body_language_history", "body_analyses_count", "last_fingerprints")
+
+    def __init__(self, client_id: str):
+        self.client_id = client_id
+        self.generation = 0
+
+        # Speech analysis
+        self.transcript_buffer = TranscriptBuffer()
+        self.analysis_history = bounded_history()
+        self.speech_metrics = SpeechMetrics()
+
+        # Body language analysis
+        self.body_aggregates = BodyLanguageAggregator()
+        self.body_language_history = bounded_history()
+        self.body_analyses_count = 0
+
+        # Fingerprint of the last window each analysis gate saw
+        self.last_fingerprints: Dict[str, str] = {}
+
+    def to_dict(self) -> Dict:
+        return {
+            "client_id": self.client_id,
+            "generation": self.generation,
+            "transcript_buffer": self.transcript_buffer.to_list(),
+            "analysis_history": list(self.analysis_history),
+            "speech_metrics": self.speech_metrics.to_dict(),
+            "body_aggregates": self.body_aggregates.to_dict(),
+            "body_language_history": list(self.body_language_history),
+            "body_analyses_count": self.body_analyses_count,
+            "last_fingerprints": self.last_fingerprints,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "SessionState":
+        state = cls(data["client_id"])
+        state.generation = data.get("generation", 0)
+        state.transcript_buffer = TranscriptBuffer.from_list(data.get("transcript_buffer", []))
+        state.analysis_history = bounded_history(data.get("analysis_history", []))
+        state.speech_metrics = SpeechMetrics.from_dict(data.get("speech_metrics", {}))
+        state.body_aggregates = BodyLanguageAggregator.from_dict(data.get("body_aggregates", {}))
+        state.body_language_history = bounded_history(data.get("body_language_history", []))
+        state.body_analyses_count = data.get("body_analyses_count", 0)
+        state.last_fingerprints = dict(data.get("last_fingerprints", {}))
+        return state
+
+
+class SessionStore:
+    """Storage interface for SessionState, keyed by client id"""
+
+    def __init__(self, ttl: int = SESSION_TTL_SECONDS):
+        self.ttl = ttl
+
+    async def load(self, client_id: str) -> Optional[SessionState]:
+        raise NotImplementedError
+
+    async def save(self, state: SessionState) -> bool:
+        """Store state unless a newer generation of the session was saved; False if refused"""
+        raise NotImplementedError
+
+    async def delete(self, client_id: str):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local store; sessions only survive reconnects to the same worker"""
+
+    def __init__(self, ttl: int = SESSION_TTL_SECONDS):
+        super().__init__(ttl)
+        self._sessions: Dict[str, tuple] = {}
+        self._last_eviction = time.time()
+
+    async def load(self, client_id: str) -> Optional[SessionState]:
+        self._evict_expired()
+        entry = self._sessions.get(client_id)
+        if entry is None or entry[1] < time.time():
+            return None
+        return entry[0]
+
+    async def save(self, state: SessionState) -> bool:
+        entry = self._sessions.get(state.client_id)
+        if entry is not None and entry[0].generation > state.generation:
+            return False
+        self._sessions[state.client_id] = (state, time.time() + self.ttl)
+        self._evict_expired()
+        return True
+
+    async def delete(self, client_id: str):
+        self._sessions.pop(client_id, None)
+
+    def _evict_expired(self):
+        now = time.time()
+        if now - self._last_eviction < 60:
+            return
+        self._last_eviction = now
+        for client_id in [cid for cid, (_, expires) in self._sessions.items() if expires < now]:
+            del self._sessions[client_id]
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a SQLite file shared by every worker on the host"""
+
+    def __init__(self, path: str, ttl: int = SESSION_TTL_SECONDS):
+        super().__init__(ttl)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "client_id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires_at)")
+        self._lock = asyncio.Lock()
+
+    async def _run(self, sql: str, params: tuple = ()):
+        async with self._lock:
+            return await asyncio.to_thread(lambda: self._conn.execute(sql, params).fetchone())
+
+    async def load(self, client_id: str) -> Optional[SessionState]:
+        row = await self._run(
+            "SELECT data FROM sessions WHERE client_id = ? AND expires_at >= ?", (client_id, time.time())
+        )
+        return SessionState.from_dict(json.loads(row[0])) if row else None
+
+    async def save(self, state: SessionState) -> bool:
+        now = time.time()
+        # The upsert leaves a live row from a newer generation alone
+        row = await self._run(
+            "INSERT INTO sessions (client_id, data, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (client_id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at "
+            "WHERE sessions.expires_at < ? "
+            "OR coalesce(json_extract(sessions.data, '$.generation'), 0) <= ? "
+            "RETURNING 1",
+            (state.client_id, json.dumps(state.to_dict()), now + self.ttl, now, state.generation)
+        )
+        await self._run("DELETE FROM sessions WHERE expires_at < ?", (now,))
+        return row is not None
+
+    async def delete(self, client_id: str):
+        await self._run("DELETE FROM sessions WHERE client_id = ?", (client_id,))
+
+    async def close(self):
+        self._conn.close()
+
+
+# SET EX, unless the stored session has a newer generation - checked and written atomically
+_SAVE_UNLESS_NEWER = """
+local current = redis.call('GET', KEYS[1])
+if current and (cjson.decode(current).generation or 0) > tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+
+class RedisSessionStore(SessionStore):
+    """Sessions in Redis (or anything speaking RESP), shared across hosts.
+
+    Speaks just enough of the protocol (GET / EVAL / DEL) to avoid a client
+    dependency; expiry is left to Redis itself.
+    """
+
+    def __init__(self, url: str, ttl: int = SESSION_TTL_SECONDS):
+        super().__init__(ttl)
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _key(client_id: str) -> str:
+        return f"tonalysis:session:{client_id}"
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            await self._send("AUTH", self.password)
+        if self.db:
+            await self._send("SELECT", str(self.db))
+
+    async def _command(self, *args: str):
+        async with self._lock:
+            if self._writer is None or self._writer.is_closing():
+                await self._connect()
+            try:
+                return await self._send(*args)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # One reconnect attempt, e.g. after the server closed an idle connection
+                await self._connect()
+                return await self._send(*args)
+
+    async def _send(self, *args: str):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg.encode()
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        self._writer.write(b"".join(parts))
+        await self._writer.drain()
+        return await self._read_reply()
+
+    async def _read_reply(self):
+        line = (await self._reader.readuntil(b"\r\n"))[:-2]
+        kind, rest = line[:1], line[1:]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RuntimeError(f"Redis error: {rest.decode()}")
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            return (await self._reader.readexactly(length + 2))[:-2].decode()
+        raise RuntimeError(f"Unexpected Redis reply: {line!r}")
+
+    async def load(self, client_id: str) -> Optional[SessionState]:
+        data = await self._command("GET", self._key(client_id))
+        return SessionState.from_dict(json.loads(data)) if data else None
+
+    async def save(self, state: SessionState) -> bool:
+        written = await self._command(
+            "EVAL", _SAVE_UNLESS_NEWER, "1", self._key(state.client_id),
+            json.dumps(state.to_dict()), str(self.ttl), str(state.generation)
+        )
+        return written == 1
+
+    async def delete(self, client_id: str):
+        await self._command("DEL", self._key(client_id))
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def create_session_store(url: Optional[str] = None) -> SessionStore:
+    """Build the store named by SESSION_STORE (memory, sqlite:///path or redis://host:port/db)"""
+    url = url or os.getenv("SESSION_STORE", "memory")
+    if url == "memory":
+        return InMemorySessionStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteSessionStore(url[len("sqlite:///"):])
+    if url.startswith("redis://"):
+        return RedisSessionStore(url)
+    raise ValueError(f"Unsupported SESSION_STORE: {url}")
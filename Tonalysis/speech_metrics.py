@@ -0,0 +1,224 @@
+import base64
+import math
+import re
+import time
+import zlib
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Optional
+
+FILLER_PHRASES = ("um", "uh", "like", "you know", "basically", "actually", "literally")
+
+# Bits in each session's vocabulary sketch (8 KB); counts stay within ~1% up to ~30k distinct words
+_SKETCH_SHIFT = 16
+VOCABULARY_SKETCH_BITS = 1 << _SKETCH_SHIFT
+
+
+def _compile_matcher(phrases) -> "re.Pattern":
+    # Longest phrases first so "you know" wins over a plain "you" word token;
+    # \s+ between words tolerates any spacing, \b keeps "like" out of "likely"
+    fillers = sorted(phrases, key=len, reverse=True)
+    filler_pattern = "|".join(r"\s+".join(map(re.escape, p.split())) for p in fillers)
+    return re.compile(rf"\b(?P<filler>{filler_pattern})\b|(?P<word>[\w']+)", re.IGNORECASE)
+
+
+_MATCHER = _compile_matcher(FILLER_PHRASES)
+_SPACE_RE = re.compile(r"\s+")
+
+
+class VocabularySketch:
+    """Distinct words of a whole session in a fixed-size bitmap (linear counting).
+
+    Each word sets the bit its CRC-32 picks, and the distinct count is
+    estimated from the share of bits still clear, so memory and the saved
+    size stay the same however long the session runs.
+    """
+
+    __slots__ = ("bits", "set_bits")
+
+    def __init__(self, bits: bytes = b""):
+        size = VOCABULARY_SKETCH_BITS // 8
+        self.bits = bytearray(bits) if len(bits) == size else bytearray(size)
+        self.set_bits = sum(bin(byte).count("1") for byte in self.bits)
+
+    def add(self, word: str):
+        # CRC-32 alone is linear, so similar words cluster; a multiplicative mix spreads them
+        bit = ((zlib.crc32(word.encode("utf-8")) * 0x9E3779B1) & 0xFFFFFFFF) >> (32 - _SKETCH_SHIFT)
+        mask = 1 << (bit & 7)
+        if not self.bits[bit >> 3] & mask:
+            self.bits[bit >> 3] |= mask
+            self.set_bits += 1
+
+    def __len__(self) -> int:
+        clear = VOCABULARY_SKETCH_BITS - self.set_bits
+        if not clear:
+            return VOCABULARY_SKETCH_BITS
+        return round(-VOCABULARY_SKETCH_BITS * math.log(clear / VOCABULARY_SKETCH_BITS))
+
+    def to_str(self) -> str:
+        # Mostly clear bits, so a session's vocabulary saves in a few KB at most
+        return base64.b64encode(zlib.compress(bytes(self.bits))).decode("ascii")
+
+    @classmethod
+    def from_str(cls, data: str) -> "VocabularySketch":
+        return cls(zlib.decompress(base64.b64decode(data)))
+
+
+class WindowMetrics:
+    """Counts for the text received since the last analysis"""
+
+    __slots__ = ("words", "fillers", "repetitions", "vocabulary", "filler_counts")
+
+    def __init__(self):
+        self.words = 0
+        self.fillers = 0
+        self.repetitions = 0
+        self.vocabulary = set()
+        self.filler_counts: Counter = Counter()
+
+    @property
+    def unique_words(self) -> int:
+        return len(self.vocabulary)
+
+    def merge(self, other: "WindowMetrics") -> "WindowMetrics":
+        self.words += other.words
+        self.fillers += other.fillers
+        self.repetitions += other.repetitions
+        self.vocabulary |= other.vocabulary
+        self.filler_counts.update(other.filler_counts)
+        return self
+
+    def filler_breakdown(self) -> str:
+        """e.g. 'um x3, you know x1'"""
+        return ", ".join(f"{phrase} x{count}" for phrase, count in self.filler_counts.most_common())
+
+
+class SpeechMetrics:
+    """Single-pass speech metrics, updated as each final transcript arrives.
+
+    One precompiled regex walks the text once, yielding both word tokens and
+    filler phrases (including multi-word ones and ones with punctuation
+    attached, e.g. "um,"). Session totals and the current analysis window are
+    updated together. The browser resends the whole utterance with every
+    final result, so only the part not seen before is counted.
+    """
+
+    __slots__ = ("total_words", "total_fillers", "total_repetitions", "analyses_count",
+                 "filler_counts", "vocabulary", "first_timestamp", "last_timestamp",
+                 "window", "_last_final", "_last_word")
+
+    def __init__(self):
+        self.total_words = 0
+        self.total_fillers = 0
+        self.total_repetitions = 0
+        self.analyses_count = 0
+        self.filler_counts: Counter = Counter()
+        self.vocabulary = VocabularySketch()
+        self.first_timestamp: Optional[float] = None
+        self.last_timestamp: Optional[float] = None
+        self.window = WindowMetrics()
+        self._last_final = ""
+        self._last_word = ""
+
+    def new_text(self, text: str) -> str:
+        """Part of a final transcript that has not been counted yet"""
+        if self._last_final and text.startswith(self._last_final):
+            return text[len(self._last_final):].strip()
+        # Recognition restarted - the whole text is new
+        self._last_word = ""
+        return text.strip()
+
+    def add_final(self, text: str, timestamp: Optional[float] = None) -> str:
+        """Count a final transcript and return the newly spoken part of it"""
+        new_text = self.new_text(text)
+        self._last_final = text
+
+        timestamp = timestamp if timestamp is not None else time.time()
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+        self.last_timestamp = timestamp
+
+        window = self.window
+        last_word = self._last_word
+        for match in _MATCHER.finditer(new_text):
+            filler = match.group("filler")
+            if filler is not None:
+                phrase = _SPACE_RE.sub(" ", filler.lower())
+                n_words = phrase.count(" ") + 1
+                self.total_fillers += 1
+                self.filler_counts[phrase] += 1
+                window.fillers += 1
+                window.filler_counts[phrase] += 1
+                word = phrase
+            else:
+                n_words = 1
+                word = match.group("word").lower()
+                self.vocabulary.add(word)
+                window.vocabulary.add(word)
+
+            # Immediate repeats ("I I think", "the the") are a common disfluency
+            if word == last_word:
+                self.total_repetitions += 1
+                window.repetitions += 1
+            last_word = word
+
+            self.total_words += n_words
+            window.words += n_words
+        self._last_word = last_word
+        return new_text
+
+    def take_window(self) -> WindowMetrics:
+        """Hand over the current window's counts and start a new one"""
+        window, self.window = self.window, WindowMetrics()
+        return window
+
+    @property
+    def words_per_minute(self) -> float:
+        if self.first_timestamp is None or self.last_timestamp - self.first_timestamp < 5:
+            return 0.0
+        return self.total_words / ((self.last_timestamp - self.first_timestamp) / 60)
+
+    @property
+    def lexical_diversity(self) -> float:
+        """Distinct words over total words for the session so far"""
+        return len(self.vocabulary) / self.total_words if self.total_words else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "total_words": self.total_words,
+            "total_fillers": self.total_fillers,
+            "total_repetitions": self.total_repetitions,
+            "analyses_count": self.analyses_count,
+            "filler_counts": dict(self.filler_counts),
+            "vocabulary_sketch": self.vocabulary.to_str(),
+            "first_timestamp": self.first_timestamp,
+            "last_timestamp": self.last_timestamp,
+            "last_final": self._last_final,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "SpeechMetrics":
+        metrics = cls()
+        metrics.total_words = data.get("total_words", 0)
+        metrics.total_fillers = data.get("total_fillers", 0)
+        metrics.total_repetitions = data.get("total_repetitions", 0)
+        metrics.analyses_count = data.get("analyses_count", 0)
+        metrics.filler_counts = Counter(data.get("filler_counts", {}))
+        if "vocabulary_sketch" in data:
+            metrics.vocabulary = VocabularySketch.from_str(data["vocabulary_sketch"])
+        for word in data.get("vocabulary", ()):  # Sessions saved with the full word list
+            metrics.vocabulary.add(word)
+        metrics.first_timestamp = data.get("first_timestamp")
+        metrics.last_timestamp = data.get("last_timestamp")
+        metrics._last_final = data.get("last_final", "")
+        return metrics
+
+
+def parse_timestamp(value) -> Optional[float]:
+    """Epoch seconds from a client ISO timestamp, or None if it can't be read"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
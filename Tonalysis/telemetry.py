@@ -0,0 +1,330 @@
+import asyncio
+import contextlib
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import Executor, Future
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Bucket upper bounds (seconds) sized to each stage's latency range
+FAST_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+JOB_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1200, 1800)
+LAG_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+# How often the event loop probe wakes up (seconds)
+EVENT_LOOP_PROBE_INTERVAL = 0.25
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A named metric, optionally split into children by label values"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional["Registry"] = None, _child: bool = False, **options):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._options = options
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], "Metric"] = {}
+        self._init_value()
+        if not _child:
+            (registry if registry is not None else REGISTRY).register(self)
+
+    def _init_value(self):
+        pass
+
+    def labels(self, **labels) -> "Metric":
+        """Child for one combination of label values, created on first use"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self.__class__(self.name, self.documentation, _child=True, **self._options)
+                    self._children[key] = child
+        return child
+
+    def _series(self) -> List[Tuple[Dict[str, str], "Metric"]]:
+        if not self.labelnames:
+            return [({}, self)]
+        return [(dict(zip(self.labelnames, key)), child) for key, child in list(self._children.items())]
+
+    def _samples(self, labels: Dict[str, str]) -> List[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, series in self._series():
+            for suffix, sample_labels, value in series._samples(labels):
+                lines.append(f"{self.name}{suffix}{_format_labels(sample_labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def _init_value(self):
+        self._value = 0
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    def _samples(self, labels):
+        return [("", labels, self._value)]
+
+
+class Gauge(Metric):
+    """Value that goes up and down, or is read from a callback at scrape time"""
+
+    kind = "gauge"
+
+    def _init_value(self):
+        self._value = 0
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self._value = value
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+
+    def value(self) -> float:
+        return self._function() if self._function is not None else self._value
+
+    def _samples(self, labels):
+        return [("", labels, self.value())]
+
+
+class _Timer:
+    __slots__ = ("histogram", "started_at")
+
+    def __init__(self, histogram: "Histogram"):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started_at)
+        return False
+
+
+class Histogram(Metric):
+    """Observations counted into fixed buckets; quantiles are estimated from the buckets.
+
+    Bucket bounds never change, so an observation is a bisect and two additions
+    under a lock - cheap enough to leave on for every message.
+    """
+
+    kind = "histogram"
+
+    def _init_value(self):
+        self.buckets = tuple(sorted(self._options.get("buckets", REQUEST_BUCKETS)))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def time(self) -> _Timer:
+        """Context manager that observes the time spent inside it"""
+        return _Timer(self)
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def quantile(self, q: float) -> Optional[float]:
+        return bucket_quantile(self.buckets, list(self._counts), q)
+
+    def _samples(self, labels):
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self._counts):
+            cumulative += count
+            samples.append(("_bucket", {**labels, "le": _format_value(float(bound))}, cumulative))
+        samples.append(("_sum", labels, self._sum))
+        samples.append(("_count", labels, cumulative))
+        return samples
+
+    def summary(self) -> Dict[str, Dict]:
+        """p50/p99 in milliseconds for every labelled series"""
+        result = {}
+        for labels, series in self._series():
+            key = self.name + _format_labels(labels)
+            p50, p99 = series.quantile(0.5), series.quantile(0.99)
+            result[key] = {
+                "count": series.count,
+                "p50_ms": round(p50 * 1000, 3) if p50 is not None else None,
+                "p99_ms": round(p99 * 1000, 3) if p99 is not None else None,
+            }
+        return result
+
+
+def bucket_quantile(bounds: Sequence[float], counts: Sequence[int], q: float) -> Optional[float]:
+    """Estimate a quantile from per-bucket counts by linear interpolation (like histogram_quantile).
+
+    counts has one more entry than bounds, for observations above the last bound.
+    """
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    for index, count in enumerate(counts):
+        if count and cumulative + count >= rank:
+            if index == len(bounds):
+                return bounds[-1]
+            lower = bounds[index - 1] if index else 0.0
+            return lower + (bounds[index] - lower) * (rank - cumulative) / count
+        cumulative += count
+    return bounds[-1]
+
+
+class Registry:
+    """Every metric the process exposes"""
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def latency_summary(self) -> Dict[str, Dict]:
+        result = {}
+        for metric in self._metrics:
+            if isinstance(metric, Histogram):
+                result.update(metric.summary())
+        return result
+
+
+REGISTRY = Registry()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# WebSocket
+WS_MESSAGES = Counter("tonalysis_ws_messages_total", "WebSocket messages received by type", ["type"])
+WS_PARSE_SECONDS = Histogram(
+    "tonalysis_ws_parse_seconds", "Time to decode a WebSocket message", buckets=FAST_BUCKETS
+)
+ACTIVE_SESSIONS = Gauge("tonalysis_active_sessions", "Open WebSocket sessions")
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "tonalysis_event_loop_lag_seconds", "How late the event loop probe woke up", buckets=LAG_BUCKETS
+)
+
+# Analysis cadence
+FEEDBACK_SECONDS = Histogram(
+    "tonalysis_feedback_seconds", "Time from an analysis window closing to its feedback being sent",
+    ["stream"], buckets=REQUEST_BUCKETS
+)
+ANALYSIS_STRETCH = Gauge("tonalysis_analysis_interval_stretch", "Multiplier applied to analysis intervals under load")
+
+# Gemini
+GEMINI_QUEUE_WAIT_SECONDS = Histogram(
+    "tonalysis_gemini_queue_wait_seconds", "Time a Gemini call waited for a dispatcher slot"
+)
+GEMINI_CALL_SECONDS = Histogram(
+    "tonalysis_gemini_call_seconds", "Latency of a single Gemini request attempt"
+)
+GEMINI_CALLS = Counter("tonalysis_gemini_calls_total", "Gemini calls by outcome", ["outcome"])
+GEMINI_QUEUE_DEPTH = Gauge("tonalysis_gemini_queue_depth", "Gemini calls waiting for a slot")
+
+# Video pipeline
+UPLOAD_BYTES = Counter("tonalysis_upload_bytes_total", "Bytes of video received")
+TRANSCODE_SECONDS = Histogram(
+    "tonalysis_transcode_seconds", "ffmpeg run time by transcode path", ["mode"], buckets=JOB_BUCKETS
+)
+TWELVELABS_PHASE_SECONDS = Histogram(
+    "tonalysis_twelvelabs_phase_seconds", "TwelveLabs time by phase (upload, index, generate, gist)",
+    ["phase"], buckets=JOB_BUCKETS
+)
+VIDEO_CACHE_LOOKUPS = Counter(
+    "tonalysis_video_cache_lookups_total", "Uploads looked up in the video cache by result (analysis, video, miss)",
+    ["result"]
+)
+VIDEO_JOBS_WAITING = Gauge("tonalysis_video_jobs_waiting", "Video jobs waiting for a worker slot")
+EXECUTOR_QUEUE_DEPTH = Gauge(
+    "tonalysis_executor_queue_depth", "Work items queued on a thread pool", ["executor"]
+)
+
+# Client assets
+ASSET_RESPONSES = Counter("tonalysis_asset_responses_total", "Client asset responses by status code", ["status"])
+ASSET_BYTES_SENT = Counter(
+    "tonalysis_asset_bytes_sent_total", "Client asset bytes sent by content encoding", ["encoding"]
+)
+
+
+def submit_counted(executor: Executor, queued: Gauge, fn: Callable, *args) -> Future:
+    """executor.submit(fn, *args), counted in queued until a worker thread picks it up"""
+    def run():
+        queued.dec()
+        return fn(*args)
+
+    queued.inc()
+    future = executor.submit(run)
+    # Cancelled before a thread started it, so run() never counted it out
+    future.add_done_callback(lambda f: queued.dec() if f.cancelled() else None)
+    return future
+
+
+@contextlib.asynccontextmanager
+async def acquire_counted(semaphore: asyncio.Semaphore, waiting: Gauge):
+    """Hold semaphore, counted in waiting while blocked on it"""
+    waiting.inc()
+    try:
+        await semaphore.acquire()
+    finally:
+        waiting.dec()
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+async def monitor_event_loop_lag(interval: float = EVENT_LOOP_PROBE_INTERVAL):
+    """Record how late a periodic sleep wakes up - time the loop spent on something else"""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(0.0, time.perf_counter() - started - interval))
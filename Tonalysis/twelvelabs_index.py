@@ -0,0 +1,133 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows - workers fall back to resolving independently
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "speech-therapy-sessions"
+INDEX_CACHE_PATH = os.getenv(
+    "TWELVELABS_INDEX_CACHE",
+    os.path.join(tempfile.gettempdir(), "tonalysis-twelvelabs-index.json")
+)
+INDEX_CACHE_TTL = int(os.getenv("TWELVELABS_INDEX_CACHE_TTL", str(24 * 3600)))
+
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 300
+
+
+class IndexResolver:
+    """Finds (or creates) the TwelveLabs index on first use.
+
+    The id is cached in memory and in a JSON file shared by every worker on
+    the host, refreshed after INDEX_CACHE_TTL. A file lock makes sure only one
+    worker talks to TwelveLabs when the cache is cold. After a failure the
+    lookup keeps retrying in the background with exponential backoff, so the
+    next video job usually finds the id ready.
+    """
+
+    def __init__(self, get_client: Callable, name: str = INDEX_NAME,
+                 cache_path: str = INDEX_CACHE_PATH, ttl: int = INDEX_CACHE_TTL):
+        self.get_client = get_client
+        self.name = name
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self._index_id: Optional[str] = None
+        self._resolved_at = 0.0
+        self._lock = threading.Lock()
+        self._retry_task: Optional[asyncio.Task] = None
+
+    async def get(self) -> str:
+        """Return the index id, resolving it off the event loop if needed"""
+        if self._fresh():
+            return self._index_id
+        try:
+            return await asyncio.to_thread(self.resolve)
+        except Exception:
+            self._schedule_retry()
+            raise
+
+    def resolve(self) -> str:
+        """Blocking lookup: memory, then the shared cache file, then TwelveLabs"""
+        with self._lock:
+            if self._fresh():
+                return self._index_id
+            if self._load_cache():
+                return self._index_id
+
+            lock_file = open(self.cache_path + ".lock", "a")
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                # Another worker may have filled the cache while we waited
+                if self._load_cache():
+                    return self._index_id
+                index_id = self._lookup()
+                self._store(index_id)
+                return index_id
+            finally:
+                lock_file.close()
+
+    def _fresh(self) -> bool:
+        return self._index_id is not None and time.time() - self._resolved_at < self.ttl
+
+    def _lookup(self) -> str:
+        tl_client = self.get_client()
+
+        # Look for an existing index with our name
+        for index in tl_client.index.list():
+            if index.name == self.name:
+                logger.info("Using existing index: %s", index.id)
+                return index.id
+
+        # If not found, create a new index
+        logger.info("Creating new index for speech therapy sessions...")
+        new_index = tl_client.index.create(
+            name=self.name,
+            models=[{"name": "pegasus1.2", "options": ["visual", "audio"]}]
+        )
+        logger.info("Created new index: %s", new_index.id)
+        return new_index.id
+
+    def _load_cache(self) -> bool:
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("name") != self.name or time.time() - data.get("resolved_at", 0) >= self.ttl:
+            return False
+        self._index_id = data["index_id"]
+        self._resolved_at = data["resolved_at"]
+        return True
+
+    def _store(self, index_id: str):
+        self._index_id = index_id
+        self._resolved_at = time.time()
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"name": self.name, "index_id": index_id, "resolved_at": self._resolved_at}, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _schedule_retry(self):
+        if self._retry_task is None or self._retry_task.done():
+            self._retry_task = asyncio.create_task(self._retry_loop())
+
+    async def _retry_loop(self):
+        delay = RETRY_BASE_SECONDS
+        while not self._fresh():
+            await asyncio.sleep(delay)
+            try:
+                await asyncio.to_thread(self.resolve)
+            except Exception as e:
+                delay = min(delay * 2, RETRY_MAX_SECONDS)
+                logger.warning("Error managing index (retrying in %ss): %s", delay, e)
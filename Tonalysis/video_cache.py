@@ -0,0 +1,119 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, Optional
+
+from telemetry import VIDEO_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Keyed by the SHA-256 of the upload, so a resubmitted recording skips TwelveLabs
+VIDEO_CACHE_DIR = os.getenv("VIDEO_CACHE_DIR", os.path.join(tempfile.gettempdir(), "tonalysis-video-cache"))
+VIDEO_CACHE_MAX_MB = int(os.getenv("VIDEO_CACHE_MAX_MB", "64"))
+VIDEO_CACHE_TTL = int(os.getenv("VIDEO_CACHE_TTL", str(7 * 24 * 3600)))
+
+
+class VideoCache:
+    """Content hash -> TwelveLabs video id and analysis, one JSON file per upload.
+
+    An entry holds the index and video id as soon as TwelveLabs has indexed
+    the upload, and the analysis once it is generated, so a retry after a
+    failed generation still skips the upload and indexing. Files are
+    replaced atomically, which lets several workers share the directory.
+    A read touches the file's mtime; entries unused for ttl seconds are
+    dropped, then the least recently used ones until the directory fits in
+    max_bytes.
+    """
+
+    def __init__(self, directory: str = VIDEO_CACHE_DIR, max_bytes: int = VIDEO_CACHE_MAX_MB * 1024 * 1024,
+                 ttl: int = VIDEO_CACHE_TTL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    async def get(self, digest: str) -> Optional[Dict]:
+        """The cached entry for an upload: index_id, video_id and analysis (None until generated)"""
+        entry = await asyncio.to_thread(self._read, digest)
+        if entry is None:
+            result = "miss"
+        elif entry.get("analysis") is not None:
+            result = "analysis"
+        else:
+            result = "video"
+        VIDEO_CACHE_LOOKUPS.labels(result=result).inc()
+        return entry
+
+    async def put(self, digest: str, index_id: str, video_id: str, analysis: Optional[Dict] = None):
+        """Record an indexed upload and, once generated, its analysis"""
+        entry = {"index_id": index_id, "video_id": video_id, "analysis": analysis, "cached_at": time.time()}
+        await asyncio.to_thread(self._write, digest, entry)
+
+    async def delete(self, digest: str):
+        """Forget an upload, e.g. once its video is gone from TwelveLabs"""
+        if len(digest) == 64 and all(c in "0123456789abcdef" for c in digest):
+            await asyncio.to_thread(self._remove, self._path(digest))
+
+    def _path(self, digest: str) -> str:
+        # Digests are SHA-256 hex; anything else never reaches the filesystem
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _read(self, digest: str) -> Optional[Dict]:
+        if len(digest) != 64 or not all(c in "0123456789abcdef" for c in digest):
+            return None
+        path = self._path(digest)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.unlink(path)
+                return None
+            with open(path) as f:
+                entry = json.load(f)
+            os.utime(path)
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, digest: str, entry: Dict):
+        tmp_path = f"{self._path(digest)}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self._path(digest))
+        self._evict()
+
+    def _evict(self):
+        """Drop expired entries, then the least recently used until under max_bytes"""
+        cutoff = time.time() - self.ttl
+        entries = []
+        with os.scandir(self.directory) as it:
+            for item in it:
+                if not item.name.endswith(".json"):
+                    continue
+                try:
+                    stat = item.stat()
+                except OSError:
+                    continue
+                if stat.st_mtime < cutoff:
+                    self._remove(item.path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, item.path))
+
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+        logger.info("Video cache trimmed to %d bytes", total)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
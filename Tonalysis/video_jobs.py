@@ -0,0 +1,237 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Jobs are written here on every status change so any worker (or a restarted one) can serve them
+RESULTS_DIR = os.getenv("VIDEO_RESULTS_DIR", os.path.join(tempfile.gettempdir(), "tonalysis-results"))
+RESULT_TTL_SECONDS = int(os.getenv("VIDEO_RESULT_TTL_SECONDS", str(24 * 3600)))
+# Streamed analysis text is written for other workers at most this often (seconds)
+PARTIAL_WRITE_INTERVAL = 1.0
+# How often a job running on another worker is re-read for its event stream (seconds)
+FOLLOW_INTERVAL = 1.0
+
+FINAL_STATUSES = {"complete", "failed"}
+
+
+class VideoJob:
+    """State of one /api/analyze-video submission"""
+
+    __slots__ = ("job_id", "client_id", "status", "message", "result", "created_at", "updated_at",
+                 "chunks", "subscribers", "written_at", "write_lock", "deliver_lock")
+
+    def __init__(self, client_id: str, job_id: Optional[str] = None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.client_id = client_id
+        self.status = "queued"
+        self.message = "Waiting for a free video worker"
+        self.result: Optional[Dict] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        # Analysis text streamed so far, joined once instead of concatenated per token
+        self.chunks: List[str] = []
+        self.subscribers: List[asyncio.Queue] = []
+        # Status and text writes run in threads; the lock keeps them in order
+        self.written_at = 0.0
+        self.write_lock = asyncio.Lock()
+        # Updates are scheduled from the analysis thread one coroutine each; the
+        # lock is taken in that order, so listeners get them in that order too
+        self.deliver_lock = asyncio.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINAL_STATUSES
+
+    def to_dict(self) -> Dict:
+        data = {
+            "job_id": self.job_id,
+            "client_id": self.client_id,
+            "status": self.status,
+            "message": self.message,
+            "result": self.result,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+        if not self.done and self.chunks:
+            data["partial_analysis"] = "".join(self.chunks)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "VideoJob":
+        job = cls(data["client_id"], data["job_id"])
+        job.status = data["status"]
+        job.message = data.get("message", "")
+        job.result = data.get("result")
+        job.created_at = data.get("created_at", job.created_at)
+        job.updated_at = data.get("updated_at", job.updated_at)
+        if data.get("partial_analysis"):
+            job.chunks = [data["partial_analysis"]]
+        return job
+
+
+class JobStore:
+    """Tracks this worker's video jobs in memory and persists them to RESULTS_DIR.
+
+    Every status change, and the streamed text once a second, is written to
+    the shared directory, so polls and event streams that reach another
+    worker follow the job from there. Status changes are also passed to the
+    optional notify callback, and streamed analysis chunks to notify_chunk;
+    the server uses them to push progress over the client's WebSocket.
+    Streaming endpoints subscribe to a job to receive the same events as
+    they happen.
+    """
+
+    def __init__(self, results_dir: str = RESULTS_DIR, ttl: int = RESULT_TTL_SECONDS,
+                 notify: Optional[Callable[[VideoJob], Awaitable[None]]] = None,
+                 notify_chunk: Optional[Callable[[VideoJob, str], Awaitable[None]]] = None):
+        self.results_dir = results_dir
+        self.ttl = ttl
+        self.notify = notify
+        self.notify_chunk = notify_chunk
+        self._jobs: Dict[str, VideoJob] = {}
+        os.makedirs(results_dir, exist_ok=True)
+
+    def create(self, client_id: str) -> VideoJob:
+        self._prune()
+        job = VideoJob(client_id)
+        self._jobs[job.job_id] = job
+        return job
+
+    async def update(self, job: VideoJob, status: str, message: str = "", result: Optional[Dict] = None):
+        """Record a status change, persist it for other workers and notify the client"""
+        async with job.deliver_lock:
+            job.status = status
+            job.message = message
+            job.updated_at = time.time()
+            if result is not None:
+                job.result = result
+
+            if job.done:
+                job.chunks = []
+            await self._save(job)
+
+            self._publish(job, ("status", job.to_dict()))
+            if self.notify is not None:
+                try:
+                    await self.notify(job)
+                except Exception as e:
+                    logger.warning("Could not push job %s update: %s", job.job_id, e, extra={"client_id": job.client_id})
+
+    async def append_chunk(self, job: VideoJob, text: str):
+        """Record a piece of streamed analysis text and forward it to listeners"""
+        async with job.deliver_lock:
+            job.chunks.append(text)
+            self._publish(job, ("chunk", text))
+            if self.notify_chunk is not None:
+                try:
+                    await self.notify_chunk(job, text)
+                except Exception as e:
+                    logger.warning("Could not push job %s chunk: %s", job.job_id, e, extra={"client_id": job.client_id})
+        # Written after delivery, so the file write never holds up the next chunk
+        if not job.done and time.time() - job.written_at >= PARTIAL_WRITE_INTERVAL:
+            await self._save(job)
+
+    def subscribe(self, job: VideoJob) -> asyncio.Queue:
+        """Queue of ("chunk", text) and ("status", dict) events, replaying text so far"""
+        queue: asyncio.Queue = asyncio.Queue()
+        for text in job.chunks:
+            queue.put_nowait(("chunk", text))
+        queue.put_nowait(("status", job.to_dict()))
+        if not job.done:
+            job.subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, job: VideoJob, queue: asyncio.Queue):
+        if queue in job.subscribers:
+            job.subscribers.remove(queue)
+
+    @staticmethod
+    def _publish(job: VideoJob, event):
+        for queue in job.subscribers:
+            queue.put_nowait(event)
+        if job.done:
+            job.subscribers = []
+
+    async def events(self, job: VideoJob) -> AsyncIterator[Tuple[str, object]]:
+        """Events of subscribe() until the job finishes, wherever it runs.
+
+        A job running on another worker is followed by re-reading its file,
+        so its text arrives in pieces of up to PARTIAL_WRITE_INTERVAL.
+        """
+        if job.job_id in self._jobs:
+            queue = self.subscribe(job)
+            try:
+                while True:
+                    event = await queue.get()
+                    yield event
+                    if event[0] == "status" and event[1]["status"] in FINAL_STATUSES:
+                        return
+            finally:
+                self.unsubscribe(job, queue)
+
+        sent = 0
+        updated_at = None
+        while True:
+            text = "".join(job.chunks)
+            if len(text) > sent:
+                yield "chunk", text[sent:]
+                sent = len(text)
+            if job.updated_at != updated_at:
+                updated_at = job.updated_at
+                yield "status", job.to_dict()
+            if job.done:
+                return
+            await asyncio.sleep(FOLLOW_INTERVAL)
+            job = await asyncio.to_thread(self._read, job.job_id)
+            if job is None:
+                return
+
+    async def get(self, job_id: str) -> Optional[VideoJob]:
+        """Look a job up in memory, falling back to the persisted results"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        return await asyncio.to_thread(self._read, job_id)
+
+    def for_client(self, client_id: str) -> List[VideoJob]:
+        return [job for job in self._jobs.values() if job.client_id == client_id]
+
+    def _path(self, job_id: str) -> str:
+        # Job ids are uuid4 hex; anything else never reaches the filesystem
+        return os.path.join(self.results_dir, f"{job_id}.json")
+
+    async def _save(self, job: VideoJob):
+        async with job.write_lock:
+            job.written_at = time.time()
+            await asyncio.to_thread(self._write, job.job_id, job.to_dict())
+
+    def _write(self, job_id: str, data: Dict):
+        tmp_path = self._path(job_id) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self._path(job_id))
+
+    def _read(self, job_id: str) -> Optional[VideoJob]:
+        if len(job_id) != 32 or not all(c in "0123456789abcdef" for c in job_id):
+            return None
+        try:
+            with open(self._path(job_id)) as f:
+                return VideoJob.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _prune(self):
+        """Forget finished jobs (and their files) once they pass the TTL"""
+        cutoff = time.time() - self.ttl
+        for job_id in [j.job_id for j in self._jobs.values() if j.done and j.updated_at < cutoff]:
+            del self._jobs[job_id]
+            try:
+                os.unlink(self._path(job_id))
+            except OSError:
+                pass
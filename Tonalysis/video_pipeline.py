@@ -0,0 +1,375 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import Request, UploadFile
+from starlette.datastructures import FormData
+from starlette.formparsers import FormParser, MultiPartParser
+
+from telemetry import TRANSCODE_SECONDS, UPLOAD_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Read uploads in 1 MiB pieces so a long session never sits in memory at once
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_VIDEO_UPLOAD_MB", "500")) * 1024 * 1024
+# Room for the multipart boundaries and the small form fields sent with the video
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+# Each ffmpeg job gets a share of the cores instead of every job grabbing all of them
+CPU_COUNT = os.cpu_count() or 1
+FFMPEG_MAX_JOBS = int(os.getenv("FFMPEG_MAX_JOBS", str(max(1, CPU_COUNT // 2))))
+FFMPEG_THREADS = max(1, CPU_COUNT // FFMPEG_MAX_JOBS)
+
+_ffmpeg_slots = asyncio.Semaphore(FFMPEG_MAX_JOBS)
+
+# ffmpeg processes fed while a session is still recording. They mostly wait on
+# input for the whole session, so they have their own limit instead of holding
+# a batch slot; past it, uploads are converted when they complete.
+LIVE_TRANSCODE_MAX_JOBS = int(os.getenv("LIVE_TRANSCODE_MAX_JOBS", str(CPU_COUNT * 2)))
+_live_slots = asyncio.Semaphore(LIVE_TRANSCODE_MAX_JOBS)
+
+# container:video:audio combinations TwelveLabs indexes as-is ("-" = no audio track)
+PASSTHROUGH_FORMATS = set(
+    os.getenv("TWELVELABS_PASSTHROUGH_FORMATS", "mp4:h264:aac,mp4:h264:-").split(",")
+)
+
+# Codecs that can be copied into an MP4 without re-encoding
+MP4_VIDEO_CODECS = {"h264"}
+MP4_AUDIO_CODECS = {"aac", "mp3"}
+
+# Re-encodes are capped to what the analysis actually needs
+ENCODE_MAX_HEIGHT = int(os.getenv("TRANSCODE_MAX_HEIGHT", "720"))
+ENCODE_MAX_FPS = int(os.getenv("TRANSCODE_MAX_FPS", "30"))
+ENCODE_PRESET = os.getenv("TRANSCODE_PRESET", "veryfast")
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES"""
+
+
+class TranscodeError(Exception):
+    """Raised when ffmpeg exits with a non-zero status"""
+
+
+async def _capped(stream: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in stream:
+        received += len(chunk)
+        if received > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {max_bytes // (1024 * 1024)} MB limit")
+        yield chunk
+
+
+class UploadDestination:
+    """Temporary file an uploaded form file is written to as it is parsed, hashed on the way.
+
+    The file is deleted when the form is closed unless keep() handed it over.
+    """
+
+    def __init__(self, suffix: str, max_bytes: int):
+        self._file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+        self.path = self._file.name
+        self.size = 0
+        self.max_bytes = max_bytes
+        self._digest = hashlib.sha256()
+        self._kept = False
+
+    def write(self, data: bytes):
+        # Called on a worker thread by UploadFile.write, so hashing never blocks the event loop
+        self.size += len(data)
+        UPLOAD_BYTES.inc(len(data))
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {self.max_bytes // (1024 * 1024)} MB limit")
+        self._digest.update(data)
+        self._file.write(data)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return self._file.seek(offset, whence)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def keep(self) -> Tuple[str, int, str]:
+        """Close the file, leave it on disk and return (path, size, sha256 hex digest)"""
+        self._kept = True
+        self._file.close()
+        return self.path, self.size, self._digest.hexdigest()
+
+    def close(self):
+        self._file.close()
+        if not self._kept:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+class UploadParser(MultiPartParser):
+    """MultiPartParser that writes file parts straight to an UploadDestination.
+
+    Starlette spools file parts to an anonymous temporary file, which would
+    then have to be copied to a file ffmpeg can open; here the part is
+    written once, to the file the video job uses.
+    """
+
+    def __init__(self, headers, stream: AsyncIterator[bytes], suffix: str, max_bytes: int):
+        super().__init__(headers, stream)
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self._destinations: List[UploadDestination] = []
+
+    def on_headers_finished(self) -> None:
+        super().on_headers_finished()
+        part = self._current_part
+        if part.file is not None:
+            # Replace the spooled file Starlette just opened
+            part.file.file.close()
+            self._files_to_close_on_error.remove(part.file.file)
+            destination = UploadDestination(self.suffix, self.max_bytes)
+            self._destinations.append(destination)
+            part.file = UploadFile(file=destination, size=0, filename=part.file.filename, headers=part.file.headers)
+
+    async def parse(self) -> FormData:
+        try:
+            return await super().parse()
+        except BaseException:
+            for destination in self._destinations:
+                await asyncio.to_thread(destination.close)
+            raise
+
+
+async def read_upload_form(request: Request, suffix: str = ".webm", max_bytes: int = MAX_UPLOAD_BYTES) -> FormData:
+    """Parse an upload from the raw request stream, refusing it once it passes max_bytes.
+
+    File()/Form() parameters are only filled after the whole body has been
+    received and spooled to disk; reading request.stream() here stops at the
+    limit, and a Content-Length over it is refused before anything is read.
+    Uploaded files are UploadDestinations: keep() the one to process, and
+    the rest are deleted when the form is closed. A body that is not a form
+    gives an empty one, like FastAPI's Form() parameters.
+    """
+    limit = max_bytes + FORM_OVERHEAD_BYTES
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > limit:
+        raise UploadTooLarge(f"Upload exceeds {max_bytes // (1024 * 1024)} MB limit")
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        return await UploadParser(request.headers, _capped(request.stream(), limit), suffix, max_bytes).parse()
+    if content_type.startswith("application/x-www-form-urlencoded"):
+        return await FormParser(request.headers, _capped(request.stream(), limit)).parse()
+    return FormData()
+
+
+async def run_ffmpeg(args: list) -> None:
+    """Run ffmpeg without blocking the event loop, limited to FFMPEG_MAX_JOBS at once"""
+    async with _ffmpeg_slots:
+        process = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-hide_banner", "-nostdin", *args,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            _, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+
+    if process.returncode != 0:
+        raise TranscodeError(stderr.decode(errors="replace")[-2000:])
+
+
+async def probe_video(path: str) -> Dict:
+    """Describe a video's container and codecs with ffprobe"""
+    process = await asyncio.create_subprocess_exec(
+        "ffprobe", "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise TranscodeError(f"ffprobe failed: {stderr.decode(errors='replace')[-500:]}")
+
+    data = json.loads(stdout)
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), {})
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), {})
+
+    return {
+        # ffprobe reports e.g. "mov,mp4,m4a,3gp,3g2,mj2" or "matroska,webm"
+        "container": "mp4" if "mp4" in data.get("format", {}).get("format_name", "") else "webm",
+        "video_codec": video.get("codec_name"),
+        "audio_codec": audio.get("codec_name"),
+        "height": video.get("height") or 0,
+        "fps": _parse_rate(video.get("avg_frame_rate")),
+    }
+
+
+def _parse_rate(rate: Optional[str]) -> float:
+    try:
+        num, den = (rate or "0/0").split("/")
+        return float(num) / float(den)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def choose_transcode_path(info: Dict) -> str:
+    """Pick the cheapest valid path: passthrough, remux or a full encode"""
+    key = f"{info['container']}:{info['video_codec']}:{info['audio_codec'] or '-'}"
+    if key in PASSTHROUGH_FORMATS:
+        return "passthrough"
+    if info["video_codec"] in MP4_VIDEO_CODECS:
+        return "remux"
+    return "encode"
+
+
+def build_ffmpeg_args(mode: str, src_path: str, dst_path: str, info: Optional[Dict] = None) -> List[str]:
+    """ffmpeg arguments for a "remux" or "encode" conversion to MP4"""
+    info = info or {}
+    args = ["-i", src_path]
+
+    if mode == "remux":
+        args += ["-c:v", "copy"]
+    else:
+        filters = []
+        if not info:
+            # Size unknown (not probed, or still streaming in) - let ffmpeg cap it
+            filters.append(f"scale=-2:'min(ih,{ENCODE_MAX_HEIGHT})'")
+        elif info.get("height", 0) > ENCODE_MAX_HEIGHT:
+            filters.append(f"scale=-2:{ENCODE_MAX_HEIGHT}")
+        if info.get("fps", 0) > ENCODE_MAX_FPS:
+            filters.append(f"fps={ENCODE_MAX_FPS}")
+        if filters:
+            args += ["-vf", ",".join(filters)]
+        args += ["-c:v", "libx264", "-preset", ENCODE_PRESET, "-crf", "26", "-pix_fmt", "yuv420p"]
+
+    # Opus/Vorbis from MediaRecorder still needs a (cheap) audio encode
+    if info.get("audio_codec") in MP4_AUDIO_CODECS:
+        args += ["-c:a", "copy"]
+    else:
+        args += ["-c:a", "aac"]
+
+    return args + [
+        "-threads", str(FFMPEG_THREADS),
+        "-movflags", "+faststart",
+        "-y",  # Overwrite output file
+        dst_path
+    ]
+
+
+def mode_for_mime_type(mime_type: str) -> str:
+    """Transcode path for a MediaRecorder stream, from its MIME type alone (nothing to probe yet)"""
+    codecs = mime_type.lower().split("codecs=", 1)[-1] if "codecs=" in mime_type.lower() else ""
+    return "remux" if any(codec in codecs for codec in ("h264", "avc1")) else "encode"
+
+
+class StreamingTranscoder:
+    """An ffmpeg process converting an upload to MP4 while its chunks are still arriving.
+
+    feed() writes each chunk to ffmpeg's stdin as it is received, so when the
+    recording stops only the tail is left to convert. If ffmpeg dies part-way
+    the transcoder marks itself failed and finish() raises TranscodeError; the
+    caller still has the whole upload on disk to convert the usual way.
+    """
+
+    def __init__(self, process: asyncio.subprocess.Process, dst_path: str, mode: str):
+        self.process = process
+        self.dst_path = dst_path
+        self.mode = mode
+        self.failed = False
+        self._released = False
+        self._stderr = b""
+        self._stderr_task = asyncio.create_task(self._drain_stderr())
+
+    @classmethod
+    async def start(cls, dst_path: str, mime_type: str) -> Optional["StreamingTranscoder"]:
+        """Start ffmpeg reading from a pipe, or None if no live slot is free or ffmpeg is missing"""
+        # Never wait for a slot: without one the upload is converted when it completes
+        if _live_slots.locked():
+            return None
+        await _live_slots.acquire()
+        mode = mode_for_mime_type(mime_type)
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "ffmpeg", "-hide_banner", *build_ffmpeg_args(mode, "pipe:0", dst_path),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE
+            )
+        except OSError as e:
+            _live_slots.release()
+            logger.warning("Live transcode unavailable: %s", e)
+            return None
+        return cls(process, dst_path, mode)
+
+    async def _drain_stderr(self):
+        # ffmpeg blocks once its stderr pipe fills, so keep reading and only keep the tail
+        while True:
+            data = await self.process.stderr.read(4096)
+            if not data:
+                break
+            self._stderr = (self._stderr + data)[-2000:]
+
+    async def feed(self, data: bytes):
+        if self.failed:
+            return
+        try:
+            self.process.stdin.write(data)
+            await self.process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError) as e:
+            logger.warning("Live transcode stopped accepting input: %s", e)
+            self.failed = True
+
+    async def finish(self) -> Tuple[str, str]:
+        """Close the input, wait for ffmpeg and return (path, mode) like prepare_video"""
+        try:
+            # Only the tail of the recording is left to convert
+            with TRANSCODE_SECONDS.labels(mode=f"live_{self.mode}").time():
+                if not self.process.stdin.is_closing():
+                    self.process.stdin.close()
+                await self.process.wait()
+                await self._stderr_task
+        finally:
+            self._release()
+        if self.failed or self.process.returncode != 0:
+            raise TranscodeError(self._stderr.decode(errors="replace")[-2000:])
+        return self.dst_path, self.mode
+
+    async def abort(self):
+        """Kill ffmpeg for an upload that was abandoned or is not needed"""
+        if self.process.returncode is None:
+            self.process.kill()
+        await self.process.wait()
+        self._stderr_task.cancel()
+        self._release()
+        try:
+            os.unlink(self.dst_path)
+        except OSError:
+            pass
+
+    def _release(self):
+        if not self._released:
+            self._released = True
+            _live_slots.release()
+
+
+async def prepare_video(src_path: str, dst_path: str) -> Tuple[str, str]:
+    """Make a TwelveLabs-ready file and return (path, mode) for the path taken"""
+    try:
+        info = await probe_video(src_path)
+        mode = choose_transcode_path(info)
+    except (OSError, TranscodeError, ValueError) as e:
+        logger.warning("ffprobe unavailable, falling back to a full encode: %s", e)
+        info, mode = {}, "encode"
+
+    if mode == "passthrough":
+        return src_path, mode
+
+    with TRANSCODE_SECONDS.labels(mode=mode).time():
+        await run_ffmpeg(build_ffmpeg_args(mode, src_path, dst_path, info))
+    return dst_path, mode
@@ -0,0 +1,128 @@
+(function() {
+    'use strict';
+
+    // Uploads the session recording while it is being made. Each MediaRecorder
+    // chunk is appended to a server-side upload (PUT with the byte offset it
+    // starts at), so when recording stops the server already has the file and
+    // has been converting it as it arrived. A failed chunk is retried from
+    // whatever offset the server reports; if the upload can't be saved the
+    // caller falls back to posting the whole recording.
+    const MAX_RETRIES = 5;
+    const RETRY_BASE_MS = 500;
+
+    function sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    function start(clientId, mimeType) {
+        const state = { uploadUrl: null, offset: 0, pushed: 0, failed: false };
+
+        const form = new FormData();
+        form.append('client_id', clientId);
+        form.append('mime_type', mimeType || '');
+        const ready = fetch('/api/video-uploads', { method: 'POST', body: form })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(upload => {
+                state.uploadUrl = upload.upload_url;
+                console.log('Chunked upload started:', upload.upload_id, 'live transcode:', upload.live_transcode);
+            })
+            .catch(error => {
+                console.warn('Chunked upload unavailable, will send the recording at the end:', error);
+                state.failed = true;
+            });
+
+        async function refreshOffset() {
+            try {
+                const response = await fetch(state.uploadUrl);
+                if (response.ok) {
+                    state.offset = (await response.json()).offset;
+                }
+            } catch (error) {
+                // Still offline - the next attempt asks again
+            }
+        }
+
+        async function sendChunk(blob, start) {
+            await ready;
+            for (let attempt = 0; !state.failed && attempt <= MAX_RETRIES; attempt++) {
+                if (state.offset >= start + blob.size) {
+                    return;
+                }
+                if (state.offset < start) {
+                    // An earlier chunk never arrived; the server copy can't be completed
+                    break;
+                }
+                try {
+                    const response = await fetch(`${state.uploadUrl}?offset=${state.offset}`, {
+                        method: 'PUT',
+                        headers: { 'Content-Type': 'application/octet-stream' },
+                        body: blob.slice(state.offset - start)
+                    });
+                    if (response.ok || response.status === 409) {
+                        // 409: the server is at a different offset - carry on from there
+                        state.offset = (await response.json()).offset;
+                        continue;
+                    }
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                } catch (error) {
+                    console.warn('Video chunk upload failed, retrying:', error);
+                    await sleep(RETRY_BASE_MS * 2 ** attempt);
+                    await refreshOffset();
+                }
+            }
+            state.failed = true;
+        }
+
+        // Chunks go out one at a time, in recording order
+        let queue = Promise.resolve();
+
+        return {
+            push(blob) {
+                if (state.failed) {
+                    return;
+                }
+                const start = state.pushed;
+                state.pushed += blob.size;
+                queue = queue.then(() => sendChunk(blob, start));
+            },
+
+            // Wait for the last chunk and queue the analysis; resolves to the job
+            // submission, or null if the caller should post the whole recording
+            // (the caller then abort()s, so the server drops its copy)
+            async complete(duration) {
+                await queue;
+                if (state.failed || !state.uploadUrl || state.offset !== state.pushed) {
+                    return null;
+                }
+                const form = new FormData();
+                form.append('duration', duration);
+                try {
+                    const response = await fetch(`${state.uploadUrl}/complete`, { method: 'POST', body: form });
+                    return response.ok ? await response.json() : null;
+                } catch (error) {
+                    console.warn('Could not complete chunked upload:', error);
+                    return null;
+                }
+            },
+
+            // Stop sending and have the server delete the upload and its live transcode
+            abort() {
+                state.failed = true;
+                return ready.then(() => {
+                    if (state.uploadUrl) {
+                        return fetch(state.uploadUrl, { method: 'DELETE', keepalive: true })
+                            .catch(error => console.warn('Could not discard chunked upload:', error));
+                    }
+                });
+            }
+        };
+    }
+
+    window.videoUpload = { start };
+
+})();
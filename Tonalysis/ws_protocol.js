@@ -0,0 +1,158 @@
+(function() {
+    'use strict';
+
+    // Protocol v2 for the practice WebSocket. The client says hello and keeps
+    // sending plain v1 JSON until the server answers; after that body language
+    // frames are batched into one packed binary message every few seconds and
+    // interim transcripts are coalesced. Older servers never answer, so the
+    // client simply stays on v1.
+    const PROTOCOL_VERSION = 2;
+    const BINARY_BODY_FRAMES = 1;
+    const BINARY_TRANSCRIPTION = 2;
+
+    // Layout must match protocol.py: "<BH" header, "<dBBB" per frame, "<BBd" transcription header
+    const BODY_HEADER_BYTES = 3;
+    const BODY_FRAME_BYTES = 11;
+    const TRANSCRIPTION_HEADER_BYTES = 10;
+
+    const BODY_FLUSH_MS = 10000;
+    const MAX_BATCH_FRAMES = 64;
+    const INTERIM_THROTTLE_MS = 500;
+
+    const encoder = new TextEncoder();
+    const connections = new WeakMap();
+
+    function state(ws) {
+        let s = connections.get(ws);
+        if (!s) {
+            s = { negotiated: null, frames: [], flushTimer: null, interim: null, interimTimer: null };
+            connections.set(ws, s);
+        }
+        return s;
+    }
+
+    function isOpen(ws) {
+        return ws && ws.readyState === WebSocket.OPEN;
+    }
+
+    function codeFor(table, label) {
+        const code = table.indexOf(label);
+        return code < 0 ? 0 : code;
+    }
+
+    function flushBodyFrames(ws) {
+        const s = state(ws);
+        clearTimeout(s.flushTimer);
+        s.flushTimer = null;
+        if (!s.frames.length || !isOpen(ws)) {
+            return;
+        }
+
+        const frames = s.frames;
+        s.frames = [];
+        const buffer = new ArrayBuffer(BODY_HEADER_BYTES + frames.length * BODY_FRAME_BYTES);
+        const view = new DataView(buffer);
+        view.setUint8(0, BINARY_BODY_FRAMES);
+        view.setUint16(1, frames.length, true);
+        let offset = BODY_HEADER_BYTES;
+        for (const [timestamp, emotion, posture, fatigue] of frames) {
+            view.setFloat64(offset, timestamp, true);
+            view.setUint8(offset + 8, emotion);
+            view.setUint8(offset + 9, posture);
+            view.setUint8(offset + 10, fatigue);
+            offset += BODY_FRAME_BYTES;
+        }
+        ws.send(buffer);
+    }
+
+    function sendBinaryTranscription(ws, text, isFinal) {
+        const bytes = encoder.encode(text);
+        const frame = new Uint8Array(TRANSCRIPTION_HEADER_BYTES + bytes.length);
+        const view = new DataView(frame.buffer);
+        view.setUint8(0, BINARY_TRANSCRIPTION);
+        view.setUint8(1, isFinal ? 1 : 0);
+        view.setFloat64(2, Date.now() / 1000, true);
+        frame.set(bytes, TRANSCRIPTION_HEADER_BYTES);
+        ws.send(frame.buffer);
+    }
+
+    function flushInterim(ws) {
+        const s = state(ws);
+        clearTimeout(s.interimTimer);
+        s.interimTimer = null;
+        if (s.interim !== null && isOpen(ws)) {
+            sendBinaryTranscription(ws, s.interim, false);
+        }
+        s.interim = null;
+    }
+
+    window.wsProtocol = {
+        // Ask the server for protocol v2 right after the socket opens
+        negotiate(ws) {
+            state(ws);
+            ws.send(JSON.stringify({ type: 'hello', protocol: PROTOCOL_VERSION, encodings: ['binary'] }));
+        },
+
+        // Returns true if the message was the server's hello reply
+        handleMessage(ws, data) {
+            if (data.type !== 'hello') {
+                return false;
+            }
+            state(ws).negotiated = data;
+            console.log('WebSocket protocol negotiated:', data.protocol, 'binary:', data.binary);
+            return true;
+        },
+
+        // Send a v1-shaped message, using the compact v2 form when the server supports it
+        send(ws, message) {
+            if (!isOpen(ws)) {
+                return;
+            }
+            const s = state(ws);
+            const negotiated = s.negotiated;
+            if (!negotiated || negotiated.protocol < 2 || !negotiated.binary) {
+                ws.send(JSON.stringify(message));
+                return;
+            }
+
+            if (message.type === 'body_language') {
+                const codes = negotiated.codes;
+                s.frames.push([
+                    Date.now() / 1000,
+                    codeFor(codes.emotion, message.emotion),
+                    codeFor(codes.posture, message.posture && message.posture.label),
+                    codeFor(codes.fatigue, message.fatigue && message.fatigue.label)
+                ]);
+                if (s.frames.length >= MAX_BATCH_FRAMES) {
+                    flushBodyFrames(ws);
+                } else if (!s.flushTimer) {
+                    s.flushTimer = setTimeout(() => flushBodyFrames(ws), BODY_FLUSH_MS);
+                }
+            } else if (message.type === 'streaming_transcription') {
+                if (message.is_final) {
+                    // A final result supersedes any interim still waiting
+                    clearTimeout(s.interimTimer);
+                    s.interimTimer = null;
+                    s.interim = null;
+                    sendBinaryTranscription(ws, message.text, true);
+                } else {
+                    s.interim = message.text;
+                    if (!s.interimTimer) {
+                        s.interimTimer = setTimeout(() => flushInterim(ws), INTERIM_THROTTLE_MS);
+                    }
+                }
+            } else {
+                ws.send(JSON.stringify(message));
+            }
+        },
+
+        // Send anything still buffered, e.g. before closing the socket
+        flush(ws) {
+            if (ws && connections.has(ws)) {
+                flushBodyFrames(ws);
+                flushInterim(ws);
+            }
+        }
+    };
+
+})();